@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HNSW vector index against the exact NumPy engine.
+
+Builds both engines over the same synthetic, clustered unit vectors and
+reports recall@k of HNSW (using the exact engine as ground truth) together
+with per-query latency for a range of ef_search values. With --quantization,
+quantized NumPy indexes are measured the same way, with their memory
+footprint and with and without full-precision re-ranking.
+
+Usage:
+    python scripts/benchmark_vector_index.py --num-vectors 100000 --dim 256
+    python scripts/benchmark_vector_index.py --skip-hnsw --quantization int8 pq
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from services.vector_index import Document, HnswVectorStore, NumpyVectorStore
+
+
+def make_dataset(num_vectors, dim, num_queries, seed=42):
+    """Clustered unit vectors; queries are perturbed dataset points"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(num_vectors // 500, 1), dim))
+    assignments = rng.integers(0, len(centers), num_vectors)
+    vectors = centers[assignments] + 0.8 * rng.standard_normal((num_vectors, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    picks = rng.integers(0, num_vectors, num_queries)
+    noise = rng.standard_normal((num_queries, dim)) * 0.3 / np.sqrt(dim)
+    queries = vectors[picks] + noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def fill(store, vectors, batch_size=10000):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start : start + batch_size]
+        ids = [str(i) for i in range(start, start + len(batch))]
+        store.add_embeddings([Document(page_content=i) for i in ids], batch, ids)
+
+
+def run_queries(store, queries, k):
+    latencies = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = store.similarity_search_by_vector_with_score(query, k=k)
+        latencies.append(time.perf_counter() - started)
+        results.append([doc.page_content for doc, _ in hits])
+    latencies = np.array(latencies) * 1000
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def recall(results, truth):
+    found = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return found / sum(len(t) for t in truth)
+
+
+def benchmark_quantization(args, directory, vectors, queries, truth):
+    """Memory, recall and latency of quantized NumPy indexes"""
+    rows = []
+    for kind in args.quantization:
+        for subvectors in args.pq_subvectors if kind == "pq" else [None]:
+            name = f"{kind}-{subvectors}" if subvectors else kind
+            store = NumpyVectorStore(
+                directory,
+                None,
+                name,
+                quantization=kind,
+                pq_subvectors=subvectors or 64,
+            )
+            fill(store, vectors)
+            started = time.perf_counter()
+            store.persist()  # trains the quantizer and encodes every vector
+            print(f"{name} training + encoding: {time.perf_counter() - started:.1f}s")
+            # Reload so the full-precision vectors are memory-mapped
+            store = NumpyVectorStore(
+                directory,
+                None,
+                name,
+                quantization=kind,
+                pq_subvectors=subvectors or 64,
+            )
+            footprint = store.memory_footprint()
+            for rerank in args.rerank:
+                store.rerank_candidates = rerank
+                results, p50, p95 = run_queries(store, queries, args.k)
+                rows.append(
+                    f"| {name} | {rerank or '-'} | {footprint['bytes_per_vector']} | "
+                    f"{footprint['index_bytes'] / 2**20:.1f} | "
+                    f"{recall(results, truth):.3f} | {p50:.2f} | {p95:.2f} |"
+                )
+
+    full = vectors.nbytes
+    print()
+    print(
+        f"| Quantization | Re-rank | Bytes/vector | Index (MB) | Recall@{args.k} "
+        "| p50 (ms) | p95 (ms) |"
+    )
+    print("|---|---|---|---|---|---|---|")
+    print(
+        f"| none (float32) | - | {vectors.shape[1] * 4} | {full / 2**20:.1f} | "
+        "1.000 | - | - |"
+    )
+    for row in rows:
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--num-vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument(
+        "--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256]
+    )
+    parser.add_argument("--skip-hnsw", action="store_true")
+    parser.add_argument("--quantization", nargs="*", default=[], choices=["int8", "pq"])
+    parser.add_argument("--pq-subvectors", type=int, nargs="+", default=[64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 100])
+    args = parser.parse_args()
+
+    vectors, queries = make_dataset(args.num_vectors, args.dim, args.queries)
+    directory = tempfile.mkdtemp(prefix="vector_bench_")
+    print(
+        f"Dataset: {args.num_vectors} vectors x {args.dim} dims, "
+        f"{args.queries} queries, k={args.k}"
+    )
+
+    exact = NumpyVectorStore(directory, None, "exact")
+    started = time.perf_counter()
+    fill(exact, vectors)
+    print(f"Exact build: {time.perf_counter() - started:.1f}s")
+    truth, exact_p50, exact_p95 = run_queries(exact, queries, args.k)
+
+    if args.quantization:
+        benchmark_quantization(args, directory, vectors, queries, truth)
+        print()
+    print(f"| Engine | ef_search | Recall@{args.k} | p50 (ms) | p95 (ms) |")
+    print("|--------|-----------|-----------|----------|----------|")
+    print(f"| Exact (NumPy) | - | 1.000 | {exact_p50:.2f} | {exact_p95:.2f} |")
+    if args.skip_hnsw:
+        return
+
+    hnsw = HnswVectorStore(
+        directory, None, "hnsw", M=args.M, ef_construction=args.ef_construction
+    )
+    started = time.perf_counter()
+    fill(hnsw, vectors)
+    print(
+        f"HNSW build (M={args.M}, ef_construction={args.ef_construction}): "
+        f"{time.perf_counter() - started:.1f}s"
+    )
+
+    hnsw.persist()
+    started = time.perf_counter()
+    hnsw = HnswVectorStore(
+        directory, None, "hnsw", M=args.M, ef_construction=args.ef_construction
+    )
+    print(f"HNSW load from disk: {time.perf_counter() - started:.2f}s")
+
+    for ef in args.ef_search:
+        hnsw.ef_search = ef
+        results, p50, p95 = run_queries(hnsw, queries, args.k)
+        print(f"| HNSW | {ef} | {recall(results, truth):.3f} | {p50:.2f} | {p95:.2f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Precompute the similar-books table of the vector index.
+
+Computes the top-N nearest neighbours of every indexed book in batched matrix
+passes and stores them next to the active index version. /api/vector/similar
+then serves from the table, and catalog syncs refresh only the rows whose
+neighbourhood changed. Run it from the directory the backend runs in, with the
+same VECTOR_STORE_ENGINE / embedding settings.
+
+Usage:
+    python scripts/build_neighbor_table.py
+    python scripts/build_neighbor_table.py --size 50 --persist-directory ./chroma_db
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from services.index_manager import IndexManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=None,
+        help="neighbours per book (default: NEIGHBOR_TABLE_SIZE or 20)",
+    )
+    args = parser.parse_args()
+
+    manager = IndexManager(persist_directory=args.persist_directory)
+    summary = manager.build_neighbor_table(size=args.size)
+    if not summary["success"]:
+        print(f"Neighbor table not built: {summary['error']}")
+        sys.exit(1)
+    print(
+        f"Neighbor table built: {summary['books']} books x {summary['size']} "
+        f"neighbours in {summary['seconds']}s (index version {summary['version']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
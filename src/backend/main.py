@@ -19,13 +19,17 @@ Features:
 
 Key Endpoints:
 - /api/chat: Main chat endpoint for AI library assistant
+- /api/chat/history: Keyset-paginated chat history and NDJSON export
 - /api/books: Get all available books
+- /api/books/search: Ranked full-text search over the books table
 - /api/book-recommendations: Get personalized book recommendations
 - /api/auth/*: User authentication endpoints (register, login, OAuth)
 - /api/rag/*: RAG-powered chat and recommendations
 - /api/vector/*: Vector-based semantic search and similarity
+- /api/ready: Readiness and warm-up progress of the RAG and vector services
 - /api/transcribe: Convert audio to text
 - /api/analyze-reading: Analyze user's reading preferences
+- /api/reading-stats: Precomputed per-user reading statistics
 
 Dependencies:
 - FastAPI for web framework
@@ -36,14 +40,19 @@ Dependencies:
 """
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
 import openai
 import os
 from dotenv import load_dotenv
 import json
+import base64
 import tempfile
+import threading
+import time
 from sqlalchemy.orm import Session
 from datetime import datetime
 
@@ -64,14 +73,34 @@ if _DATABASE_DIR not in sys.path:
 
 # Robust import with multiple fallback mechanisms
 User = get_db = create_tables = init_sample_data = None
+get_chat_history_page = iter_chat_history = get_reading_stats = None
+search_books_fulltext = None
 
 # Try different import approaches
 try:
-    from database.database import User, get_db, create_tables, init_sample_data
+    from database.database import (
+        User,
+        get_db,
+        create_tables,
+        init_sample_data,
+        get_chat_history_page,
+        iter_chat_history,
+        get_reading_stats,
+        search_books_fulltext,
+    )
 except ImportError:
     try:
         # Fallback 1: Direct import from database module
-        from database import User, get_db, create_tables, init_sample_data
+        from database import (
+            User,
+            get_db,
+            create_tables,
+            init_sample_data,
+            get_chat_history_page,
+            iter_chat_history,
+            get_reading_stats,
+            search_books_fulltext,
+        )
     except ImportError:
         try:
             # Fallback 2: Import using importlib
@@ -86,6 +115,10 @@ except ImportError:
             get_db = database_module.get_db
             create_tables = database_module.create_tables
             init_sample_data = database_module.init_sample_data
+            get_chat_history_page = database_module.get_chat_history_page
+            iter_chat_history = database_module.iter_chat_history
+            get_reading_stats = database_module.get_reading_stats
+            search_books_fulltext = database_module.search_books_fulltext
         except Exception as e:
             print(f"WARNING: Could not import database module: {e}")
             # Create dummy functions for testing environments
@@ -109,25 +142,104 @@ except ImportError:
 
 # Import our services
 
-# Import RAG services with error handling
+# RAG and vector services are created by a background warm-up after startup,
+# since building the index may embed the whole catalog. Until a service is
+# ready its endpoints answer 503 with Retry-After
 rag_service = None
 vector_service = None
 
-try:
-    from services.rag_service import RAGService
+# Seconds clients are asked to wait before retrying a warming service
+SERVICE_RETRY_AFTER_SECONDS = int(os.getenv("SERVICE_RETRY_AFTER_SECONDS", "5"))
+# Attempts per service before its warm-up is marked failed, and the delay
+# before the first retry (doubled after every further failure)
+SERVICE_WARMUP_ATTEMPTS = int(os.getenv("SERVICE_WARMUP_ATTEMPTS", "3"))
+SERVICE_WARMUP_RETRY_DELAY = float(os.getenv("SERVICE_WARMUP_RETRY_DELAY", "30"))
 
-    rag_service = RAGService()
-    print("RAG service imported successfully")
-except Exception as e:
-    print(f"RAG service import failed: {e}")
+# Prometheus exposition of the vector service metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
 
-try:
+service_status = {
+    name: {"state": "pending", "started_at": None, "ready_at": None, "error": None}
+    for name in ("vector", "rag")
+}
+
+
+def _create_vector_service():
     from services.vector_service import VectorService
 
-    vector_service = VectorService()
-    print("Vector service imported successfully")
-except Exception as e:
-    print(f"Vector service import failed: {e}")
+    return VectorService()
+
+
+def _create_rag_service():
+    from services.rag_service import RAGService
+
+    return RAGService()
+
+
+def _warm_up_service(name: str, factory):
+    """
+    Create one service, recording its progress in service_status.
+
+    Failed attempts are retried with exponential backoff; the service stays
+    "warming" until it is created or SERVICE_WARMUP_ATTEMPTS are used up.
+    """
+    global rag_service, vector_service
+    status = service_status[name]
+    status["state"] = "warming"
+    status["started_at"] = datetime.utcnow().isoformat()
+    started = time.perf_counter()
+    delay = SERVICE_WARMUP_RETRY_DELAY
+    attempt = 0
+    while True:
+        attempt += 1
+        status["attempts"] = attempt
+        try:
+            service = factory()
+            break
+        except Exception as e:
+            status["error"] = str(e)
+            if attempt >= SERVICE_WARMUP_ATTEMPTS:
+                status["state"] = "failed"
+                print(f"{name} service warm-up failed: {e}")
+                return
+            print(
+                f"{name} service warm-up attempt {attempt} failed, "
+                f"retrying in {delay}s: {e}"
+            )
+            time.sleep(delay)
+            delay *= 2
+
+    if name == "vector":
+        vector_service = service
+    else:
+        rag_service = service
+    status["state"] = "ready"
+    status["error"] = None
+    status["ready_at"] = datetime.utcnow().isoformat()
+    status["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"{name} service ready in {status['warmup_seconds']}s")
+
+
+def warm_up_services():
+    """Warm up the services one after another; both share the book index"""
+    _warm_up_service("vector", _create_vector_service)
+    _warm_up_service("rag", _create_rag_service)
+
+
+def require_service(name: str) -> None:
+    """Raise 503 unless the named service has finished warming up"""
+    if (vector_service if name == "vector" else rag_service) is not None:
+        return
+    label = "Vector" if name == "vector" else "RAG"
+    if service_status[name]["state"] in ("pending", "warming"):
+        raise HTTPException(
+            status_code=503,
+            detail=f"{label} service is warming up",
+            headers={"Retry-After": str(SERVICE_RETRY_AFTER_SECONDS)},
+        )
+    raise HTTPException(status_code=503, detail=f"{label} service not available")
+
 
 # Import enhanced response manager
 try:
@@ -232,6 +344,7 @@ class ReadingAnalysisRequest(BaseModel):
 class ReadingAnalysisResponse(BaseModel):
     success: bool
     analysis: str
+    stats: Optional[dict] = None
 
 
 class TranscriptionResponse(BaseModel):
@@ -239,6 +352,16 @@ class TranscriptionResponse(BaseModel):
     text: str
 
 
+VECTOR_BATCH_MAX_QUERIES = 100
+VECTOR_SEARCH_MAX_RESULTS = 100
+
+
+class VectorBatchSearchRequest(BaseModel):
+    queries: List[str] = Field(max_length=VECTOR_BATCH_MAX_QUERIES)
+    limit: int = 10
+    threshold: float = 0.7
+
+
 # Sample book database with translations
 BOOKS_DATABASE = [
     {
@@ -1087,6 +1210,86 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
+
+def encode_history_cursor(timestamp: datetime, message_id: int) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe cursor"""
+    raw = f"{timestamp.isoformat()}|{message_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_history_cursor(cursor: str):
+    """Decode a cursor produced by encode_history_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        timestamp, message_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+
+def serialize_chat_message(row) -> dict:
+    """Convert a ChatHistory row to a JSON-friendly dict"""
+    return {
+        "id": row.id,
+        "message": row.message,
+        "response": row.response,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
+@app.get("/api/chat/history")
+async def get_chat_history(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    format: str = "json",
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the current user's chat history, newest first.
+
+    Pages are addressed with an opaque keyset cursor on (timestamp, id), so
+    loading any page costs the same as loading the first one. Pass
+    format=ndjson to stream the full history as newline-delimited JSON.
+    """
+    try:
+        if get_chat_history_page is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+
+        if format == "ndjson":
+
+            def export():
+                for row in iter_chat_history(db, current_user.id):
+                    yield json.dumps(
+                        serialize_chat_message(row), ensure_ascii=False
+                    ) + "\n"
+
+            return StreamingResponse(export(), media_type="application/x-ndjson")
+
+        limit = max(1, min(limit, CHAT_HISTORY_MAX_PAGE_SIZE))
+        before = decode_history_cursor(cursor) if cursor else None
+
+        rows, next_position = get_chat_history_page(
+            db, current_user.id, limit=limit, before=before
+        )
+
+        return {
+            "success": True,
+            "messages": [serialize_chat_message(row) for row in rows],
+            "count": len(rows),
+            "next_cursor": encode_history_cursor(*next_position)
+            if next_position
+            else None,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/book-recommendations", response_model=BookRecommendationResponse)
 async def get_book_recommendations(request: BookRecommendationRequest):
     """Get book recommendations based on user preferences"""
@@ -1362,11 +1565,23 @@ async def sync_openlibrary_books(sync_request: dict):
             if book not in BOOKS_DATABASE:
                 BOOKS_DATABASE.append(book)
 
+        # Insert synced books into the vector index incrementally
+        indexed_count = 0
+        if vector_service is not None:
+            try:
+                # Builds a new index version; keep the event loop serving
+                indexed_count = await run_in_threadpool(
+                    vector_service.add_books, sync_result["books"]
+                )
+            except Exception as e:
+                print(f"Vector indexing of synced books failed: {e}")
+
         return {
             "success": True,
             "message": f"{sync_result['synced_count']} kitap başarıyla senkronize edildi",
             "synced_count": sync_result["synced_count"],
             "error_count": sync_result["error_count"],
+            "indexed_count": indexed_count,
             "total_books_in_db": len(BOOKS_DATABASE),
             "new_books": sync_result["books"],
         }
@@ -1727,6 +1942,40 @@ async def get_books():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+BOOK_SEARCH_MAX_RESULTS = 100
+
+
+@app.get("/api/books/search")
+async def search_catalog_books(q: str, limit: int = 10, db: Session = Depends(get_db)):
+    """Ranked full-text search over the books table"""
+    try:
+        if search_books_fulltext is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+
+        limit = max(1, min(limit, BOOK_SEARCH_MAX_RESULTS))
+
+        results = [
+            {
+                "book_id": book.id,
+                "title": book.title,
+                "author": book.author,
+                "category": book.category,
+                "description": book.description,
+                "year": book.year,
+                "rating": book.rating,
+                "score": score,
+            }
+            for book, score in search_books_fulltext(db, q, limit=limit)
+        ]
+
+        return {"success": True, "query": q, "results": results, "count": len(results)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/analyze-reading", response_model=ReadingAnalysisResponse)
 async def analyze_reading(request: ReadingAnalysisRequest):
     """Analyze user's reading list"""
@@ -1779,6 +2028,100 @@ async def analyze_reading(request: ReadingAnalysisRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def summarize_reading_stats(stats: dict) -> str:
+    """Build a short local summary of precomputed reading statistics"""
+
+    def top(counts: dict, n: int = 3) -> str:
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return ", ".join(f"{key} ({count})" for key, count in ranked[:n]) or "-"
+
+    return (
+        f"Total books: {stats['total_books']}. "
+        f"By status: {top(stats['status_counts'])}. "
+        f"Top genres: {top(stats['genre_counts'])}. "
+        f"Top authors: {top(stats['author_counts'])}. "
+        f"Top decades: {top(stats['decade_counts'])}."
+    )
+
+
+@app.get("/api/reading-stats")
+async def get_my_reading_stats(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Get the current user's precomputed reading statistics"""
+    try:
+        if get_reading_stats is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+
+        return {"success": True, "stats": get_reading_stats(db, current_user.id)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/analyze-reading/me", response_model=ReadingAnalysisResponse)
+async def analyze_my_reading(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Analyze the current user's reading from the precomputed statistics row.
+
+    The aggregates are maintained incrementally by the database layer, so the
+    reading list is neither uploaded nor re-aggregated; the LLM only writes
+    the narrative on top of the numbers.
+    """
+    try:
+        if get_reading_stats is None:
+            raise HTTPException(status_code=503, detail="Database not available")
+
+        stats = get_reading_stats(db, current_user.id)
+        if not stats["total_books"]:
+            raise HTTPException(status_code=400, detail="Reading list is empty")
+
+        summary = summarize_reading_stats(stats)
+
+        try:
+            if client is None:
+                raise HTTPException(
+                    status_code=503, detail="OpenAI API is not configured."
+                )
+
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a literature analyst and reading coach.",
+                    },
+                    {
+                        "role": "user",
+                        "content": "Write a short analysis of this reader's habits "
+                        f"with recommendations and advice:\n\n{summary}",
+                    },
+                ],
+                max_tokens=500,
+                temperature=0.7,
+            )
+
+            analysis = response.choices[0].message.content
+
+        except Exception as openai_error:
+            # If OpenAI API fails, return the locally computed summary
+            print(f"OpenAI API Error: {openai_error}")
+            analysis = summary
+
+        return ReadingAnalysisResponse(success=True, analysis=analysis, stats=stats)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(file: UploadFile = File(...)):
     """Transcribe audio to text using OpenAI Whisper"""
@@ -1853,8 +2196,7 @@ async def transcribe_audio(file: UploadFile = File(...)):
 async def rag_chat(request: ChatRequest, db: Session = Depends(get_db)):
     """Enhanced chat with RAG capabilities"""
     try:
-        if rag_service is None:
-            raise HTTPException(status_code=503, detail="RAG service not available")
+        require_service("rag")
 
         # Use RAG service to answer questions
         response = rag_service.answer_question(request.message)
@@ -1863,6 +2205,8 @@ async def rag_chat(request: ChatRequest, db: Session = Depends(get_db)):
             success=True, response=response, user_message=request.message
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1873,6 +2217,8 @@ async def rag_recommendations(
 ):
     """Get personalized book recommendations using RAG"""
     try:
+        require_service("rag")
+
         # Get recommendations from RAG service
         recommendations = rag_service.get_book_recommendations(
             request.preferences, limit=5
@@ -1893,6 +2239,8 @@ async def rag_recommendations(
             success=True, recommendations=response_text, books=recommendations
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1901,10 +2249,13 @@ async def rag_recommendations(
 async def rag_search_books(q: str, limit: int = 10, db: Session = Depends(get_db)):
     """Search books using semantic similarity"""
     try:
+        require_service("rag")
         results = rag_service.search_books(q, limit=limit)
 
         return {"success": True, "query": q, "results": results, "count": len(results)}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1912,23 +2263,176 @@ async def rag_search_books(q: str, limit: int = 10, db: Session = Depends(get_db
 # Vector Service Endpoints
 @app.get("/api/vector/search")
 async def vector_search_books(
-    q: str, limit: int = 10, threshold: float = 0.7, db: Session = Depends(get_db)
+    q: str,
+    limit: int = 10,
+    threshold: float = 0.7,
+    mode: str = "semantic",
+    mmr_lambda: Optional[float] = None,
+    category: Optional[str] = None,
+    language: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    db: Session = Depends(get_db),
 ):
-    """Advanced semantic search with similarity threshold"""
+    """
+    Advanced semantic search with similarity threshold.
+
+    mode=hybrid fuses BM25 keyword search with the vector search and adds a
+    per-stage timing breakdown to the response. mmr_lambda (0-1) diversifies
+    semantic results with maximal marginal relevance. category, language,
+    year_from, year_to and min_rating restrict semantic results to matching
+    books before they are ranked.
+    """
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
-        results = vector_service.semantic_search(q, limit=limit, threshold=threshold)
+        if mmr_lambda is not None and not 0 <= mmr_lambda <= 1:
+            raise HTTPException(
+                status_code=400, detail="mmr_lambda must be between 0 and 1"
+            )
 
-        return {
+        filters = {
+            "category": category,
+            "language": language,
+            "year_from": year_from,
+            "year_to": year_to,
+            "min_rating": min_rating,
+        }
+        filtered = any(value is not None for value in filters.values())
+
+        if mode == "hybrid":
+            if filtered:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Metadata filters are only supported in semantic mode",
+                )
+            # Waits on the two search legs, so it must not block the event loop
+            hybrid = await run_in_threadpool(
+                vector_service.hybrid_search, q, limit=limit, threshold=threshold
+            )
+            return {
+                "success": True,
+                "query": q,
+                "mode": mode,
+                "results": hybrid["results"],
+                "count": len(hybrid["results"]),
+                "threshold": threshold,
+                "timings": hybrid["timings"],
+                "fallback": hybrid["fallback"],
+            }
+        if mode != "semantic":
+            raise HTTPException(
+                status_code=400, detail="mode must be 'semantic' or 'hybrid'"
+            )
+
+        results = vector_service.semantic_search(
+            q, limit=limit, threshold=threshold, mmr_lambda=mmr_lambda, **filters
+        )
+
+        response = {
             "success": True,
             "query": q,
+            "mode": mode,
             "results": results,
             "count": len(results),
             "threshold": threshold,
         }
+        if filtered:
+            response["filters"] = filters
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/vector/search/batch")
+async def vector_search_books_batch(request: VectorBatchSearchRequest):
+    """Semantic search for many queries with one embedding request"""
+    try:
+        require_service("vector")
+
+        if not request.queries:
+            raise HTTPException(
+                status_code=400, detail="At least one query is required"
+            )
+
+        limit = max(1, min(request.limit, VECTOR_SEARCH_MAX_RESULTS))
+        # Embedding and scoring block; keep them off the event loop
+        batches = await run_in_threadpool(
+            vector_service.semantic_search_many,
+            request.queries,
+            limit=limit,
+            threshold=request.threshold,
+        )
+
+        return {
+            "success": True,
+            "results": [
+                {"query": query, "results": results, "count": len(results)}
+                for query, results in zip(request.queries, batches)
+            ],
+            "count": len(batches),
+            "threshold": request.threshold,
+        }
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/vector/filter")
+async def vector_filter_books(
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    language: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    q: Optional[str] = None,
+    limit: int = 10,
+    min_rating: Optional[float] = None,
+):
+    """Exact metadata filtering, optionally ranked by a semantic query"""
+    try:
+        require_service("vector")
+
+        filters = [category, author, language, year_from, year_to, min_rating, q]
+        if all(value is None for value in filters):
+            raise HTTPException(
+                status_code=400, detail="At least one filter or query is required"
+            )
+
+        results = vector_service.filter_books(
+            category=category,
+            author=author,
+            language=language,
+            year_from=year_from,
+            year_to=year_to,
+            query=q,
+            limit=limit,
+            min_rating=min_rating,
+        )
+
+        return {
+            "success": True,
+            "filters": {
+                "category": category,
+                "author": author,
+                "language": language,
+                "year_from": year_from,
+                "year_to": year_to,
+                "min_rating": min_rating,
+            },
+            "query": q,
+            "results": results,
+            "count": len(results),
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1939,8 +2443,7 @@ async def find_similar_books(
 ):
     """Find books similar to a given book"""
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
         results = vector_service.find_similar_books(book_title, limit=limit)
 
@@ -1951,6 +2454,8 @@ async def find_similar_books(
             "count": len(results),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1961,8 +2466,7 @@ async def get_category_recommendations(
 ):
     """Get book recommendations by category"""
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
         results = vector_service.get_category_recommendations(category, limit=limit)
 
@@ -1973,6 +2477,8 @@ async def get_category_recommendations(
             "count": len(results),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1981,8 +2487,7 @@ async def get_category_recommendations(
 async def get_author_books(author: str, limit: int = 10, db: Session = Depends(get_db)):
     """Get books by specific author"""
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
         results = vector_service.get_author_books(author, limit=limit)
 
@@ -1993,6 +2498,8 @@ async def get_author_books(author: str, limit: int = 10, db: Session = Depends(g
             "count": len(results),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2001,13 +2508,21 @@ async def get_author_books(author: str, limit: int = 10, db: Session = Depends(g
 async def update_vector_store(db: Session = Depends(get_db)):
     """Update vector store with new books from database"""
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
-        vector_service.update_vector_store()
+        # Rebuilds can take minutes; searches keep being served meanwhile
+        summary = await run_in_threadpool(vector_service.update_vector_store)
+        if not summary.get("success", True):
+            raise HTTPException(status_code=500, detail=summary.get("error"))
 
-        return {"success": True, "message": "Vector store updated successfully"}
+        return {
+            "success": True,
+            "message": "Vector store updated successfully",
+            "changes": summary,
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2016,13 +2531,33 @@ async def update_vector_store(db: Session = Depends(get_db)):
 async def get_vector_stats(db: Session = Depends(get_db)):
     """Get vector store statistics"""
     try:
-        if vector_service is None:
-            raise HTTPException(status_code=503, detail="Vector service not available")
+        require_service("vector")
 
         stats = vector_service.get_vector_store_stats()
 
         return {"success": True, "stats": stats}
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get(METRICS_PATH, response_class=PlainTextResponse)
+async def get_metrics():
+    """Vector service metrics in the Prometheus text format"""
+    try:
+        if not METRICS_ENABLED:
+            raise HTTPException(status_code=404, detail="Metrics are disabled")
+        require_service("vector")
+
+        return PlainTextResponse(
+            vector_service.render_metrics(),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2035,10 +2570,41 @@ async def health_check():
         "message": "Luminis.AI Library Assistant API is running",
         "version": "1.0.0",
         "database": "connected",
-        "rag_service": "active",
+        "rag_service": service_status["rag"]["state"],
+        "vector_service": service_status["vector"]["state"],
     }
 
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness endpoint with per-service warm-up progress.
+
+    Answers 200 once every service is ready. While any service is still
+    warming up (or waiting to retry) it answers 503 with Retry-After, and a
+    service that failed for good keeps the worker at 503 without Retry-After,
+    so load balancers never route traffic to a worker that cannot search.
+    """
+    try:
+        from services.index_manager import get_build_progress
+
+        index_progress = get_build_progress()
+    except Exception:
+        index_progress = None
+
+    services = {name: dict(status) for name, status in service_status.items()}
+    services["vector"]["index_progress"] = index_progress
+    ready = all(status["state"] == "ready" for status in services.values())
+    failed = any(status["state"] == "failed" for status in services.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "failed": failed, "services": services},
+        headers=(
+            {} if ready or failed else {"Retry-After": str(SERVICE_RETRY_AFTER_SECONDS)}
+        ),
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -2060,8 +2626,11 @@ async def startup_event():
         init_sample_data()
         print("Sample data initialized")
 
-        # Initialize RAG service
-        print("RAG service initialized")
+        # Warm up the RAG and vector services without blocking startup
+        threading.Thread(
+            target=warm_up_services, name="service-warmup", daemon=True
+        ).start()
+        print("Service warm-up started")
 
         print("Application startup completed!")
 
@@ -1,6 +1,8 @@
 """
 Database package initializer for Luminis.AI Library Assistant.
 Exposes commonly used symbols from database module for convenience.
+The engine is created lazily on first use, so importing this package
+performs no I/O.
 """
 
 from .database import (
@@ -9,12 +11,21 @@ from .database import (
     Book,
     UserBook,
     BookStatus,
-    engine,
+    ChatHistory,
+    UserReadingStats,
+    get_engine,
     SessionLocal,
     get_db,
     create_tables,
     init_sample_data,
+    get_chat_history_page,
+    iter_chat_history,
+    get_reading_stats,
+    rebuild_reading_stats,
+    search_books_fulltext,
+    ensure_books_search_index,
 )
+from .book_cache import BookCache, CachedBook, book_cache
 
 __all__ = [
     "Base",
@@ -22,9 +33,27 @@ __all__ = [
     "Book",
     "UserBook",
     "BookStatus",
+    "ChatHistory",
+    "UserReadingStats",
     "engine",
+    "get_engine",
     "SessionLocal",
     "get_db",
     "create_tables",
     "init_sample_data",
+    "get_chat_history_page",
+    "iter_chat_history",
+    "get_reading_stats",
+    "rebuild_reading_stats",
+    "search_books_fulltext",
+    "ensure_books_search_index",
+    "BookCache",
+    "CachedBook",
+    "book_cache",
 ]
+
+
+def __getattr__(name):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
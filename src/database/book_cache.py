@@ -0,0 +1,296 @@
+"""
+Read-through Book Cache for Luminis.AI Library Assistant
+=======================================================
+
+Vector and RAG services look up the same popular books over and over
+("similar to Dune", "similar to 1984"). This module keeps bounded LRU maps
+of book snapshots keyed by id, title query and ISBN so that repeated lookups
+are served from memory instead of SQLite.
+
+Cached values are immutable CachedBook snapshots rather than ORM instances,
+so they can be shared across sessions and threads without detached-instance
+errors. Book rows written in a session are recorded by SQLAlchemy mapper
+events and invalidated once that session commits. A generation counter keeps
+a lookup that raced with an invalidation from caching what it read, and a
+TTL bounds how long a write made by another process can stay unseen.
+
+Configuration:
+- BOOK_CACHE_SIZE: Maximum entries per lookup map (default 1024)
+- BOOK_CACHE_TTL: Seconds an entry is served before it is reloaded
+  (default 300, 0 disables expiry)
+- BOOK_CACHE_CATALOG_LIMIT: Largest catalog kept as a list_books snapshot
+  (default 10000); larger catalogs are read from the database every time
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .database import Book, SessionLocal
+
+# Session.info key holding the ids of Book rows written before commit
+PENDING_BOOK_IDS = "book_cache_pending_ids"
+
+
+@dataclass(frozen=True)
+class CachedBook:
+    """Immutable snapshot of a Book row"""
+
+    id: int
+    title: Optional[str]
+    author: Optional[str]
+    isbn: Optional[str]
+    description: Optional[str]
+    category: Optional[str]
+    language: Optional[str]
+    rating: Optional[float]
+    year: Optional[int]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, book: Book) -> "CachedBook":
+        return cls(
+            id=book.id,
+            title=book.title,
+            author=book.author,
+            isbn=book.isbn,
+            description=book.description,
+            category=book.category,
+            language=book.language,
+            rating=book.rating,
+            year=book.year,
+            created_at=book.created_at,
+        )
+
+
+_MISSING = object()
+
+
+class _LRUMap:
+    """Thread-safe bounded LRU mapping whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (value, monotonic expiry or None)
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class BookCache:
+    """Read-through cache over Book lookups by id, title and ISBN"""
+
+    # Live caches, so write events can invalidate every one of them
+    _instances: "weakref.WeakSet[BookCache]" = weakref.WeakSet()
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        maxsize: int = 1024,
+        ttl: float = 300,
+        catalog_limit: int = 10000,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.catalog_limit = catalog_limit
+        self._by_id = _LRUMap(maxsize, ttl)
+        self._by_title = _LRUMap(maxsize, ttl)
+        self._by_isbn = _LRUMap(maxsize, ttl)
+        self._all_books = _LRUMap(1, ttl)
+        # Bumped by every invalidation; a lookup only caches what it loaded
+        # if no invalidation happened while it was reading
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        BookCache._instances.add(self)
+
+    def _put_if_current(self, generation: int, entries) -> None:
+        with self._generation_lock:
+            if generation != self._generation:
+                return
+            for cache, key, value in entries:
+                cache.put(key, value)
+
+    def _read_through(self, cache: _LRUMap, key, loader) -> Optional[CachedBook]:
+        value = cache.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        generation = self._generation
+        db = self.session_factory()
+        try:
+            book = loader(db)
+            value = CachedBook.from_model(book) if book is not None else None
+        finally:
+            db.close()
+
+        # Negative results are cached too; inserts invalidate them
+        entries = [(cache, key, value)]
+        if value is not None:
+            entries.append((self._by_id, value.id, value))
+        self._put_if_current(generation, entries)
+        return value
+
+    def get_by_id(self, book_id: int) -> Optional[CachedBook]:
+        """Get a book by primary key"""
+        return self._read_through(
+            self._by_id, book_id, lambda db: db.get(Book, book_id)
+        )
+
+    def get_by_title(self, title: str) -> Optional[CachedBook]:
+        """Get the first book whose title contains the given text"""
+        key = title.strip().lower()
+        return self._read_through(
+            self._by_title,
+            key,
+            lambda db: db.query(Book)
+            .filter(Book.title.ilike(f"%{title.strip()}%"))
+            .order_by(Book.id)
+            .first(),
+        )
+
+    def get_by_isbn(self, isbn: str) -> Optional[CachedBook]:
+        """Get a book by its ISBN (external catalog key)"""
+        return self._read_through(
+            self._by_isbn,
+            isbn,
+            lambda db: db.query(Book).filter(Book.isbn == isbn).first(),
+        )
+
+    def list_books(self) -> List[CachedBook]:
+        """
+        Get a snapshot of the whole catalog.
+
+        The snapshot is only cached while the catalog has at most
+        catalog_limit books, so memory stays bounded for large catalogs.
+        """
+        books = self._all_books.get(None)
+        if books is not _MISSING:
+            self.hits += 1
+            return books
+
+        self.misses += 1
+        generation = self._generation
+        db = self.session_factory()
+        try:
+            books = [CachedBook.from_model(book) for book in db.query(Book).all()]
+        finally:
+            db.close()
+
+        if len(books) <= self.catalog_limit:
+            self._put_if_current(generation, [(self._all_books, None, books)])
+        return books
+
+    def invalidate(self, book_id: Optional[int] = None) -> None:
+        """
+        Drop cached entries affected by a write.
+
+        Title lookups are substring matches, so any write can change their
+        answer and the whole title map is cleared. Id and ISBN entries are
+        dropped for the written row; the ISBN map is cleared as well because
+        a changed ISBN leaves a stale entry under the old key.
+        """
+        with self._generation_lock:
+            self._generation += 1
+            if book_id is not None:
+                self._by_id.pop(book_id)
+            self._by_title.clear()
+            self._by_isbn.clear()
+            self._all_books.clear()
+
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        self._by_id.clear()
+        self.invalidate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache size and hit statistics"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries_by_id": len(self._by_id),
+            "entries_by_title": len(self._by_title),
+            "entries_by_isbn": len(self._by_isbn),
+        }
+
+
+book_cache = BookCache(
+    maxsize=int(os.getenv("BOOK_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("BOOK_CACHE_TTL", "300")),
+    catalog_limit=int(os.getenv("BOOK_CACHE_CATALOG_LIMIT", "10000")),
+)
+
+
+def _invalidate_all(book_ids) -> None:
+    for cache in list(BookCache._instances):
+        for book_id in book_ids:
+            cache.invalidate(book_id)
+
+
+@event.listens_for(Book, "after_insert")
+@event.listens_for(Book, "after_update")
+@event.listens_for(Book, "after_delete")
+def _record_book_write(mapper, connection, target):
+    # Flushed rows are not visible to other sessions until commit; a lookup
+    # between flush and commit would cache the old row again
+    session = object_session(target)
+    if session is None:
+        _invalidate_all([target.id])
+        return
+    session.info.setdefault(PENDING_BOOK_IDS, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_book_cache(session):
+    book_ids = session.info.pop(PENDING_BOOK_IDS, None)
+    if book_ids:
+        _invalidate_all(book_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_book_writes(session):
+    session.info.pop(PENDING_BOOK_IDS, None)
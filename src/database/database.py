@@ -1,58 +1,3 @@
-from __future__ import annotations
-
-import os
-from typing import Generator
-
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./luminis_library.db")
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-    if SQLALCHEMY_DATABASE_URL.startswith("sqlite")
-    else {},
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-
-class User(Base):
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
-
-
-def get_db() -> Generator:
-    database_session = SessionLocal()
-    try:
-        yield database_session
-    finally:
-        database_session.close()
-
-
-def create_tables() -> None:
-    Base.metadata.create_all(bind=engine)
-
-
-def init_sample_data() -> None:
-    create_tables()
-    # Minimal seed to satisfy tests; extend with real data if needed
-    database_session = SessionLocal()
-    try:
-        # Ensure at least one user exists for sanity checks
-        if database_session.query(User).first() is None:
-            demo = User(username="demo", email="demo@example.com")
-            database_session.add(demo)
-            database_session.commit()
-    finally:
-        database_session.close()
-
-
 """
 Database Models and Configuration for Luminis.AI Library Assistant
 ===============================================================
@@ -73,6 +18,8 @@ Core Models:
 2. Book: Book catalog with metadata and categorization
 3. UserBook: User-book relationships with status tracking
 4. ChatHistory: Conversation history for AI interactions
+5. UserReadingStats: Incrementally maintained per-user reading aggregates
+6. books_fts: SQLite FTS5 index mirroring the searchable Book columns
 
 Key Features:
 - Multi-provider authentication (local, Google, GitHub, Microsoft)
@@ -89,10 +36,12 @@ Database Relationships:
 - Proper indexing for performance optimization
 
 Configuration:
-- Environment-based database URL configuration
+- Environment-based database URL configuration (DATABASE_URL)
 - SQLite default for development
 - PostgreSQL/MySQL support for production
+- SQL echo logging opt-in via DATABASE_ECHO
 - Automatic table creation and migration
+- Lazy engine creation: importing this module performs no I/O
 
 This module is essential for:
 - User account management and authentication
@@ -113,44 +62,93 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     Float,
+    Index,
+    JSON,
+    tuple_,
+    select,
+    event,
+    inspect,
+    or_,
+    text,
+    func,
 )
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+from collections import Counter
 from datetime import datetime
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import os
-from dotenv import load_dotenv
 import enum
 
-# Load environment variables
-load_dotenv()
+DEFAULT_DATABASE_URL = "sqlite:///./luminis_library.db"
+DOCKER_DATABASE_PATH = "/app/luminis_library.db"
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_database_url() -> str:
+    """Resolve the database URL from the environment"""
+    from dotenv import load_dotenv
 
-# Database configuration
-DATABASE_URL = os.getenv(
-    "DATABASE_URL", "sqlite:///./luminis_library.db"
-)  # Use SQLite for testing
+    load_dotenv()
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
 
-# For Docker container, use absolute path
-if os.path.exists("/app/luminis_library.db"):
-    DATABASE_URL = "sqlite:////app/luminis_library.db"
-    print(f"DEBUG: Using Docker database path: {DATABASE_URL}")
-else:
-    print(f"DEBUG: Using local database path: {DATABASE_URL}")
+    # Inside the Docker image the database lives at an absolute path
+    if os.path.exists(DOCKER_DATABASE_PATH):
+        return f"sqlite:///{DOCKER_DATABASE_PATH}"
+    return DEFAULT_DATABASE_URL
 
-# Force SQLite for development
-if "mysql" in DATABASE_URL.lower():
-    print("WARNING: MySQL detected, switching to SQLite for development")
-    DATABASE_URL = "sqlite:///./luminis_library.db"
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL, echo=True)
+def get_engine():
+    """
+    Get the SQLAlchemy engine, creating it on first use.
+
+    Nothing is read from the environment or disk until the first caller
+    needs a connection, which keeps importing this module free of I/O.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = get_database_url()
+                _engine = create_engine(
+                    url,
+                    echo=os.getenv("DATABASE_ECHO", "").lower() in ("1", "true"),
+                    connect_args={"check_same_thread": False}
+                    if url.startswith("sqlite")
+                    else {},
+                )
+    return _engine
+
+
+class _LazySessionMaker(sessionmaker):
+    """sessionmaker that binds to the engine when the first session is made"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = _LazySessionMaker(autocommit=False, autoflush=False)
 
-# Create Base class
+# Create Base class; the single registry for every model in the application
 Base = declarative_base()
 
 
+def __getattr__(name):
+    # Keep `from database.database import engine` working without creating
+    # the engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Enums
 class BookStatus(enum.Enum):
     READING = "reading"
@@ -223,12 +221,191 @@ class ChatHistory(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     message = Column(Text)
     response = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Keyset pagination orders by (timestamp, id), so a timestamp is required
+    timestamp = Column(
+        DateTime, nullable=False, default=datetime.utcnow, server_default=func.now()
+    )
+
+    # Composite index backing keyset pagination on (timestamp, id) per user
+    __table_args__ = (
+        Index("ix_chat_history_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
 
     # Relationships
     user = relationship("User", back_populates="chat_history")
 
 
+class UserReadingStats(Base):
+    __tablename__ = "user_reading_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_books = Column(Integer, default=0)
+    status_counts = Column(JSON, default=dict)
+    genre_counts = Column(JSON, default=dict)
+    author_counts = Column(JSON, default=dict)
+    decade_counts = Column(JSON, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Reading statistics maintenance
+READING_STATS_DIMENSIONS = ("status", "genre", "author", "decade")
+
+
+def _reading_stats_keys(connection, book_id, status) -> Dict[str, Optional[str]]:
+    """Resolve the aggregate keys a single UserBook row contributes to"""
+    book = None
+    if book_id is not None:
+        book = connection.execute(
+            select(Book.category, Book.author, Book.year).where(Book.id == book_id)
+        ).first()
+
+    if isinstance(status, BookStatus):
+        status = status.value
+
+    return {
+        "status": status,
+        "genre": book.category if book else None,
+        "author": book.author if book else None,
+        "decade": str(book.year // 10 * 10) if book and book.year else None,
+    }
+
+
+def _apply_reading_stats_delta(connection, user_id, keys, delta: int) -> None:
+    """Add delta (+1/-1) to every aggregate a UserBook row contributes to"""
+    if user_id is None:
+        return
+
+    table = UserReadingStats.__table__
+    row = connection.execute(select(table).where(table.c.user_id == user_id)).first()
+
+    values = {"total_books": (row.total_books if row else 0) + delta}
+    for dimension in READING_STATS_DIMENSIONS:
+        column = f"{dimension}_counts"
+        counts = Counter((getattr(row, column) if row else None) or {})
+        key = keys.get(dimension)
+        if key is not None:
+            counts[key] += delta
+            if counts[key] <= 0:
+                del counts[key]
+        values[column] = dict(counts)
+    values["updated_at"] = datetime.utcnow()
+
+    if row is None:
+        connection.execute(table.insert().values(user_id=user_id, **values))
+    else:
+        connection.execute(
+            table.update().where(table.c.user_id == user_id).values(**values)
+        )
+
+
+def _previous_value(target, attribute):
+    """Value an attribute had before the pending flush"""
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attribute)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    """No-op set listener; registering it with active_history=True makes
+    SQLAlchemy load the old value so after_update can subtract it"""
+
+
+for _attribute in (UserBook.user_id, UserBook.book_id, UserBook.status):
+    event.listen(_attribute, "set", _load_previous_value, active_history=True)
+
+
+@event.listens_for(UserBook, "after_insert")
+def _user_book_inserted(mapper, connection, target):
+    keys = _reading_stats_keys(connection, target.book_id, target.status)
+    _apply_reading_stats_delta(connection, target.user_id, keys, +1)
+
+
+@event.listens_for(UserBook, "after_update")
+def _user_book_updated(mapper, connection, target):
+    old_user_id = _previous_value(target, "user_id")
+    old_book_id = _previous_value(target, "book_id")
+    old_status = _previous_value(target, "status")
+
+    if (old_user_id, old_book_id, old_status) == (
+        target.user_id,
+        target.book_id,
+        target.status,
+    ):
+        return
+
+    old_keys = _reading_stats_keys(connection, old_book_id, old_status)
+    _apply_reading_stats_delta(connection, old_user_id, old_keys, -1)
+    new_keys = _reading_stats_keys(connection, target.book_id, target.status)
+    _apply_reading_stats_delta(connection, target.user_id, new_keys, +1)
+
+
+@event.listens_for(UserBook, "after_delete")
+def _user_book_deleted(mapper, connection, target):
+    keys = _reading_stats_keys(
+        connection,
+        _previous_value(target, "book_id"),
+        _previous_value(target, "status"),
+    )
+    _apply_reading_stats_delta(connection, _previous_value(target, "user_id"), keys, -1)
+
+
+def get_reading_stats(db, user_id: int) -> Dict[str, Any]:
+    """Return the precomputed reading statistics for a user"""
+    stats = db.get(UserReadingStats, user_id)
+    if stats is None:
+        return {
+            "user_id": user_id,
+            "total_books": 0,
+            "status_counts": {},
+            "genre_counts": {},
+            "author_counts": {},
+            "decade_counts": {},
+            "updated_at": None,
+        }
+
+    return {
+        "user_id": stats.user_id,
+        "total_books": stats.total_books,
+        "status_counts": stats.status_counts or {},
+        "genre_counts": stats.genre_counts or {},
+        "author_counts": stats.author_counts or {},
+        "decade_counts": stats.decade_counts or {},
+        "updated_at": stats.updated_at.isoformat() if stats.updated_at else None,
+    }
+
+
+def rebuild_reading_stats(db, user_id: Optional[int] = None) -> int:
+    """
+    Recompute reading statistics from scratch.
+
+    Only needed to backfill rows that predate the incremental listeners or to
+    repair drift; normal writes keep the table current on their own.
+
+    Returns:
+        Number of users whose statistics were rebuilt
+    """
+    query = db.query(UserReadingStats)
+    if user_id is not None:
+        query = query.filter(UserReadingStats.user_id == user_id)
+    query.delete(synchronize_session=False)
+    db.flush()
+
+    connection = db.connection()
+    entries = db.query(UserBook.user_id, UserBook.book_id, UserBook.status)
+    if user_id is not None:
+        entries = entries.filter(UserBook.user_id == user_id)
+
+    users = set()
+    for entry_user_id, book_id, status in entries:
+        keys = _reading_stats_keys(connection, book_id, status)
+        _apply_reading_stats_delta(connection, entry_user_id, keys, +1)
+        users.add(entry_user_id)
+
+    db.commit()
+    return len(users)
+
+
 # Database dependency
 def get_db():
     db = SessionLocal()
@@ -238,9 +415,230 @@ def get_db():
         db.close()
 
 
+# Chat history queries
+ChatHistoryCursor = Tuple[datetime, int]
+
+# Stored for rows that predate the NOT NULL timestamp, so they sort oldest
+CHAT_HISTORY_MISSING_TIMESTAMP = datetime(1970, 1, 1)
+
+
+def ensure_chat_history_timestamps(connection) -> int:
+    """
+    Backfill chat history rows written before timestamps were required.
+
+    Tables created by an older schema keep their nullable column; their NULL
+    timestamps would break the (timestamp, id) keyset comparison, so they are
+    replaced with CHAT_HISTORY_MISSING_TIMESTAMP.
+
+    Returns:
+        Number of rows updated
+    """
+    table = ChatHistory.__table__
+    result = connection.execute(
+        table.update()
+        .where(table.c.timestamp.is_(None))
+        .values(timestamp=CHAT_HISTORY_MISSING_TIMESTAMP)
+    )
+    return result.rowcount
+
+
+def get_chat_history_page(
+    db,
+    user_id: int,
+    limit: int = 50,
+    before: Optional[ChatHistoryCursor] = None,
+) -> Tuple[List[ChatHistory], Optional[ChatHistoryCursor]]:
+    """
+    Return one page of a user's chat history, newest first.
+
+    Uses keyset pagination on (timestamp, id) instead of OFFSET so that every
+    page is a single index range scan, no matter how deep the user scrolls.
+
+    Args:
+        db: Database session
+        user_id: Owner of the history
+        limit: Maximum number of rows in the page
+        before: Cursor returned by the previous page, or None for the first page
+
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+    """
+    query = db.query(ChatHistory).filter(ChatHistory.user_id == user_id)
+    if before is not None:
+        query = query.filter(tuple_(ChatHistory.timestamp, ChatHistory.id) < before)
+
+    # Fetch one extra row to know whether another page exists
+    rows = (
+        query.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].timestamp, rows[-1].id)
+
+    return rows, next_cursor
+
+
+def iter_chat_history(db, user_id: int, batch_size: int = 500) -> Iterator[ChatHistory]:
+    """
+    Stream a user's full chat history in chronological order.
+
+    Rows are read in keyset batches so memory stays bounded and each batch
+    costs the same as the first one.
+    """
+    after: Optional[ChatHistoryCursor] = None
+    while True:
+        query = db.query(ChatHistory).filter(ChatHistory.user_id == user_id)
+        if after is not None:
+            query = query.filter(tuple_(ChatHistory.timestamp, ChatHistory.id) > after)
+
+        rows = (
+            query.order_by(ChatHistory.timestamp.asc(), ChatHistory.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return
+
+        for row in rows:
+            yield row
+
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1].timestamp, rows[-1].id)
+
+
+# Full-text search over books (SQLite FTS5)
+#
+# unicode61 folds case and, with remove_diacritics 2, maps ç/ş/ğ/ö/ü to their
+# ASCII base letters so "suc ve ceza" finds "Suç ve Ceza". The dotless ı has
+# no decomposition, so it is mapped to i both in the triggers and in queries.
+BOOKS_FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+BOOKS_FTS_COLUMNS = ("title", "author", "description", "category")
+# bm25 column weights: title and author hits outrank description hits
+BOOKS_FTS_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+
+def _fts_value(prefix: str, column: str) -> str:
+    return f"replace(coalesce({prefix}.{column}, ''), 'ı', 'i')"
+
+
+def _fts_insert_sql(prefix: str) -> str:
+    values = ", ".join(_fts_value(prefix, column) for column in BOOKS_FTS_COLUMNS)
+    return (
+        f"INSERT INTO books_fts(rowid, {', '.join(BOOKS_FTS_COLUMNS)}) "
+        f"VALUES ({prefix}.id, {values});"
+    )
+
+
+BOOKS_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        {", ".join(BOOKS_FTS_COLUMNS)},
+        tokenize = '{BOOKS_FTS_TOKENIZER}',
+        prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        {_fts_insert_sql("new")}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.id;
+        {_fts_insert_sql("new")}
+    END""",
+]
+
+
+def ensure_books_search_index(connection) -> None:
+    """
+    Create the books_fts table and its sync triggers if they are missing.
+
+    Rows that predate the triggers are backfilled, so this is safe to run
+    against an existing database. No-op on databases other than SQLite.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+
+    for statement in BOOKS_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+    indexed = connection.exec_driver_sql("SELECT count(*) FROM books_fts").scalar()
+    total = connection.exec_driver_sql("SELECT count(*) FROM books").scalar()
+    if indexed != total:
+        values = ", ".join(_fts_value("books", column) for column in BOOKS_FTS_COLUMNS)
+        connection.exec_driver_sql("DELETE FROM books_fts")
+        connection.exec_driver_sql(
+            f"INSERT INTO books_fts(rowid, {', '.join(BOOKS_FTS_COLUMNS)}) "
+            f"SELECT books.id, {values} FROM books"
+        )
+
+
+@event.listens_for(Book.__table__, "after_create")
+def _create_books_search_index(target, connection, **kw):
+    ensure_books_search_index(connection)
+
+
+def _fts_match_expression(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression of quoted prefix terms"""
+    terms = re.findall(r"\w+", query.replace("ı", "i").replace("I", "i"))
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_books_fulltext(db, query: str, limit: int = 10) -> List[Tuple[Book, float]]:
+    """
+    Ranked full-text search over title, author, description and category.
+
+    On SQLite this uses the books_fts index ranked by weighted bm25. Other
+    databases fall back to a case-insensitive substring match with a
+    constant score.
+
+    Returns:
+        List of (book, score) tuples, best match first; higher score is better
+    """
+    expression = _fts_match_expression(query)
+    # SQLite treats a negative LIMIT as no limit at all
+    if expression is None or limit < 1:
+        return []
+
+    if db.get_bind().dialect.name != "sqlite":
+        pattern = f"%{query.strip()}%"
+        conditions = [
+            getattr(Book, column).ilike(pattern) for column in BOOKS_FTS_COLUMNS
+        ]
+        books = db.query(Book).filter(or_(*conditions)).limit(limit).all()
+        return [(book, 1.0) for book in books]
+
+    weights = ", ".join(str(weight) for weight in BOOKS_FTS_WEIGHTS)
+    rows = db.execute(
+        text(
+            f"SELECT rowid, -bm25(books_fts, {weights}) AS score FROM books_fts "
+            "WHERE books_fts MATCH :expression ORDER BY score DESC LIMIT :limit"
+        ),
+        {"expression": expression, "limit": limit},
+    ).all()
+    if not rows:
+        return []
+
+    books = {
+        book.id: book
+        for book in db.query(Book).filter(Book.id.in_([row.rowid for row in rows]))
+    }
+    return [(books[row.rowid], row.score) for row in rows if row.rowid in books]
+
+
 # Create tables
 def create_tables():
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        ensure_books_search_index(connection)
+        ensure_chat_history_timestamps(connection)
 
 
 # Initialize database with sample data
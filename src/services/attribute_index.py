@@ -0,0 +1,309 @@
+"""
+Attribute Index for Luminis.AI Library Assistant
+================================================
+
+
+Bitset indexes over the metadata of a vector store. A filtered search used
+to evaluate its `where` clause against the metadata of every document before
+the vector scan; with these indexes the eligible rows come from intersecting
+a few precomputed bitsets, and only those rows are scored.
+
+Key Features:
+1. Exact Attributes: One bitset per category and per language value
+2. Bucketed Ranges: Years are bucketed by decade and ratings by half star;
+   cumulative bitsets answer any range with two bitset operations, and exact
+   values are only compared in the two boundary buckets
+3. Exact Semantics: Clauses the bitsets cannot answer ($or, $ne, author, ...)
+   are returned as a residual filter for the eligible rows only, so results
+   equal a full metadata scan
+4. Compact Storage: Bitsets are packed eight rows per byte and persisted
+   with the store they describe (attributes.npz)
+"""
+
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ATTRIBUTES_FILE = "attributes.npz"
+
+# Attributes with one bitset per distinct value; only low-cardinality fields
+# belong here, since every value costs one bit per row
+EXACT_ATTRIBUTES = ("category", "language")
+# Numeric attributes and their bucket widths (decades, half stars)
+RANGE_ATTRIBUTES = {"year": 10, "rating": 0.5}
+
+RANGE_OPERATORS = {
+    "$eq": np.equal,
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float))
+
+
+def _is_scalar(value: Any) -> bool:
+    # Persisted as JSON keys; NaN is never equal to anything
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    return value is None or isinstance(value, (str, int, float))
+
+
+def _flatten(where: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split a filter into single-field clauses that must all hold"""
+    clauses = []
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                clauses += _flatten(clause)
+        else:
+            clauses.append({key: condition})
+    return clauses
+
+
+class AttributeIndex:
+    """Packed bitsets over the rows of a store, one row per document"""
+
+    def __init__(
+        self,
+        size: int,
+        exact: Dict[str, Dict[Any, np.ndarray]],
+        ranges: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    ):
+        self.size = size
+        # exact[attribute][value]: rows whose attribute equals value
+        self.exact = exact
+        # ranges[attribute]: (sorted buckets, cumulative[i] = rows in buckets
+        # up to buckets[i], exact values with NaN for non-numbers)
+        self.ranges = ranges
+
+    @classmethod
+    def build(cls, metadatas: Sequence[Optional[Dict[str, Any]]]) -> "AttributeIndex":
+        """Index a list of metadata dicts; None marks an empty row"""
+        size = len(metadatas)
+        exact_rows: Dict[str, Dict[Any, List[int]]] = {
+            attribute: {} for attribute in EXACT_ATTRIBUTES
+        }
+        values = {attribute: np.full(size, np.nan) for attribute in RANGE_ATTRIBUTES}
+        for row, metadata in enumerate(metadatas):
+            if not metadata:
+                continue
+            for attribute in EXACT_ATTRIBUTES:
+                value = metadata.get(attribute)
+                # Lists and dicts never equal the scalar values bitsets answer
+                if attribute in metadata and _is_scalar(value):
+                    exact_rows[attribute].setdefault(value, []).append(row)
+            for attribute in RANGE_ATTRIBUTES:
+                value = metadata.get(attribute)
+                if _is_number(value):
+                    values[attribute][row] = value
+
+        exact = {}
+        for attribute, rows_by_value in exact_rows.items():
+            exact[attribute] = {}
+            for value, rows in rows_by_value.items():
+                mask = np.zeros(size, dtype=bool)
+                mask[rows] = True
+                exact[attribute][value] = np.packbits(mask)
+
+        ranges = {}
+        for attribute, width in RANGE_ATTRIBUTES.items():
+            column = values[attribute]
+            present = ~np.isnan(column)
+            bucket_of = np.zeros(size, dtype=np.int64)
+            bucket_of[present] = np.floor(column[present] / width)
+            buckets = np.unique(bucket_of[present])
+            cumulative = np.zeros((len(buckets), (size + 7) // 8), dtype=np.uint8)
+            for index, bucket in enumerate(buckets):
+                cumulative[index] = np.packbits(present & (bucket_of <= bucket))
+            ranges[attribute] = (buckets, cumulative, column)
+        return cls(size, exact, ranges)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the bitsets and numeric columns"""
+        total = sum(
+            bits.nbytes for values in self.exact.values() for bits in values.values()
+        )
+        return total + sum(
+            buckets.nbytes + cumulative.nbytes + column.nbytes
+            for buckets, cumulative, column in self.ranges.values()
+        )
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _exact_bits(self, attribute: str, condition: Any) -> Optional[np.ndarray]:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if len(condition) != 1:
+            return None
+        ((operator, expected),) = condition.items()
+        if operator == "$eq":
+            expected = [expected]
+        elif operator != "$in" or not isinstance(expected, (list, tuple, set)):
+            return None
+        if not all(_is_scalar(value) for value in expected):
+            return None
+        bits = self._empty()
+        for value in expected:
+            if value in self.exact[attribute]:
+                bits |= self.exact[attribute][value]
+        return bits
+
+    def _cumulative(self, attribute: str, index: int) -> np.ndarray:
+        """Rows in the buckets up to and including buckets[index]"""
+        if index < 0:
+            return self._empty()
+        return self.ranges[attribute][1][index]
+
+    def _range_bits(self, attribute: str, condition: Any) -> Optional[np.ndarray]:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if not condition or not all(
+            operator in RANGE_OPERATORS
+            and _is_number(expected)
+            and math.isfinite(expected)
+            for operator, expected in condition.items()
+        ):
+            return None
+        buckets, _, column = self.ranges[attribute]
+        width = RANGE_ATTRIBUTES[attribute]
+        low, high = -math.inf, math.inf
+        for operator, expected in condition.items():
+            if operator in ("$eq", "$gt", "$gte"):
+                low = max(low, expected)
+            if operator in ("$eq", "$lt", "$lte"):
+                high = min(high, expected)
+        if low > high:
+            return self._empty()
+
+        # Rows in buckets [first, last]: cumulative[last] minus cumulative[first - 1]
+        first = (
+            0
+            if low == -math.inf
+            else int(np.searchsorted(buckets, math.floor(low / width), "left"))
+        )
+        last = (
+            len(buckets) - 1
+            if high == math.inf
+            else int(np.searchsorted(buckets, math.floor(high / width), "right")) - 1
+        )
+        if first > last:
+            return self._empty()
+        bits = self._cumulative(attribute, last) & ~self._cumulative(
+            attribute, first - 1
+        )
+
+        # Only the boundary buckets can hold rows outside the range
+        boundary = self._cumulative(attribute, first) & ~self._cumulative(
+            attribute, first - 1
+        )
+        boundary |= self._cumulative(attribute, last) & ~self._cumulative(
+            attribute, last - 1
+        )
+        rows = np.flatnonzero(np.unpackbits(boundary, count=self.size))
+        if len(rows):
+            values = column[rows]
+            keep = np.ones(len(rows), dtype=bool)
+            for operator, expected in condition.items():
+                keep &= RANGE_OPERATORS[operator](values, expected)
+            failing = np.zeros(self.size, dtype=bool)
+            failing[rows[~keep]] = True
+            bits &= ~np.packbits(failing)
+        return bits
+
+    def select(
+        self, where: Dict[str, Any]
+    ) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """
+        Rows satisfying the indexed clauses of a filter.
+
+        Returns:
+            The matching rows in ascending order, or None if no clause is
+            indexed, and the clauses still to evaluate per row (None if all
+            of them were answered by the bitsets)
+        """
+        bits, residual = None, []
+        for clause in _flatten(where):
+            ((attribute, condition),) = clause.items()
+            clause_bits = None
+            if attribute in self.exact:
+                clause_bits = self._exact_bits(attribute, condition)
+            elif attribute in self.ranges:
+                clause_bits = self._range_bits(attribute, condition)
+            if clause_bits is None:
+                residual.append(clause)
+            else:
+                bits = clause_bits if bits is None else bits & clause_bits
+
+        if not residual:
+            residual = None
+        elif len(residual) == 1:
+            residual = residual[0]
+        else:
+            residual = {"$and": residual}
+        if bits is None:
+            return None, residual
+        return np.flatnonzero(np.unpackbits(bits, count=self.size)), residual
+
+    def save(self, directory: str) -> str:
+        """Write the index under a temporary name and return its path"""
+        arrays = {
+            "size": np.array(self.size),
+            "keys": np.array(
+                json.dumps(
+                    {
+                        attribute: list(values)
+                        for attribute, values in self.exact.items()
+                    }
+                )
+            ),
+        }
+        for attribute, values in self.exact.items():
+            arrays[f"{attribute}_bits"] = (
+                np.stack(list(values.values()))
+                if values
+                else np.zeros((0, (self.size + 7) // 8), dtype=np.uint8)
+            )
+        for attribute, (buckets, cumulative, column) in self.ranges.items():
+            arrays[f"{attribute}_buckets"] = buckets
+            arrays[f"{attribute}_cumulative"] = cumulative
+            arrays[f"{attribute}_values"] = column
+        tmp_path = os.path.join(directory, ATTRIBUTES_FILE.replace(".npz", ".tmp.npz"))
+        np.savez(tmp_path, **arrays)
+        return tmp_path
+
+    @classmethod
+    def load(cls, directory: str, size: int) -> Optional["AttributeIndex"]:
+        """Load a persisted index, or None if it is missing or out of date"""
+        path = os.path.join(directory, ATTRIBUTES_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["size"]) != size:
+                return None
+            keys = json.loads(str(data["keys"]))
+            if set(keys) != set(EXACT_ATTRIBUTES) or not all(
+                f"{attribute}_values" in data.files for attribute in RANGE_ATTRIBUTES
+            ):
+                return None
+            exact = {
+                attribute: dict(zip(keys[attribute], data[f"{attribute}_bits"]))
+                for attribute in EXACT_ATTRIBUTES
+            }
+            ranges = {
+                attribute: (
+                    data[f"{attribute}_buckets"],
+                    data[f"{attribute}_cumulative"],
+                    data[f"{attribute}_values"],
+                )
+                for attribute in RANGE_ATTRIBUTES
+            }
+        return cls(size, exact, ranges)
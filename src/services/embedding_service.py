@@ -0,0 +1,659 @@
+"""
+Embedding Service for Luminis.AI Library Assistant
+=================================================
+
+
+This service sits between the vector stores and the embedding provider. It keeps
+an on-disk cache of document embeddings so that rebuilding a vector store only
+pays for books whose text actually changed, and drives large builds through a
+batched, concurrent pipeline that survives rate limits and interruptions.
+
+Key Features:
+1. Content-addressed Cache: Embeddings are keyed by a hash of the model name and
+   the exact document text, so any edit to a book produces a new key
+2. Persistent Storage: Vectors live in a small SQLite file and survive restarts
+3. Drop-in Wrapper: CachedEmbeddings exposes the same embed_documents/embed_query
+   interface as LangChain embeddings and can be passed to Chroma directly
+4. Embedding Pipeline: Splits uncached documents into batches, embeds them with
+   bounded concurrency and retries rate-limited batches with exponential backoff
+5. Checkpointing: Every finished batch is written to the cache immediately, so an
+   interrupted build resumes with the batches that are still missing
+6. Pluggable Backends: OpenAI embeddings or a local, NumPy-vectorized hashed
+   n-gram embedder that needs no API key or network access
+7. Query Cache: Search queries are normalized and their embeddings kept in a
+   bounded in-memory LRU backed by the same SQLite file, so repeated queries
+   such as "Kategori: Roman" never reach the provider twice
+8. Usage Accounting: Provider calls, texts, tokens and seconds spent in the
+   provider are counted (tokens with tiktoken when installed, otherwise
+   estimated at four characters per token)
+
+Configuration:
+- EMBEDDING_BACKEND: "openai" (default) or "local"
+- EMBEDDING_MODEL: OpenAI embedding model (default text-embedding-ada-002)
+- EMBEDDING_DIMENSIONS: Vector size of the local backend (default 512)
+- EMBEDDING_CACHE_PATH: Location of the cache file (default ./embedding_cache.sqlite3)
+- QUERY_EMBEDDING_CACHE_SIZE: Query embeddings kept in memory (default 2048)
+- EMBEDDING_BATCH_SIZE: Documents per embedding request (default 100)
+- EMBEDDING_MAX_CONCURRENCY: Embedding requests in flight at once (default 4)
+- EMBEDDING_MAX_RETRIES: Retries per batch on rate limits (default 6)
+
+Benefits:
+- Rebuild cost scales with the number of changed books, not the catalog size
+- Fewer embedding API calls and lower cost
+- Faster vector store rebuilds after restarts
+"""
+
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Exact token counts for usage metrics; estimated without it
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_EMBEDDING_CACHE_PATH = "./embedding_cache.sqlite3"
+
+
+def content_hash(text: str, model_name: str) -> str:
+    """Hash a document text together with the model that embeds it"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent key -> vector store backed by SQLite"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH
+        )
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dimension INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors for the given keys; missing keys are omitted"""
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            connection = self._connect()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    "SELECT key, vector FROM embeddings "
+                    f"WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Iterable[tuple]) -> None:
+        """Store (key, vector) pairs"""
+        rows = [
+            (key, len(vector), np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dimension, vector) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._connect().execute("SELECT count(*) FROM embeddings").fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a search query used as its cache key"""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Two-level cache of query embeddings: a bounded in-memory LRU in front of
+    the persistent EmbeddingCache. Keys live in their own namespace so query
+    and document vectors for the same text never collide.
+    """
+
+    def __init__(self, disk_cache: EmbeddingCache, maxsize: int = 2048):
+        self.disk_cache = disk_cache
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, model_name: str) -> str:
+        return content_hash(f"query\0{query}", model_name)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                # Copy so callers cannot modify the cached vector
+                return list(vector)
+
+        stored = self.disk_cache.get_many([key]).get(key)
+        if stored is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        vector = stored.tolist()
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(key, vector)
+        return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        self.disk_cache.put_many([(key, vector)])
+        self._remember(key, vector)
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface shared by all embedding providers.
+
+    Backends follow the LangChain embeddings protocol, so OpenAIEmbeddings
+    qualifies as is and any backend can be passed to a vector store. A
+    subclass missing either method fails when it is instantiated.
+    """
+
+    model_name: str
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of documents"""
+
+    @abstractmethod
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single search query"""
+
+
+class HashingEmbeddings(EmbeddingBackend):
+    """
+    Local embedding backend based on the hashing trick.
+
+    Words and character n-grams of each text are hashed into a fixed number
+    of signed buckets, weighted sublinearly and L2-normalized. N-gram hashes
+    are computed with vectorized NumPy rolling hashes, so embedding is cheap
+    on a CPU and fully deterministic across processes and machines.
+    """
+
+    # Bump when the feature extraction changes so cached vectors are not reused
+    VERSION = 1
+
+    _WORD_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, dimension: int = 512, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+        self.model_name = f"local-hashing-v{self.VERSION}-{dimension}"
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        # Fold case and diacritics so "Suç" and "suc" share features
+        text = text.replace("ı", "i").replace("İ", "i").casefold()
+        text = unicodedata.normalize("NFKD", text)
+        return "".join(char for char in text if not unicodedata.combining(char))
+
+    @staticmethod
+    def _mix(hashes: np.ndarray) -> np.ndarray:
+        # splitmix64 finalizer spreads rolling hashes over all 64 bits
+        hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return hashes ^ (hashes >> np.uint64(31))
+
+    def _ngram_hashes(self, text: str) -> np.ndarray:
+        codes = np.frombuffer(f" {text} ".encode("utf-32-le"), dtype=np.uint32)
+        codes = codes.astype(np.uint64)
+        parts = []
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            if len(codes) < n:
+                break
+            windows = len(codes) - n + 1
+            hashes = np.full(windows, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = (
+                    hashes * np.uint64(1099511628211) + codes[offset : offset + windows]
+                )
+            parts.append(self._mix(hashes))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+
+    def _word_hashes(self, text: str) -> np.ndarray:
+        words = self._WORD_PATTERN.findall(text)
+        hashes = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in words),
+            dtype=np.uint64,
+            count=len(words),
+        )
+        return self._mix(hashes + np.uint64(1 << 40))
+
+    def _embed(self, text: str) -> np.ndarray:
+        text = self._normalize(text)
+        hashes = np.concatenate([self._word_hashes(text), self._ngram_hashes(text)])
+        if hashes.size == 0:
+            return np.zeros(self.dimension, dtype=np.float32)
+
+        buckets = (hashes % np.uint64(self.dimension)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        counts = np.bincount(buckets, weights=signs, minlength=self.dimension)
+
+        # Sublinear term frequency, then unit length for cosine similarity
+        vector = np.sign(counts) * np.log1p(np.abs(counts))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+def count_tokens(texts: Sequence[str]) -> int:
+    """Tokens in texts with the cl100k_base encoding of OpenAI embeddings"""
+    if tiktoken is not None:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return sum(len(encoding.encode(text)) for text in texts)
+    # About four characters per token for typical text
+    return sum((len(text) + 3) // 4 for text in texts)
+
+
+class CachedEmbeddings:
+    """
+    Embeddings wrapper that consults an EmbeddingCache before calling the
+    underlying provider. Only texts without a cached vector are sent on.
+    Queries go through a QueryEmbeddingCache keyed by the normalized query.
+    """
+
+    def __init__(
+        self,
+        base_embeddings,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        query_cache_size: Optional[int] = None,
+    ):
+        self.base_embeddings = base_embeddings
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.query_cache = QueryEmbeddingCache(
+            self.cache,
+            maxsize=query_cache_size
+            or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+        )
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Cache and provider counters; batches are embedded concurrently
+        self._usage_lock = threading.Lock()
+        self.provider_calls = 0
+        self.provider_texts = 0
+        self.provider_tokens = 0
+        self.provider_seconds = 0.0
+
+    def _call_provider(self, method: Callable, texts: Any) -> Any:
+        """Call the provider and account for the request"""
+        started = time.perf_counter()
+        try:
+            return method(texts)
+        finally:
+            elapsed = time.perf_counter() - started
+            batch = [texts] if isinstance(texts, str) else list(texts)
+            tokens = count_tokens(batch)
+            with self._usage_lock:
+                self.provider_calls += 1
+                self.provider_texts += len(batch)
+                self.provider_tokens += tokens
+                self.provider_seconds += elapsed
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, reusing cached vectors where possible"""
+        keys = [content_hash(text, self.model_name) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        # Pipeline batches are embedded concurrently
+        with self._usage_lock:
+            self.cache_hits += len(texts) - sum(1 for key in keys if key not in cached)
+            self.cache_misses += len(missing)
+
+        if missing:
+            vectors = self._call_provider(
+                self.base_embeddings.embed_documents, list(missing.values())
+            )
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh.items())
+            cached.update(
+                (key, np.asarray(vector, dtype=np.float32))
+                for key, vector in fresh.items()
+            )
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a search query, reusing the vector of any equivalent query"""
+        query = normalize_query(text)
+        key = QueryEmbeddingCache.key(query, self.model_name)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self._call_provider(self.base_embeddings.embed_query, query)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several search queries, sending every uncached query to the
+        provider in a single request
+        """
+        keys = [
+            QueryEmbeddingCache.key(normalize_query(text), self.model_name)
+            for text in texts
+        ]
+        vectors: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.query_cache.get(key)
+            if vector is None:
+                missing[key] = normalize_query(text)
+            else:
+                vectors[key] = vector
+
+        if missing:
+            fresh = self._call_provider(
+                self.base_embeddings.embed_documents, list(missing.values())
+            )
+            for key, vector in zip(missing.keys(), fresh):
+                vector = list(vector)
+                self.query_cache.put(key, vector)
+                vectors[key] = vector
+
+        return [list(vectors[key]) for key in keys]
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get document and query cache hit statistics"""
+        with self._usage_lock:
+            hits, misses = self.cache_hits, self.cache_misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "queries": self.query_cache.get_stats(),
+        }
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Get provider request, token and time totals"""
+        with self._usage_lock:
+            return {
+                "calls": self.provider_calls,
+                "texts": self.provider_texts,
+                "tokens": self.provider_tokens,
+                "tokens_estimated": tiktoken is None,
+                "seconds": self.provider_seconds,
+            }
+
+
+def _create_openai_embeddings(model: Optional[str], dimension: Optional[int]):
+    # Imported lazily so the local backend works without langchain_openai
+    from langchain_openai import OpenAIEmbeddings
+
+    model = model or os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    base = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"), model=model)
+    return base, model
+
+
+def _create_local_embeddings(model: Optional[str], dimension: Optional[int]):
+    dimension = dimension or int(os.getenv("EMBEDDING_DIMENSIONS", "512"))
+    base = HashingEmbeddings(dimension=dimension)
+    return base, base.model_name
+
+
+# Backend name -> factory returning (embeddings, model name used for cache keys)
+EMBEDDING_BACKENDS: Dict[str, Callable] = {
+    "openai": _create_openai_embeddings,
+    "local": _create_local_embeddings,
+}
+
+
+def create_embeddings(
+    backend: Optional[str] = None,
+    model: Optional[str] = None,
+    dimension: Optional[int] = None,
+    cache: Optional[EmbeddingCache] = None,
+) -> CachedEmbeddings:
+    """
+    Create the configured embedding backend wrapped in the document cache.
+
+    The backend defaults to EMBEDDING_BACKEND. Cache keys include the model
+    name, so switching backends never mixes vectors from different models.
+    """
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend '{backend}'. "
+            f"Available backends: {', '.join(sorted(EMBEDDING_BACKENDS))}"
+        )
+
+    base, model_name = EMBEDDING_BACKENDS[backend](model, dimension)
+    return CachedEmbeddings(base, model_name=model_name, cache=cache)
+
+
+class EmbeddingPipelineError(Exception):
+    """Raised when some batches could not be embedded after all retries"""
+
+
+RETRYABLE_ERROR_NAMES = (
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+    "Timeout",
+    "ConnectionError",
+)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Whether an embedding error is worth retrying (rate limits, timeouts)"""
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status == 429:
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    return "rate limit" in str(error).lower()
+
+
+class EmbeddingPipeline:
+    """
+    Batched, concurrent embedding stage for building vector stores.
+
+    Documents already in the embedding cache are skipped. The rest are split
+    into batches and embedded by a bounded pool of workers; each finished
+    batch is stored in the cache straight away, which doubles as the build
+    checkpoint. A crashed or rate-limited build can simply be run again and
+    only the missing batches are sent to the provider.
+    """
+
+    def __init__(
+        self,
+        embeddings: CachedEmbeddings,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+        )
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        # Updated by the worker threads; read with get_progress()
+        self.progress: Dict[str, Any] = {}
+        self._progress_lock = threading.Lock()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._progress_lock:
+            self.progress[key] += amount
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Consistent copy of the progress counters of the current run"""
+        with self._progress_lock:
+            return dict(self.progress)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2**attempt))
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return delay * (0.5 + random.random() / 2)
+
+    def _embed_batch(self, batch: List[str]) -> int:
+        attempt = 0
+        while True:
+            try:
+                self.embeddings.embed_documents(batch)
+                return len(batch)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                self._count("retries")
+                print(f"Embedding batch rate limited, retry {attempt} in {delay:.1f}s")
+                self.sleep(delay)
+
+    def run(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed all texts and return their vectors in order.
+
+        Raises:
+            EmbeddingPipelineError: if any batch still failed after retries;
+                all other batches are already checkpointed in the cache
+        """
+        model_name = self.embeddings.model_name
+        unique: Dict[str, str] = {}
+        for text in texts:
+            unique.setdefault(content_hash(text, model_name), text)
+
+        cached = self.embeddings.cache.get_many(list(unique.keys()))
+        pending = [text for key, text in unique.items() if key not in cached]
+        batches = [
+            pending[start : start + self.batch_size]
+            for start in range(0, len(pending), self.batch_size)
+        ]
+
+        progress = {
+            "total": len(unique),
+            "cached": len(unique) - len(pending),
+            "embedded": 0,
+            "batches": len(batches),
+            "failed_batches": 0,
+            "retries": 0,
+        }
+        with self._progress_lock:
+            self.progress = progress
+
+        errors = []
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = [
+                    executor.submit(self._embed_batch, batch) for batch in batches
+                ]
+                for future in as_completed(futures):
+                    try:
+                        self._count("embedded", future.result())
+                    except Exception as e:
+                        self._count("failed_batches")
+                        errors.append(e)
+
+        if errors:
+            raise EmbeddingPipelineError(
+                f"{len(errors)} of {len(batches)} embedding batches failed "
+                f"({self.progress['embedded']} documents checkpointed): {errors[0]}"
+            )
+
+        return self.embeddings.embed_documents(texts)
@@ -0,0 +1,1180 @@
+"""
+Index Manager for Luminis.AI Library Assistant
+=============================================
+
+
+The index manager owns the book index shared by VectorService and RAGService:
+the embedding backend, the document builder and the vector store itself.
+Both services query the same store, so the catalog is embedded once, held in
+memory once, and only one component ever writes the persist directory.
+
+Key Features:
+1. Single Owner: One vector store per process, created on first use and
+   shared through get_index_manager()
+2. Document Builder: One content template and metadata layout for every
+   book, with stable document ids and content hashes
+3. Engine Selection: ChromaDB, the exact NumPy index or the HNSW index
+   (VECTOR_STORE_ENGINE)
+4. Serialized Writes: Builds, diff-based updates and Open Library inserts
+   run under one lock, so concurrent callers never write the store at once
+5. Lexical Index: The BM25 index used by hybrid search is built from the
+   same documents and dropped whenever the store changes
+6. Diversification: Retrieved documents can be re-ranked with maximal
+   marginal relevance over their stored vectors (services.diversity)
+7. Blue/Green Rebuilds: Catalog updates build a new index version in its
+   own directory and then swap the CURRENT pointer atomically. A version
+   starts as a hard-linked copy of the served one's files and only the
+   change is applied to it, so an update costs what the change costs.
+   Readers lease the version they started on; only versions older than the
+   newest INDEX_KEEP_VERSIONS are deleted, once no lease of this process
+   holds them and no other worker process is registered as their reader
+8. Neighbor Table: Precomputed top-N neighbours of every book, built by an
+   offline job (scripts/build_neighbor_table.py) and refreshed incrementally
+   whenever the catalog changes
+9. Multi-Worker Serving: Every worker process follows the CURRENT pointer,
+   so a version published by one worker is picked up by the others within
+   INDEX_POLL_INTERVAL; builds are serialized across processes by a lock
+   file, and NumPy stores are memory-mapped, so all workers share one copy
+
+Directory layout (persist_directory):
+- CURRENT: Name of the active index version
+- versions/<version>/: One complete store per version, plus its
+  neighbors.npz table once one has been built
+- versions/<version>/readers/<pid>: Share-locked (flock) by every worker
+  process serving or leasing the version; a version is only pruned once no
+  live process holds a lock on one of its reader files
+The lock held by the process writing the index is a sibling file,
+<persist_directory>.build.lock, so taking it never creates persist_directory.
+Stores persisted before versioning (directly in persist_directory) are still
+opened, and are replaced by a version on the next update.
+"""
+
+import functools
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Cross-process build lock; without it (Windows) only threads are serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ChromaDB is optional when the NumPy or HNSW engine is used
+try:
+    from langchain_community.vectorstores import Chroma
+except ImportError:
+    Chroma = None
+
+# Robust database import with fallback mechanisms
+try:
+    from database.database import SessionLocal, Book
+except ImportError:
+    try:
+        from database import SessionLocal, Book
+    except ImportError:
+        # Create dummy classes for testing environments
+        print("WARNING: Could not import database module in index_manager.py")
+
+        class DummySessionLocal:
+            pass
+
+        class DummyBook:
+            pass
+
+        SessionLocal = DummySessionLocal
+        Book = DummyBook
+
+from services.embedding_service import (
+    EmbeddingPipeline,
+    EmbeddingPipelineError,
+    content_hash,
+    create_embeddings,
+)
+from services.diversity import max_marginal_relevance
+from services.lexical_index import BM25Index
+from services.neighbor_table import NEIGHBOR_FILE, NeighborTable
+from services.vector_index import Document, HnswVectorStore, NumpyVectorStore
+
+# Read-through cache for Book lookups; fall back to direct queries without it
+try:
+    from database.book_cache import book_cache
+except ImportError:
+    book_cache = None
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Id prefix of documents indexed from Open Library rather than the books table
+EXTERNAL_DOCUMENT_PREFIX = "openlibrary-"
+
+# Pointer file naming the active version, and the directory of all versions
+CURRENT_VERSION_FILE = "CURRENT"
+VERSIONS_DIRECTORY = "versions"
+# Per-version directory of the reader files of worker processes
+READERS_DIRECTORY = "readers"
+# Suffix of the lock file, next to persist_directory, taken by the worker
+# process that writes the index
+BUILD_LOCK_SUFFIX = ".build.lock"
+# Files a persisted Chroma store always contains (sqlite and legacy duckdb)
+CHROMA_PERSIST_FILES = ("chroma.sqlite3", "chroma-collections.parquet")
+
+
+def leased(method):
+    """Run a service method on one index version, leased until it returns"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.index_manager.lease():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@dataclass(frozen=True)
+class IndexLease:
+    """One index version as pinned by IndexManager.lease()"""
+
+    store: Any
+    neighbor_table: Optional[NeighborTable]
+    version: Optional[str]
+
+
+class IndexManager:
+    """Owns the embeddings, document builder and vector store of the catalog"""
+
+    def __init__(self, persist_directory: str = "./chroma_db", initialize: bool = True):
+        # Embedding backend comes from EMBEDDING_BACKEND; document embeddings
+        # are cached on disk by content hash, so rebuilding the store only
+        # embeds books whose text changed
+        self.embeddings = create_embeddings()
+        self.embedding_pipeline = EmbeddingPipeline(self.embeddings)
+
+        self._vector_store = None
+        # Absolute, since retire threads may outlive a change of directory
+        self.persist_directory = os.path.abspath(persist_directory)
+        # Version being served; None is a store persisted before versioning
+        self.version: Optional[str] = None
+        self.collection_name = "luminis_books"
+        # "chroma" (default), "numpy" (exact, in-process) or "hnsw" (approximate)
+        self.vector_store_engine = os.getenv("VECTOR_STORE_ENGINE", "chroma").lower()
+
+        # Every write to the store goes through this lock
+        self._write_lock = threading.RLock()
+        # ... and, across worker processes, through an flock on the lock file
+        self._lock_depth = 0
+        self._lock_file = None
+        # BM25 index for hybrid search, built lazily from the stored documents
+        self._lexical_index = None
+        self._lexical_lock = threading.Lock()
+
+        # Readers lease the active version. The newest INDEX_KEEP_VERSIONS
+        # versions are always kept; older ones are deleted once no lease of
+        # this process holds them (waiting up to INDEX_DRAIN_TIMEOUT per
+        # publish) and no other process holds a reader file of theirs
+        self._leases = threading.local()
+        self._readers: Dict[Optional[str], int] = {}
+        self._readers_changed = threading.Condition()
+        # Open, share-locked reader files of the versions this process uses
+        self._reader_files: Dict[str, Any] = {}
+        self.drain_timeout = float(os.getenv("INDEX_DRAIN_TIMEOUT", "60"))
+        self.keep_versions = max(2, int(os.getenv("INDEX_KEEP_VERSIONS", "3")))
+
+        # Versions published by other worker processes are noticed through
+        # the inode and mtime of CURRENT, checked at most every poll interval
+        self.poll_interval = float(os.getenv("INDEX_POLL_INTERVAL", "1"))
+        self._current_signature = None
+        self._last_poll = 0.0
+
+        # Precomputed similar books of the active version, if built
+        self._neighbor_table: Optional[NeighborTable] = None
+        self.neighbor_table_size = int(os.getenv("NEIGHBOR_TABLE_SIZE", "20"))
+
+        # Duration and outcome of the latest index build, for service metrics
+        self.last_build: Optional[Dict[str, Any]] = None
+
+        # Initialize vector store
+        if initialize:
+            self.initialize_vector_store()
+
+    def _current_lease(self) -> Optional[IndexLease]:
+        lease = getattr(self._leases, "current", None)
+        return lease if lease is not None and lease.store is not None else None
+
+    @property
+    def vector_store(self):
+        """The version leased by the current thread, else the active one"""
+        lease = self._current_lease()
+        return lease.store if lease is not None else self._vector_store
+
+    @property
+    def neighbor_table(self) -> Optional[NeighborTable]:
+        """Neighbour table of the leased version, else of the active one"""
+        lease = self._current_lease()
+        return lease.neighbor_table if lease is not None else self._neighbor_table
+
+    @property
+    def active_directory(self) -> str:
+        """Directory of the version being served"""
+        return self._version_directory(self.version)
+
+    @contextmanager
+    def lease(self) -> Iterator[IndexLease]:
+        """
+        Pin the active version for the current thread until the block exits.
+
+        Every vector_store and neighbor_table access inside the block sees
+        that version, even if a rebuild swaps in a new one meanwhile, and the
+        version is not deleted before the block exits. Nested leases reuse
+        the outer one.
+        """
+        current = self._current_lease()
+        if current is not None:
+            yield current
+            return
+        self._poll_current_version()
+        with self._readers_changed:
+            lease = IndexLease(self._vector_store, self._neighbor_table, self.version)
+            version = lease.version
+            self._readers[version] = self._readers.get(version, 0) + 1
+        self._leases.current = lease
+        try:
+            yield lease
+        finally:
+            self._leases.current = None
+            with self._readers_changed:
+                self._readers[version] -= 1
+                if not self._readers[version]:
+                    del self._readers[version]
+                    self._release_reader(version)
+                self._readers_changed.notify_all()
+
+    def _register_reader(self, version: Optional[str]) -> None:
+        """
+        Mark a version as used by this process, for other processes' pruning.
+
+        The reader file stays share-locked while it is open, and the lock is
+        released with the process however it exits, so a stale file never
+        keeps a version alive.
+        """
+        if fcntl is None or version is None:
+            return
+        with self._readers_changed:
+            if version in self._reader_files:
+                return
+            directory = os.path.join(
+                self._version_directory(version), READERS_DIRECTORY
+            )
+            os.makedirs(directory, exist_ok=True)
+            reader = open(os.path.join(directory, str(os.getpid())), "a")
+            fcntl.flock(reader, fcntl.LOCK_SH)
+            self._reader_files[version] = reader
+
+    def _release_reader(self, version: Optional[str]) -> None:
+        """Drop the reader file of a version neither served nor leased here"""
+        with self._readers_changed:
+            if version == self.version or self._readers.get(version):
+                return
+            reader = self._reader_files.pop(version, None)
+        if reader is None:
+            return
+        try:
+            os.remove(reader.name)
+        except FileNotFoundError:
+            pass
+        reader.close()
+
+    def _read_by_other_process(self, version: str) -> bool:
+        """Whether another live process holds a reader file of a version"""
+        if fcntl is None:
+            return False
+        directory = os.path.join(self._version_directory(version), READERS_DIRECTORY)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return False
+        in_use = False
+        for name in names:
+            # This process' own use is tracked by its leases
+            if name == str(os.getpid()):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                reader = open(path)
+            except FileNotFoundError:
+                continue
+            with reader:
+                try:
+                    fcntl.flock(reader, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    in_use = True
+                    continue
+                # Left behind by a process that exited
+                os.remove(path)
+        return in_use
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """
+        Serialize a write with every other thread and worker process.
+
+        The outermost block also catches up with any version another process
+        published meanwhile, so a write never starts from a stale index.
+        """
+        with self._write_lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    if fcntl is not None:
+                        lock_path = self._lock_path()
+                        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+                        self._lock_file = open(lock_path, "a")
+                        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                    if self._vector_store is not None:
+                        self.refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth and self._lock_file is not None:
+                    # Closing the file releases the lock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _lock_path(self) -> str:
+        """
+        Build lock next to persist_directory rather than inside it: the
+        existence of persist_directory must keep meaning that a store was
+        persisted there.
+        """
+        return self.persist_directory + BUILD_LOCK_SUFFIX
+
+    def _current_file_signature(self) -> Optional[tuple]:
+        """Inode and mtime of CURRENT; the atomic rename changes both"""
+        try:
+            stat = os.stat(os.path.join(self.persist_directory, CURRENT_VERSION_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self) -> bool:
+        """
+        Serve the version another worker process published, if there is one.
+
+        The replaced version is not retired here: the process that published
+        the new version prunes old versions, keeping the newest
+        INDEX_KEEP_VERSIONS so this process can finish reading it.
+
+        Returns:
+            bool: Whether the served version changed
+        """
+        signature = self._current_file_signature()
+        if signature is None or signature == self._current_signature:
+            return False
+        version = self._read_current_version()
+        directory = self._version_directory(version)
+        # Registered before the existence check, so a prune that missed the
+        # registration has already deleted the directory
+        self._register_reader(version)
+        if not self._vector_store_exists(directory):
+            # Already retired by a newer publish; the next poll picks that up
+            self._release_reader(version)
+            return False
+        store = self._open_vector_store(directory)
+        neighbor_table = NeighborTable.load(directory)
+        with self._readers_changed:
+            replaced = self.version
+            self._vector_store, self.version = store, version
+            self._neighbor_table = neighbor_table
+            self._current_signature = signature
+        self._release_reader(replaced)
+        self._lexical_index = None
+        print(f"Following index version {version} published by another worker")
+        return True
+
+    def _poll_current_version(self) -> None:
+        """Refresh from CURRENT if the poll interval has passed"""
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        # A thread of this process is writing and will swap versions itself
+        if not self._write_lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error following index version: {e}")
+        finally:
+            self._write_lock.release()
+
+    def _publish(self, version: str) -> None:
+        """Point CURRENT at version and remember it as already followed"""
+        self._write_current_version(version)
+        self._current_signature = self._current_file_signature()
+
+    def _version_directory(self, version: Optional[str]) -> str:
+        if version is None:
+            return self.persist_directory
+        return os.path.join(self.persist_directory, VERSIONS_DIRECTORY, version)
+
+    def _read_current_version(self) -> Optional[str]:
+        """Version named by the CURRENT pointer, or None without one"""
+        path = os.path.join(self.persist_directory, CURRENT_VERSION_FILE)
+        try:
+            with open(path, encoding="utf-8") as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_current_version(self, version: str) -> None:
+        """Point CURRENT at a version; the rename makes the switch atomic"""
+        path = os.path.join(self.persist_directory, CURRENT_VERSION_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as pointer:
+            pointer.write(version)
+            pointer.flush()
+            os.fsync(pointer.fileno())
+        os.replace(tmp_path, path)
+
+    def _build_version(
+        self,
+        documents: Dict[str, Document],
+        deleted: Sequence[str] = (),
+        from_active: bool = False,
+    ) -> Any:
+        """
+        Build a complete store in a new version directory.
+
+        By default the store holds exactly documents. With from_active it
+        starts as a copy of the served version's persisted files and only the
+        change is applied: deleted ids are removed and documents are
+        upserted. The new store is not served until it is passed to
+        _activate. Returns (store, version).
+        """
+        version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        directory = self._version_directory(version)
+        try:
+            if from_active and self.version is not None:
+                self._clone_store(self.active_directory, directory)
+            store = self._open_vector_store(directory)
+            if from_active and self.version is None:
+                # A store persisted before versioning is copied once, document
+                # by document, into the first version
+                removed = set(deleted) | set(documents)
+                stored = self._vector_store.get(include=[])
+                self._copy_documents(
+                    self._vector_store,
+                    store,
+                    [doc_id for doc_id in stored["ids"] if doc_id not in removed],
+                )
+            elif deleted:
+                store.delete(ids=list(deleted))
+            self._add_documents(documents, store)
+            store.persist()
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return store, version
+
+    def _clone_store(self, source: str, target: str) -> None:
+        """
+        Copy the persisted store of one version directory into another.
+
+        NumPy and HNSW stores replace their files on persist and never
+        modify one in place, so the files are hard-linked (copied where the
+        filesystem has no links). Chroma's SQLite database is modified in
+        place and is always copied.
+        """
+        if self.vector_store_engine not in ("numpy", "hnsw"):
+            shutil.copytree(
+                source,
+                target,
+                ignore=shutil.ignore_patterns(READERS_DIRECTORY, NEIGHBOR_FILE),
+            )
+            return
+        source = os.path.join(source, self.collection_name)
+        target = os.path.join(target, self.collection_name)
+        os.makedirs(target)
+        for name in os.listdir(source):
+            path = os.path.join(source, name)
+            # Left over from an interrupted persist
+            if ".tmp" in name or not os.path.isfile(path):
+                continue
+            try:
+                os.link(path, os.path.join(target, name))
+            except OSError:
+                shutil.copy2(path, os.path.join(target, name))
+
+    def _activate(
+        self,
+        store: Any,
+        version: str,
+        neighbor_table: Optional[NeighborTable] = None,
+    ) -> None:
+        """Serve a fully built version and retire the one it replaces"""
+        self._register_reader(version)
+        self._publish(version)
+        with self._readers_changed:
+            replaced = self.version if self._vector_store is not None else None
+            self._vector_store, self.version = store, version
+            self._neighbor_table = neighbor_table
+        self._release_reader(replaced)
+        self._lexical_index = None
+        # Stores persisted before versioning live in persist_directory itself
+        # and are left in place
+        if replaced is not None and replaced != version:
+            threading.Thread(
+                target=self._retire,
+                args=(replaced,),
+                name=f"retire-index-{replaced}",
+                daemon=True,
+            ).start()
+
+    def _retire(self, version: str) -> None:
+        """Prune old versions once the replaced one's local queries drained"""
+        with self._readers_changed:
+            drained = self._readers_changed.wait_for(
+                lambda: not self._readers.get(version), timeout=self.drain_timeout
+            )
+        if not drained:
+            print(
+                f"Index version {version} still in use after "
+                f"{self.drain_timeout}s; keeping it until a later publish"
+            )
+        with self._writing():
+            self._prune_versions()
+
+    def _prune_versions(self) -> List[str]:
+        """
+        Delete versions older than the newest keep_versions.
+
+        Version names are UTC timestamps, so they sort by age. The active
+        version, versions leased in this process and versions another live
+        worker process registered as a reader of are never deleted.
+
+        Returns:
+            The deleted versions
+        """
+        root = os.path.join(self.persist_directory, VERSIONS_DIRECTORY)
+        try:
+            versions = sorted(os.listdir(root))
+        except FileNotFoundError:
+            return []
+        with self._readers_changed:
+            protected = set(self._readers) | {self.version}
+        protected.update(versions[-self.keep_versions :])
+
+        pruned = []
+        for version in versions:
+            if version in protected or self._read_by_other_process(version):
+                continue
+            shutil.rmtree(self._version_directory(version), ignore_errors=True)
+            pruned.append(version)
+            print(f"Retired index version {version}")
+        return pruned
+
+    def initialize_vector_store(self):
+        """Initialize or load existing ChromaDB vector store"""
+        with self._writing():
+            try:
+                # Try to load the active version (or a pre-versioning store)
+                version = self._read_current_version()
+                directory = self._version_directory(version)
+                if self._vector_store_exists(directory):
+                    self._register_reader(version)
+                    self._vector_store = self._open_vector_store(directory)
+                    self.version = version
+                    self._neighbor_table = NeighborTable.load(directory)
+                    self._current_signature = self._current_file_signature()
+                    print(f"Loaded existing vector store from {directory}")
+                else:
+                    # Create new vector store
+                    self._create_new_vector_store()
+
+            except Exception as e:
+                print(f"Error loading vector store: {e}")
+                self._create_new_vector_store()
+
+    def _record_build(self, kind: str, started: float, success: bool) -> None:
+        self.last_build = {
+            "kind": kind,
+            "seconds": round(time.perf_counter() - started, 3),
+            "success": success,
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+
+    def _create_new_vector_store(self):
+        """Create new vector store with sample data"""
+        started = time.perf_counter()
+        try:
+            # Load books from database
+            books = self._load_books()
+
+            if not books:
+                print("No books found in database. Creating sample vector store...")
+                self._create_sample_vector_store()
+                return
+
+            # Convert books to documents with enhanced content and stable ids
+            documents = self._create_book_documents(books)
+
+            # Embed everything up front in concurrent batches; finished batches
+            # are checkpointed in the embedding cache, so adding the documents
+            # below is served from the cache
+            self.embedding_pipeline.run(
+                [document.page_content for document in documents.values()]
+            )
+
+            # Build a new version, inserting documents in batches, and serve it
+            self._activate(*self._build_version(documents))
+
+            print(f"Created new vector store with {len(documents)} books")
+            self._record_build("full", started, True)
+
+        except EmbeddingPipelineError as e:
+            # Keep whatever was built; the next build resumes from the cache
+            print(f"Error embedding books, vector store build interrupted: {e}")
+            self._record_build("full", started, False)
+        except Exception as e:
+            print(f"Error creating vector store: {e}")
+            self._record_build("full", started, False)
+            self._create_sample_vector_store()
+
+    def _vector_store_exists(self, directory: str) -> bool:
+        """Whether the configured engine has a persisted store to load"""
+        if self.vector_store_engine == "numpy":
+            return NumpyVectorStore.exists(directory, self.collection_name)
+        if self.vector_store_engine == "hnsw":
+            return HnswVectorStore.exists(directory, self.collection_name)
+        return any(
+            os.path.exists(os.path.join(directory, name))
+            for name in CHROMA_PERSIST_FILES
+        )
+
+    def _open_vector_store(self, directory: str):
+        """Open (or create) the vector store of the configured engine"""
+        if self.vector_store_engine == "numpy":
+            return NumpyVectorStore(
+                persist_directory=directory,
+                embedding_function=self.embeddings,
+                collection_name=self.collection_name,
+                dtype=os.getenv("VECTOR_INDEX_DTYPE", "float32"),
+                quantization=os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+                pq_subvectors=int(os.getenv("PQ_SUBVECTORS", "64")),
+                rerank_candidates=int(os.getenv("VECTOR_RERANK_CANDIDATES", "0")),
+            )
+        if self.vector_store_engine == "hnsw":
+            return HnswVectorStore(
+                persist_directory=directory,
+                embedding_function=self.embeddings,
+                collection_name=self.collection_name,
+                M=int(os.getenv("HNSW_M", "16")),
+                ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION", "200")),
+                ef_search=int(os.getenv("HNSW_EF_SEARCH", "64")),
+            )
+        if self.vector_store_engine != "chroma":
+            raise ValueError(f"Unknown vector store engine: {self.vector_store_engine}")
+        if Chroma is None:
+            raise ImportError(
+                "ChromaDB is not installed; set VECTOR_STORE_ENGINE=numpy to use "
+                "the built-in vector index"
+            )
+        return Chroma(
+            persist_directory=directory,
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name,
+        )
+
+    def _add_documents(self, documents: Dict[str, Document], store: Any = None) -> None:
+        """Add documents to a store (the active one by default) batch by batch"""
+        store = store or self._vector_store
+        doc_ids = list(documents.keys())
+        batch_size = self.embedding_pipeline.batch_size
+        for start in range(0, len(doc_ids), batch_size):
+            batch_ids = doc_ids[start : start + batch_size]
+            store.add_documents(
+                [documents[doc_id] for doc_id in batch_ids], ids=batch_ids
+            )
+
+    def _copy_documents(self, source: Any, target: Any, ids: List[str]) -> None:
+        """Copy stored documents between stores, reusing their vectors"""
+        batch_size = self.embedding_pipeline.batch_size
+        for start in range(0, len(ids), batch_size):
+            stored = source.get(
+                ids=ids[start : start + batch_size],
+                include=["documents", "metadatas", "embeddings"],
+            )
+            documents = [
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ]
+            if hasattr(target, "add_embeddings"):
+                target.add_embeddings(documents, stored["embeddings"], stored["ids"])
+            else:
+                # Chroma re-embeds, which the embedding cache answers
+                target.add_documents(documents, ids=list(stored["ids"]))
+
+    @staticmethod
+    def document_id(book_id: int) -> str:
+        """Stable vector store id for a book"""
+        return f"book-{book_id}"
+
+    @staticmethod
+    def external_document_id(openlibrary_key: str) -> str:
+        """Stable vector store id for a book synced from Open Library"""
+        key = openlibrary_key.strip("/").replace("/", "-")
+        return f"{EXTERNAL_DOCUMENT_PREFIX}{key}"
+
+    def stored_document_id(self, document: Document) -> Optional[str]:
+        """Store id of a retrieved document, derived from its metadata"""
+        if document.metadata.get("book_id") is not None:
+            return self.document_id(document.metadata["book_id"])
+        if document.metadata.get("openlibrary_key"):
+            return self.external_document_id(document.metadata["openlibrary_key"])
+        return None
+
+    def document_vectors(self, documents: Sequence[Document]) -> np.ndarray:
+        """
+        Stored vectors of retrieved documents, one row per document.
+
+        Documents whose vector cannot be fetched by id are embedded from their
+        text, which the embedding cache normally answers without a request.
+        """
+        ids = [self.stored_document_id(document) for document in documents]
+        rows: List[Any] = [None] * len(documents)
+        known = [doc_id for doc_id in ids if doc_id]
+        if known:
+            stored = self.vector_store.get(ids=known, include=["embeddings"])
+            if stored.get("embeddings") is not None:
+                by_id = dict(zip(stored["ids"], stored["embeddings"]))
+                rows = [by_id.get(doc_id) for doc_id in ids]
+
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            embedded = self.embeddings.embed_documents(
+                [documents[i].page_content for i in missing]
+            )
+            for i, vector in zip(missing, embedded):
+                rows[i] = vector
+        return np.array(rows, dtype=np.float32)
+
+    def diversify(
+        self, query: str, documents: Sequence[Document], k: int, lambda_mult: float
+    ) -> List[int]:
+        """Positions of k documents re-ranked by maximal marginal relevance"""
+        if not documents:
+            return []
+        query_vector = self.embeddings.embed_query(query)
+        return max_marginal_relevance(
+            query_vector, self.document_vectors(documents), k, lambda_mult
+        )
+
+    def add_books(self, books: List[Dict[str, Any]]) -> int:
+        """
+        Incrementally index books synced from Open Library.
+
+        Books are upserted under ids derived from their Open Library key, so
+        syncing the same work twice updates it instead of duplicating it.
+        These documents are not part of the books table and are left alone
+        by update_vector_store.
+
+        Like update_vector_store, the result is built as a new version and
+        swapped in through CURRENT; the served version is never written.
+
+        Returns:
+            int: Number of books indexed
+        """
+        with self._writing():
+            if not self.vector_store:
+                return 0
+
+            documents = {}
+            for book in books:
+                if not book.get("openlibrary_key"):
+                    continue
+                book = {
+                    "title": book.get("title"),
+                    "author": book.get("author"),
+                    "category": book.get("category") or book.get("genre") or "Genel",
+                    "description": book.get("description") or "Açıklama yok",
+                    "year": book.get("year"),
+                    "language": book.get("language") or "tr",
+                    "rating": book.get("rating"),
+                    "openlibrary_key": book["openlibrary_key"],
+                }
+                content = self._create_book_content_from_dict(book)
+                metadata = {
+                    key: value
+                    for key, value in book.items()
+                    # Chroma rejects None metadata values
+                    if key != "description" and value is not None
+                }
+                metadata["content_hash"] = content_hash(
+                    content, self.embeddings.model_name
+                )
+                metadata["created_at"] = datetime.utcnow().isoformat()
+                documents[self.external_document_id(book["openlibrary_key"])] = (
+                    Document(page_content=content, metadata=metadata)
+                )
+
+            if not documents:
+                return 0
+
+            self.embedding_pipeline.run(
+                [document.page_content for document in documents.values()]
+            )
+            store, version = self._build_version(documents, from_active=True)
+            neighbor_table = self._refresh_neighbor_table(
+                store, list(documents), version
+            )
+            self._activate(store, version, neighbor_table)
+            return len(documents)
+
+    def _create_book_documents(self, books: List[Any]) -> Dict[str, Document]:
+        """Convert books to documents keyed by their stable document id"""
+        documents = {}
+        for book in books:
+            # Create rich document content for better embeddings
+            content = self._create_book_content(book)
+
+            metadata = {
+                "title": book.title,
+                "author": book.author,
+                "category": book.category,
+                "year": book.year,
+                "language": book.language,
+                "rating": book.rating,
+                "book_id": book.id,
+                "content_hash": content_hash(content, self.embeddings.model_name),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+
+            documents[self.document_id(book.id)] = Document(
+                page_content=content, metadata=metadata
+            )
+
+        return documents
+
+    def _load_books(self) -> List[Any]:
+        """Load the whole catalog, served from the book cache when available"""
+        if book_cache is not None:
+            return book_cache.list_books()
+
+        db = SessionLocal()
+        try:
+            return db.query(Book).all()
+        finally:
+            db.close()
+
+    def _create_book_content(self, book: Book) -> str:
+        """Create rich content for book embedding"""
+        content_parts = [
+            f"Kitap Adı: {book.title}",
+            f"Yazar: {book.author}",
+            f"Kategori: {book.category or 'Genel'}",
+            f"Açıklama: {book.description or 'Açıklama yok'}",
+            f"Yıl: {book.year or 'Bilinmiyor'}",
+            f"Dil: {book.language or 'tr'}",
+            f"Puan: {book.rating or 0}",
+        ]
+
+        # Add additional context based on category
+        if book.category:
+            category_context = self._get_category_context(book.category)
+            content_parts.append(f"Tür Bilgisi: {category_context}")
+
+        return "\n".join(content_parts)
+
+    def _get_category_context(self, category: str) -> str:
+        """Get additional context for book categories"""
+        category_contexts = {
+            "Roman": "Uzun soluklu, karakter odaklı anlatım",
+            "Distopya": "Gelecekteki olumsuz toplum tasviri",
+            "Bilim Kurgu": "Teknoloji ve gelecek temalı",
+            "Fantastik": "Hayali dünyalar ve büyülü öğeler",
+            "Çocuk Edebiyatı": "Çocuklar için eğitici ve eğlenceli",
+            "Tarih": "Geçmiş olaylar ve dönemler",
+            "Felsefe": "Düşünce ve varoluş sorguları",
+            "Psikoloji": "İnsan davranışları ve zihin",
+            "Bilim": "Bilimsel keşifler ve araştırmalar",
+        }
+
+        return category_contexts.get(category, "Genel edebiyat")
+
+    def _create_sample_vector_store(self):
+        """Create sample vector store with enhanced book data"""
+        sample_books = [
+            {
+                "title": "Suç ve Ceza",
+                "author": "Fyodor Dostoyevski",
+                "category": "Roman",
+                "description": "Psikolojik gerilim ve ahlaki sorgulama temalı klasik roman. Raskolnikov'un işlediği cinayet sonrası yaşadığı vicdani azap ve toplumla hesaplaşması",
+                "year": 1866,
+                "language": "tr",
+                "rating": 4.8,
+            },
+            {
+                "title": "1984",
+                "author": "George Orwell",
+                "category": "Distopya",
+                "description": "Totaliter rejim eleştirisi ve distopik toplum analizi. Büyük Birader'in gözetimi altındaki toplumda yaşam",
+                "year": 1949,
+                "language": "tr",
+                "rating": 4.7,
+            },
+            {
+                "title": "Küçük Prens",
+                "author": "Antoine de Saint-Exupéry",
+                "category": "Çocuk Edebiyatı",
+                "description": "Felsefi masal ve hayat dersleri. Küçük prensin farklı gezegenlerdeki yolculuğu ve öğrendiği değerler",
+                "year": 1943,
+                "language": "tr",
+                "rating": 4.9,
+            },
+            {
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "category": "Bilim Kurgu",
+                "description": "Epik bilim kurgu romanı. Arrakis gezegenindeki baharat savaşları ve Paul Atreides'in kaderi",
+                "year": 1965,
+                "language": "tr",
+                "rating": 4.6,
+            },
+            {
+                "title": "Hobbit",
+                "author": "J.R.R. Tolkien",
+                "category": "Fantastik",
+                "description": "Orta Dünya macerası. Bilbo Baggins'in cücelerle birlikte çıktığı tehlikeli yolculuk",
+                "year": 1937,
+                "language": "tr",
+                "rating": 4.8,
+            },
+        ]
+
+        documents = {}
+        for index, book in enumerate(sample_books):
+            content = self._create_book_content_from_dict(book)
+
+            metadata = {
+                "title": book["title"],
+                "author": book["author"],
+                "category": book["category"],
+                "year": book["year"],
+                "language": book["language"],
+                "rating": book["rating"],
+                "created_at": datetime.utcnow().isoformat(),
+            }
+
+            documents[f"sample-{index}"] = Document(
+                page_content=content, metadata=metadata
+            )
+
+        # Build and persist a new version, then serve it
+        self._activate(*self._build_version(documents))
+
+        print(f"Sample vector store created with {len(documents)} books")
+
+    def _create_book_content_from_dict(self, book: Dict[str, Any]) -> str:
+        """Create content from book dictionary"""
+        content_parts = [
+            f"Kitap Adı: {book['title']}",
+            f"Yazar: {book['author']}",
+            f"Kategori: {book['category']}",
+            f"Açıklama: {book['description']}",
+            f"Yıl: {book['year']}",
+            f"Dil: {book['language']}",
+            f"Puan: {book['rating']}",
+        ]
+
+        # Add category context
+        category_context = self._get_category_context(book["category"])
+        content_parts.append(f"Tür Bilgisi: {category_context}")
+
+        return "\n".join(content_parts)
+
+    def get_lexical_index(self, store: Any = None) -> Optional[BM25Index]:
+        """
+        BM25 index over the stored documents, rebuilt after index changes.
+
+        Defaults to the store of the current thread's lease; pass a store to
+        get the index of that exact version from another thread.
+        """
+        if store is None:
+            store = self.vector_store
+        with self._lexical_lock:
+            if store is None:
+                return None
+            # Cached per store, so a reader still leasing a replaced version
+            # never gets (or caches) the index of another version
+            if self._lexical_index is None or self._lexical_index[0] is not store:
+                stored = store.get(include=["documents", "metadatas"])
+                self._lexical_index = (
+                    store,
+                    BM25Index(stored["documents"], stored["metadatas"]),
+                )
+            return self._lexical_index[1]
+
+    @staticmethod
+    def _catalog_vectors(store: Any) -> Any:
+        """Ids and vectors of every stored document"""
+        stored = store.get(include=["embeddings"])
+        embeddings = stored.get("embeddings")
+        if embeddings is None or not len(embeddings):
+            return list(stored["ids"]), np.zeros((0, 0), dtype=np.float32)
+        return list(stored["ids"]), np.asarray(embeddings, dtype=np.float32)
+
+    def build_neighbor_table(self, size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Precompute the nearest neighbours of every book in the active index.
+
+        The table is persisted next to the index and kept up to date by
+        add_books and update_vector_store from then on.
+        """
+        with self._writing():
+            if self._vector_store is None:
+                return {"success": False, "error": "Vector store not initialized"}
+            started = time.perf_counter()
+            ids, vectors = self._catalog_vectors(self._vector_store)
+            table = NeighborTable.build(
+                ids, vectors, size=size or self.neighbor_table_size
+            )
+            table.save(self.active_directory)
+            self._neighbor_table = table
+            return {
+                "success": True,
+                "books": len(table),
+                "size": table.size,
+                "version": self.version,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+
+    def _refresh_neighbor_table(
+        self, store: Any, changed: List[str], version: Optional[str]
+    ) -> Optional[NeighborTable]:
+        """Bring the neighbour table in line with store, if a table exists"""
+        if self._neighbor_table is None:
+            return None
+        ids, vectors = self._catalog_vectors(store)
+        table, recomputed = self._neighbor_table.refresh(ids, vectors, changed)
+        table.save(self._version_directory(version))
+        print(f"Neighbor table refreshed: {recomputed} of {len(table)} rows recomputed")
+        return table
+
+    def update_vector_store(self) -> Dict[str, Any]:
+        """
+        Bring the vector store in line with the books table.
+
+        Stored documents are diffed against the catalog by stable document id
+        and content hash: only new or changed books are embedded, and
+        documents whose book no longer exists are dropped. Documents from
+        older builds without stable ids are dropped as well, which clears out
+        duplicates left by previous full rebuilds.
+
+        The result is built as a new version next to the one being served,
+        starting from a copy of its files and applying only the diff, and
+        replaces it atomically once complete; searches never see a partial
+        index.
+        """
+        with self._writing():
+            started = time.perf_counter()
+            try:
+                print("Updating vector store...")
+
+                if not self.vector_store:
+                    self._create_new_vector_store()
+                    return {"success": True, "rebuilt": True}
+
+                books = self._load_books()
+                if not books:
+                    print("No books found in database. Keeping current vector store")
+                    return {"success": True, "added": 0, "updated": 0, "deleted": 0}
+
+                current = self._create_book_documents(books)
+                stored = self.vector_store.get(include=["metadatas"])
+                stored_hashes = {
+                    doc_id: (metadata or {}).get("content_hash")
+                    for doc_id, metadata in zip(stored["ids"], stored["metadatas"])
+                }
+
+                added = [doc_id for doc_id in current if doc_id not in stored_hashes]
+                updated = [
+                    doc_id
+                    for doc_id, document in current.items()
+                    if doc_id in stored_hashes
+                    and stored_hashes[doc_id] != document.metadata["content_hash"]
+                ]
+                deleted = [
+                    doc_id
+                    for doc_id in stored_hashes
+                    if doc_id not in current
+                    and not doc_id.startswith(EXTERNAL_DOCUMENT_PREFIX)
+                ]
+
+                upsert_ids = added + updated
+                if deleted or upsert_ids:
+                    upserts = {doc_id: current[doc_id] for doc_id in upsert_ids}
+                    self.embedding_pipeline.run(
+                        [document.page_content for document in upserts.values()]
+                    )
+                    # Unchanged catalog books and Open Library books carry over
+                    store, version = self._build_version(
+                        upserts, deleted=deleted, from_active=True
+                    )
+                    # The refreshed table is swapped in together with its index
+                    neighbor_table = self._refresh_neighbor_table(
+                        store, upsert_ids, version
+                    )
+                    self._activate(store, version, neighbor_table)
+                    self._record_build("update", started, True)
+
+                summary = {
+                    "success": True,
+                    "added": len(added),
+                    "updated": len(updated),
+                    "deleted": len(deleted),
+                    "unchanged": len(current) - len(upsert_ids),
+                    "version": self.version,
+                }
+                print(f"Vector store updated successfully: {summary}")
+                return summary
+
+            except Exception as e:
+                print(f"Error updating vector store: {e}")
+                self._record_build("update", started, False)
+                return {"success": False, "error": str(e)}
+
+
+_index_manager: Optional[IndexManager] = None
+_index_manager_lock = threading.Lock()
+
+
+def get_index_manager() -> IndexManager:
+    """Return the process-wide index manager, creating it on first use"""
+    global _index_manager
+    with _index_manager_lock:
+        if _index_manager is None:
+            # Published before the build so get_build_progress can report on
+            # it; other callers wait on the lock until the build is done
+            _index_manager = IndexManager(initialize=False)
+            try:
+                _index_manager.initialize_vector_store()
+            except Exception:
+                _index_manager = None
+                raise
+        return _index_manager
+
+
+def get_build_progress() -> Optional[Dict[str, Any]]:
+    """Embedding progress of the shared index build, if one has started"""
+    manager = _index_manager
+    if manager is None:
+        return None
+    return manager.embedding_pipeline.get_progress()
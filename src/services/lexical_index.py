@@ -0,0 +1,119 @@
+"""
+Lexical Index for Luminis.AI Library Assistant
+==============================================
+
+
+A small in-process BM25 index over the same documents as the vector store. It
+catches what embedding search misses: exact title words, author surnames and
+rare terms. VectorService fuses its ranking with the vector ranking through
+reciprocal rank fusion for hybrid search.
+
+Key Features:
+1. BM25 Ranking: Okapi BM25 with the usual k1 / b parameters
+2. Folded Tokens: Case and diacritics are folded, so "Suç" matches "suc"
+3. Inverted Index: Postings are NumPy arrays, so a query only touches the
+   documents that contain one of its terms
+4. Reciprocal Rank Fusion: Merges any number of rankings without needing
+   their scores to be comparable
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rank constant from the original RRF paper; dampens the weight of top ranks
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into case- and diacritic-folded word tokens"""
+    text = text.replace("ı", "i").replace("İ", "i").casefold()
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents"""
+
+    def __init__(
+        self,
+        documents: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.documents = list(documents)
+        self.metadatas = (
+            list(metadatas) if metadatas is not None else [{} for _ in documents]
+        )
+        self.k1 = k1
+        self.b = b
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for doc, text in enumerate(self.documents):
+            counts = Counter(tokenize(text))
+            lengths[doc] = sum(counts.values())
+            for term, count in counts.items():
+                docs, freqs = postings.setdefault(term, ([], []))
+                docs.append(doc)
+                freqs.append(count)
+
+        average = float(lengths.mean()) if len(lengths) else 0.0
+        # Per-document part of the BM25 denominator, computed once
+        self._norms = k1 * (1 - b + b * lengths / (average or 1.0))
+        self._postings = {
+            term: (np.asarray(docs, dtype=np.int64), np.asarray(freqs, np.float32))
+            for term, (docs, freqs) in postings.items()
+        }
+        count = len(self.documents)
+        self._idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, (docs, _) in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (document position, BM25 score) pairs, best first"""
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            docs, freqs = self._postings[term]
+            scores[docs] += (
+                self._idf[term] * freqs * (self.k1 + 1) / (freqs + self._norms[docs])
+            )
+
+        matched = np.flatnonzero(scores)
+        if k <= 0 or not len(matched):
+            return []
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        ordered = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(doc), float(scores[doc])) for doc in ordered]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]], k: int = RRF_K
+) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several rankings of the same items.
+
+    Each item scores sum(1 / (k + rank)) over the rankings it appears in, with
+    ranks starting at 1. Returns (item, score) pairs, best first; ties keep
+    the order in which items were first seen.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
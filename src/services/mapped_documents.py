@@ -0,0 +1,223 @@
+"""
+Memory-Mapped Documents for Luminis.AI Library Assistant
+========================================================
+
+
+Read-only storage for the ids, texts and metadata of a vector store.
+Everything is kept in .npy files that are memory-mapped, never parsed into
+Python objects up front, so every worker process that opens the same index
+version shares one page-cache copy, and a new worker costs almost no memory.
+
+Key Features:
+1. Lazy Decoding: A text or metadata dict is decoded only when a row is read
+2. Shared Id Lookup: Ids are looked up by binary search over a sorted,
+   memory-mapped copy instead of a per-process dictionary
+3. Sequence Views: MappedColumn and MappedRows behave like the lists and
+   dict they replace, so a store can switch to in-memory copies on its first
+   write
+4. Label Views: MappedLabelColumn keys the rows by a sorted array of integer
+   labels, for stores (HNSW) whose documents are addressed by graph label
+
+Files (in the collection directory):
+- ids.npy: Ids in row order, as fixed-width UTF-8 bytes
+- ids_sorted.npy, ids_rows.npy: Ids in sorted order and their rows
+- records.npy: Text and metadata JSON of every row, as one UTF-8 byte array
+- record_offsets.npy: Row r's text is records[o[2r]:o[2r+1]] and its
+  metadata records[o[2r+1]:o[2r+2]]
+"""
+
+import json
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+IDS_FILE = "ids.npy"
+SORTED_IDS_FILE = "ids_sorted.npy"
+SORTED_ROWS_FILE = "ids_rows.npy"
+RECORDS_FILE = "records.npy"
+OFFSETS_FILE = "record_offsets.npy"
+MAPPED_FILES = (IDS_FILE, SORTED_IDS_FILE, SORTED_ROWS_FILE, RECORDS_FILE, OFFSETS_FILE)
+
+
+def mapped_documents_exist(path: str) -> bool:
+    """Whether a directory holds a complete set of mapped document files"""
+    return all(os.path.exists(os.path.join(path, name)) for name in MAPPED_FILES)
+
+
+def write_mapped_documents(
+    path: str,
+    ids: Sequence,
+    texts: Sequence,
+    metadatas: Sequence,
+) -> List[str]:
+    """
+    Write the mapped files under temporary names.
+
+    Returns the temporary paths; the caller renames each one by removing
+    ".tmp" from its file name once everything it persists has been written.
+    """
+    encoded_ids = [doc_id.encode("utf-8") for doc_id in ids]
+    width = max((len(doc_id) for doc_id in encoded_ids), default=1) or 1
+    id_array = np.array(encoded_ids, dtype=f"S{width}")
+    order = np.argsort(id_array, kind="stable")
+
+    chunks = []
+    offsets = [0]
+    for text, metadata in zip(texts, metadatas):
+        for part in (
+            text.encode("utf-8"),
+            json.dumps(metadata or {}, ensure_ascii=False).encode("utf-8"),
+        ):
+            chunks.append(part)
+            offsets.append(offsets[-1] + len(part))
+    records = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+
+    arrays = {
+        IDS_FILE: id_array,
+        SORTED_IDS_FILE: id_array[order],
+        SORTED_ROWS_FILE: order.astype(np.int64),
+        RECORDS_FILE: records,
+        OFFSETS_FILE: np.asarray(offsets, dtype=np.int64),
+    }
+    tmp_paths = []
+    for name, array in arrays.items():
+        # np.save appends ".npy" unless the name already ends with it
+        tmp_path = os.path.join(path, name.replace(".npy", ".tmp.npy"))
+        np.save(tmp_path, array)
+        tmp_paths.append(tmp_path)
+    return tmp_paths
+
+
+class MappedDocuments:
+    """Read-only, memory-mapped ids, texts and metadata of a collection"""
+
+    def __init__(self, path: str):
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self._ids = load(IDS_FILE)
+        self._sorted_ids = load(SORTED_IDS_FILE)
+        self._sorted_rows = load(SORTED_ROWS_FILE)
+        self._records = load(RECORDS_FILE)
+        self._offsets = load(OFFSETS_FILE)
+        self._records_buffer = self._records.base
+        self._records_offset = self._records.offset
+        if len(self._offsets) != 2 * len(self._ids) + 1:
+            raise ValueError(f"Mapped documents in {path} are incomplete")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _record(self, start: int, end: int) -> bytes:
+        # Slicing the underlying mmap returns bytes directly, which is several
+        # times cheaper than slicing the NumPy view
+        start += self._records_offset
+        return self._records_buffer[start : end + self._records_offset]
+
+    def id(self, row: int) -> str:
+        return self._ids[row].decode("utf-8")
+
+    def text(self, row: int) -> str:
+        return self._record(
+            int(self._offsets[2 * row]), int(self._offsets[2 * row + 1])
+        ).decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        return json.loads(
+            self._record(
+                int(self._offsets[2 * row + 1]), int(self._offsets[2 * row + 2])
+            )
+        )
+
+    def row(self, doc_id: str) -> Optional[int]:
+        """Row of an id by binary search, or None if it is not stored"""
+        key = doc_id.encode("utf-8")
+        # Longer keys would be truncated to the array width and could collide
+        if not len(self._sorted_ids) or len(key) > self._sorted_ids.itemsize:
+            return None
+        position = int(np.searchsorted(self._sorted_ids, key))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == key:
+            return int(self._sorted_rows[position])
+        return None
+
+
+class MappedColumn(Sequence):
+    """List-like view of one field of every row"""
+
+    def __init__(self, documents: MappedDocuments, field: Callable[[int], Any]):
+        self._documents = documents
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self._field(i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self._field(row)
+
+
+class MappedRows(Mapping):
+    """Dict-like view from id to row, or to the row's label if labels are given"""
+
+    def __init__(self, documents: MappedDocuments, labels: Optional[np.ndarray] = None):
+        self._documents = documents
+        self._labels = labels
+
+    def __getitem__(self, doc_id: str) -> int:
+        row = self._documents.row(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        return row if self._labels is None else int(self._labels[row])
+
+    def __contains__(self, doc_id: object) -> bool:
+        return isinstance(doc_id, str) and self._documents.row(doc_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._documents.id(row) for row in range(len(self._documents)))
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+class MappedLabelColumn(Mapping):
+    """Dict-like view from label to one field of its row; labels are sorted"""
+
+    def __init__(
+        self,
+        documents: MappedDocuments,
+        labels: np.ndarray,
+        field: Callable[[int], Any],
+    ):
+        self._documents = documents
+        self._labels = labels
+        self._field = field
+
+    def _row(self, label: object) -> Optional[int]:
+        if not isinstance(label, (int, np.integer)) or not len(self._labels):
+            return None
+        position = int(np.searchsorted(self._labels, label))
+        if position < len(self._labels) and self._labels[position] == label:
+            return position
+        return None
+
+    def __getitem__(self, label: int) -> Any:
+        row = self._row(label)
+        if row is None:
+            raise KeyError(label)
+        return self._field(row)
+
+    def __contains__(self, label: object) -> bool:
+        return self._row(label) is not None
+
+    def __iter__(self) -> Iterator[int]:
+        return (int(label) for label in self._labels)
+
+    def __len__(self) -> int:
+        return len(self._labels)
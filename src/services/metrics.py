@@ -0,0 +1,225 @@
+"""
+Service Metrics for Luminis.AI Library Assistant
+================================================
+
+
+In-process counters, gauges and latency histograms for the search services,
+with a Prometheus text exporter. Every search records how long embedding the
+query, scanning the index and formatting results took, so it is visible
+whether time goes to the embedding API or to the index.
+
+Key Features:
+1. Latency Histograms: Fixed buckets from 0.5 ms to 10 s with count, sum and
+   p50 / p95 / p99 estimated by interpolation within a bucket, the same way
+   Prometheus' histogram_quantile does
+2. Labels: Every metric is keyed by name plus labels (operation, stage, ...)
+3. Thread Safety: One lock per registry; observing a value is a bisect and
+   two additions
+4. Prometheus Exporter: render_prometheus() produces the text exposition
+   format (version 0.0.4) served at METRICS_PATH, with no client library
+"""
+
+import bisect
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; an implicit +Inf bucket follows
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    """Bucketed distribution of observed values"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # counts[i] observations fell in (buckets[i - 1], buckets[i]]
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimated q-quantile, interpolating linearly within its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    # Beyond the largest bound only that bound is known
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms keyed by metric name and labels"""
+
+    def __init__(self, namespace: str = "luminis"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        """Set the HELP text exported for a metric"""
+        self._help[name] = text
+
+    def increment(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set_counter(self, name: str, value: float, **labels: Any) -> None:
+        """Set a counter to a total that is maintained elsewhere"""
+        with self._lock:
+            self._counters.setdefault(name, {})[_label_key(labels)] = value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Observe the seconds spent in the block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get(name, {}).get(_label_key(labels))
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Every series as plain data, for JSON responses"""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for name, series in self._counters.items()
+                    for key, value in series.items()
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for name, series in self._gauges.items()
+                    for key, value in series.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(key), **histogram.snapshot()}
+                    for name, series in self._histograms.items()
+                    for key, histogram in series.items()
+                ],
+            }
+
+    def _metric_name(self, name: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9_:]", "_", f"{self.namespace}_{name}")
+
+    def _header(self, lines: List[str], name: str, kind: str) -> str:
+        metric = self._metric_name(name)
+        if name in self._help:
+            lines.append(f"# HELP {metric} {self._help[name]}")
+        lines.append(f"# TYPE {metric} {kind}")
+        return metric
+
+    def render_prometheus(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = self._header(lines, name, "counter")
+                for key, value in series.items():
+                    lines.append(
+                        f"{metric}{_format_labels(key)} {_format_value(value)}"
+                    )
+            for name, series in sorted(self._gauges.items()):
+                metric = self._header(lines, name, "gauge")
+                for key, value in series.items():
+                    lines.append(
+                        f"{metric}{_format_labels(key)} {_format_value(value)}"
+                    )
+            for name, series in sorted(self._histograms.items()):
+                metric = self._header(lines, name, "histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    bounds = list(histogram.buckets) + [math.inf]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative += count
+                        labels = _format_labels(key, [("le", _format_value(bound))])
+                        lines.append(f"{metric}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key)
+                    lines.append(f"{metric}_sum{labels} {_format_value(histogram.sum)}")
+                    lines.append(f"{metric}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,180 @@
+"""
+Neighbor Table for Luminis.AI Library Assistant
+===============================================
+
+
+Precomputed nearest neighbours of every indexed book. Similar books are
+requested far more often than the catalog changes, so each book's neighbours
+are computed ahead of time and served with a dictionary lookup instead of a
+vector search.
+
+Key Features:
+1. Batched Build: The top-N neighbours of every book come from one matrix
+   product per block of rows against the whole normalized catalog
+2. Compact Storage: int32 neighbour rows and float32 cosine similarities,
+   persisted as one .npz file inside the index version they describe
+3. Incremental Refresh: After a sync only rows whose neighbourhood can have
+   changed are recomputed: new or changed books, books that listed a removed
+   or changed book, and books that a new or changed vector now beats
+"""
+
+import os
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NEIGHBOR_FILE = "neighbors.npz"
+
+# Rows scored against the whole catalog per matrix product
+BUILD_CHUNK_ROWS = 1024
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_neighbors(
+    vectors: np.ndarray, rows: np.ndarray, size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-size neighbours of the given rows, padded with -1 / -inf"""
+    neighbors = np.full((len(rows), size), -1, dtype=np.int32)
+    scores = np.full((len(rows), size), -np.inf, dtype=np.float32)
+    found = min(size, len(vectors) - 1)
+    if found <= 0:
+        return neighbors, scores
+
+    for start in range(0, len(rows), BUILD_CHUNK_ROWS):
+        block = rows[start : start + BUILD_CHUNK_ROWS]
+        similarities = vectors[block] @ vectors.T
+        # A book is never its own neighbour
+        similarities[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-similarities, found - 1, axis=1)[:, :found]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        end = start + len(block)
+        neighbors[start:end, :found] = np.take_along_axis(top, order, axis=1)
+        scores[start:end, :found] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+
+class NeighborTable:
+    """Top-N neighbour ids and cosine similarities for every document id"""
+
+    def __init__(self, ids: Sequence[str], neighbors: np.ndarray, scores: np.ndarray):
+        self.ids = list(ids)
+        # neighbors[row] holds rows of self.ids, best first; -1 pads short rows
+        self.neighbors = neighbors
+        self.scores = scores
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    @property
+    def size(self) -> int:
+        """Neighbours stored per document"""
+        return self.neighbors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, doc_id: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+        """
+        Up to limit (neighbour id, cosine similarity) pairs, best first.
+
+        Returns None when the document is not in the table.
+        """
+        row = self._rows.get(doc_id)
+        if row is None:
+            return None
+        return [
+            (self.ids[neighbor], float(score))
+            for neighbor, score in zip(
+                self.neighbors[row, :limit], self.scores[row, :limit]
+            )
+            if neighbor >= 0
+        ]
+
+    @classmethod
+    def build(
+        cls, ids: Sequence[str], vectors: np.ndarray, size: int = 20
+    ) -> "NeighborTable":
+        """Compute the table for a whole catalog"""
+        vectors = _normalize_rows(vectors)
+        neighbors, scores = _top_neighbors(vectors, np.arange(len(ids)), size)
+        return cls(ids, neighbors, scores)
+
+    def refresh(
+        self, ids: Sequence[str], vectors: np.ndarray, changed: Iterable[str]
+    ) -> Tuple["NeighborTable", int]:
+        """
+        Table for a new state of the catalog, reusing every row that is
+        still exact.
+
+        ids and vectors describe the whole new catalog; changed lists the ids
+        added or updated since this table was computed. Ids missing from ids
+        count as removed.
+
+        Returns:
+            The new table and the number of recomputed rows
+        """
+        vectors = _normalize_rows(vectors)
+        rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        changed = {doc_id for doc_id in changed if doc_id in rows}
+        count, size = len(ids), self.size
+
+        # Old rows mapped to new rows, and old rows no longer valid as neighbours
+        remap = np.array([rows.get(doc_id, -1) for doc_id in self.ids] + [-1])
+        invalid = np.array(
+            [doc_id not in rows or doc_id in changed for doc_id in self.ids] + [True]
+        )
+        previous = np.array(
+            [-1 if doc_id in changed else self._rows.get(doc_id, -1) for doc_id in ids],
+            dtype=np.int64,
+        )
+
+        neighbors = np.full((count, size), -1, dtype=np.int32)
+        scores = np.full((count, size), -np.inf, dtype=np.float32)
+        stale = previous < 0
+        kept = np.flatnonzero(~stale)
+        if len(kept):
+            # -1 padding indexes the sentinel entry appended to remap / invalid
+            old_neighbors = self.neighbors[previous[kept]]
+            stale[kept] = (invalid[old_neighbors] & (old_neighbors >= 0)).any(axis=1)
+            neighbors[kept] = np.where(old_neighbors >= 0, remap[old_neighbors], -1)
+            scores[kept] = self.scores[previous[kept]]
+
+        # Rows a new or changed vector now beats: that vector enters their top-N
+        entering = np.array([rows[doc_id] for doc_id in changed], dtype=np.int64)
+        kept = np.flatnonzero(~stale)
+        if len(entering) and len(kept):
+            similarities = vectors[kept] @ vectors[entering].T
+            stale[kept] = (similarities > scores[kept, -1:]).any(axis=1)
+
+        recompute = np.flatnonzero(stale)
+        neighbors[recompute], scores[recompute] = _top_neighbors(
+            vectors, recompute, size
+        )
+        return NeighborTable(ids, neighbors, scores), len(recompute)
+
+    def save(self, directory: str) -> None:
+        """Persist the table atomically next to the index it describes"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, NEIGHBOR_FILE)
+        tmp_path = os.path.join(directory, "neighbors.tmp.npz")
+        np.savez(
+            tmp_path,
+            ids=np.array(self.ids, dtype=str),
+            neighbors=self.neighbors,
+            scores=self.scores,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["NeighborTable"]:
+        """Load a persisted table, or None if the directory has none"""
+        path = os.path.join(directory, NEIGHBOR_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["ids"].tolist(), data["neighbors"], data["scores"])
@@ -0,0 +1,184 @@
+"""
+Vector Quantization for Luminis.AI Library Assistant
+====================================================
+
+
+Compressed storage for the NumPy vector engine. A 1536-dimensional float32
+embedding takes about 6 KB; quantized codes take 1536 bytes (int8) or a few
+dozen bytes (product quantization), so large catalogs fit in the memory of
+small instances. Full-precision vectors stay on disk, memory-mapped, and are
+only read to optionally re-rank the best candidates.
+
+Key Features:
+1. Scalar Quantization (int8): Each dimension is scaled by its largest
+   absolute value in the training set and rounded to a signed byte
+2. Product Quantization: Vectors are split into sub-vectors, each encoded as
+   the index of its nearest k-means centroid (one byte per sub-vector)
+3. Asymmetric Distance Computation: The query stays in full precision; PQ
+   scores are sums over per-query lookup tables, so codes are never decoded
+4. Memory Reporting: Every quantizer reports its bytes per vector and the
+   size of its codebooks
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Vectors sampled to train product quantizer codebooks
+PQ_TRAIN_SAMPLE = 20000
+
+
+def _kmeans(
+    data: np.ndarray, k: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Plain Lloyd's k-means; empty clusters are reseeded from the data"""
+    # Sub-vector slices are strided; matrix products need contiguous rows
+    data = np.ascontiguousarray(data)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        # Nearest centroid maximizes x.c - |c|^2 / 2 (|x|^2 is shared)
+        scores = data @ centroids.T
+        scores -= 0.5 * (centroids**2).sum(axis=1)
+        assignments = scores.argmax(axis=1)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack(
+            [
+                np.bincount(assignments, weights=column, minlength=k)
+                for column in data.T
+            ],
+            axis=1,
+        )
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+    return centroids
+
+
+class ScalarQuantizer:
+    """int8 scalar quantization with one scale per dimension"""
+
+    kind = "int8"
+
+    def __init__(self):
+        self.scales: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.scales is not None
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """Learn per-dimension scales from a set of vectors"""
+        scales = np.abs(np.asarray(vectors, dtype=np.float32)).max(axis=0) / 127.0
+        scales[scales == 0] = 1.0
+        self.scales = scales.astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize vectors to int8 codes, clipping values outside the range"""
+        codes = np.rint(np.asarray(vectors, dtype=np.float32) / self.scales)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate inner products, one row per query and column per code"""
+        return (queries * self.scales) @ codes.astype(np.float32).T
+
+    def code_bytes(self, dimension: int) -> int:
+        return dimension
+
+    def codebook_bytes(self) -> int:
+        return 0 if self.scales is None else self.scales.nbytes
+
+    def state(self) -> Dict[str, Any]:
+        return {"scales": self.scales}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.scales = state["scales"]
+
+
+class ProductQuantizer:
+    """
+    Product quantization with asymmetric distance computation.
+
+    Each vector is split into `subvectors` equal parts and every part is
+    replaced by the id of its nearest centroid in that part's codebook of up
+    to 256 entries, giving one byte per part.
+    """
+
+    kind = "pq"
+
+    def __init__(self, subvectors: int = 64, iterations: int = 20, seed: int = 0):
+        self.subvectors = subvectors
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        count, dimension = vectors.shape
+        if dimension % self.subvectors:
+            raise ValueError(
+                f"Embedding dimension {dimension} is not divisible by "
+                f"{self.subvectors} PQ sub-vectors"
+            )
+        return vectors.reshape(count, self.subvectors, dimension // self.subvectors)
+
+    def fit(self, vectors: np.ndarray) -> None:
+        """Train one k-means codebook per sub-vector"""
+        rng = np.random.default_rng(self.seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > PQ_TRAIN_SAMPLE:
+            vectors = vectors[rng.choice(len(vectors), PQ_TRAIN_SAMPLE, replace=False)]
+        parts = self._split(vectors)
+        centroids = min(256, len(vectors))
+        self.codebooks = np.stack(
+            [
+                _kmeans(parts[:, part], centroids, self.iterations, rng)
+                for part in range(self.subvectors)
+            ]
+        ).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Replace every sub-vector with the id of its nearest centroid"""
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(parts), self.subvectors), dtype=np.uint8)
+        for part in range(self.subvectors):
+            codebook = self.codebooks[part]
+            scores = np.ascontiguousarray(parts[:, part]) @ codebook.T
+            scores -= 0.5 * (codebook**2).sum(axis=1)
+            codes[:, part] = scores.argmax(axis=1)
+        return codes
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Approximate inner products via per-query lookup tables (ADC)"""
+        parts = queries.reshape(len(queries), self.subvectors, -1)
+        # tables[q, m, c]: inner product of query q's part m with centroid c
+        tables = np.einsum("mcd,qmd->qmc", self.codebooks, parts)
+        subvectors = np.arange(self.subvectors)
+        return np.stack([table[subvectors, codes].sum(axis=1) for table in tables])
+
+    def code_bytes(self, dimension: int) -> int:
+        return self.subvectors
+
+    def codebook_bytes(self) -> int:
+        return 0 if self.codebooks is None else self.codebooks.nbytes
+
+    def state(self) -> Dict[str, Any]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self.codebooks = state["codebooks"]
+        self.subvectors = len(self.codebooks)
+
+
+def create_quantizer(kind: Optional[str], subvectors: int = 64):
+    """Quantizer for a VECTOR_QUANTIZATION setting; None means full precision"""
+    if kind in (None, "", "none"):
+        return None
+    if kind == "int8":
+        return ScalarQuantizer()
+    if kind == "pq":
+        return ProductQuantizer(subvectors=subvectors)
+    raise ValueError(f"Unknown vector quantization: {kind}")
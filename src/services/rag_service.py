@@ -11,14 +11,20 @@ relevant information.
 Key Features:
 1. Intelligent Book Search: Uses semantic similarity to find relevant books
 2. Context-Aware Responses: Generates responses based on retrieved book information
-3. Personalized Recommendations: Tailors suggestions based on user preferences
+3. Personalized Recommendations: Tailors suggestions based on user preferences,
+   diversified with maximal marginal relevance so one author or series does
+   not fill the list (MMR_LAMBDA)
 4. Multi-language Support: Handles Turkish and English content seamlessly
-5. Vector Database Integration: Uses ChromaDB for efficient similarity search
+5. Vector Database Integration: Queries the book index shared with
+   VectorService (services.index_manager) instead of building its own
 6. Dynamic Knowledge Base: Automatically updates with new book additions
 
 RAG Architecture:
 - Embedding Generation: Converts text to high-dimensional vectors using OpenAI
-- Vector Storage: Stores book embeddings in ChromaDB for fast retrieval
+  or a local backend (EMBEDDING_BACKEND), with an on-disk cache so unchanged
+  books are never re-embedded
+- Vector Storage: Book embeddings live in the shared index, built once per
+  process with the same document template as VectorService
 - Semantic Search: Finds most relevant books based on query similarity
 - Response Generation: Uses GPT-4 to create contextual responses with retrieved data
 
@@ -39,12 +45,6 @@ This service significantly enhances the chatbot's ability to:
 
 import os
 from typing import List, Dict, Any, Optional
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
 
 # Robust database import with fallback mechanisms
 try:
@@ -72,6 +72,9 @@ except ImportError:
         Book = DummyBook
         UserBook = DummyUserBook
         BookStatus = DummyBookStatus
+
+from services.diversity import MMR_CANDIDATES_PER_RESULT
+from services.index_manager import IndexManager, get_index_manager, leased
 from dotenv import load_dotenv
 import json
 
@@ -79,137 +82,43 @@ import json
 load_dotenv()
 
 
-class RAGService:
-    def __init__(self):
-        """Initialize RAG service with OpenAI and ChromaDB"""
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=os.getenv("OPENAI_API_KEY"), model="text-embedding-ada-002"
-        )
-
-        self.llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENAI_API_KEY"), model="gpt-4", temperature=0.7
-        )
-
-        # Initialize vector store
-        self.vector_store = None
-        self.initialize_vector_store()
-
-    def initialize_vector_store(self):
-        """Initialize ChromaDB vector store with book data"""
-        try:
-            # Load books from database
-            db = SessionLocal()
-            books = db.query(Book).all()
-
-            if not books:
-                print("No books found in database. Creating sample vector store...")
-                self._create_sample_vector_store()
-                return
-
-            # Convert books to documents
-            documents = []
-            for book in books:
-                # Create rich document content
-                content = f"""
-                Book Title: {book.title}
-                Author: {book.author}
-                Category: {book.category or 'General'}
-                Description: {book.description or 'No description'}
-                Year: {book.year or 'Unknown'}
-                Language: {book.language or 'tr'}
-                Rating: {book.rating or 0}
-                """
-
-                metadata = {
-                    "title": book.title,
-                    "author": book.author,
-                    "category": book.category,
-                    "year": book.year,
-                    "language": book.language,
-                    "rating": book.rating,
-                    "book_id": book.id,
-                }
-
-                documents.append(Document(page_content=content, metadata=metadata))
-
-            # Create vector store
-            self.vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory="./chroma_db",
-            )
-
-            print(f"Vector store initialized with {len(documents)} books")
-
-        except Exception as e:
-            print(f"Error initializing vector store: {e}")
-            self._create_sample_vector_store()
-        finally:
-            db.close()
-
-    def _create_sample_vector_store(self):
-        """Create sample vector store with basic book data"""
-        sample_books = [
-            {
-                "title": "Suç ve Ceza",
-                "author": "Fyodor Dostoyevski",
-                "category": "Roman",
-                "description": "Psikolojik gerilim ve ahlaki sorgulama temalı klasik roman",
-                "year": 1866,
-                "language": "tr",
-                "rating": 4.8,
-            },
-            {
-                "title": "1984",
-                "author": "George Orwell",
-                "category": "Distopya",
-                "description": "Totaliter rejim eleştirisi ve distopik toplum analizi",
-                "year": 1949,
-                "language": "tr",
-                "rating": 4.7,
-            },
-            {
-                "title": "Küçük Prens",
-                "author": "Antoine de Saint-Exupéry",
-                "category": "Çocuk Edebiyatı",
-                "description": "Felsefi masal ve hayat dersleri",
-                "year": 1943,
-                "language": "tr",
-                "rating": 4.9,
-            },
-        ]
-
-        documents = []
-        for book in sample_books:
-            content = f"""
-            Kitap Adı: {book['title']}
-            Yazar: {book['author']}
-            Kategori: {book['category']}
-            Açıklama: {book['description']}
-            Yıl: {book['year']}
-            Dil: {book['language']}
-            Puan: {book['rating']}
-            """
-
-            metadata = {
-                "title": book["title"],
-                "author": book["author"],
-                "category": book["category"],
-                "year": book["year"],
-                "language": book["language"],
-                "rating": book["rating"],
-            }
-
-            documents.append(Document(page_content=content, metadata=metadata))
+def _create_llm():
+    """Chat model for generated answers, or None if langchain_openai is missing"""
+    # Imported lazily so retrieval works offline without langchain_openai
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        print("WARNING: langchain_openai is not installed; answers are disabled")
+        return None
 
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory="./chroma_db",
-        )
+    return ChatOpenAI(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        model="gpt-4",
+        temperature=0.7,
+    )
 
-        print(f"Sample vector store created with {len(documents)} books")
 
+class RAGService:
+    def __init__(self, index_manager: Optional[IndexManager] = None):
+        """Initialize RAG service with OpenAI and the shared book index"""
+        # Retrieval uses the same index as VectorService, so the catalog is
+        # embedded once and only the index manager writes the store
+        self.index_manager = index_manager or get_index_manager()
+
+        # Relevance / diversity trade-off of recommendations; 1 disables MMR
+        self.mmr_lambda = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+        # Without an API key (e.g. air-gapped with the local embedding backend)
+        # retrieval still works; only generated answers are unavailable
+        self.llm = None
+        if os.getenv("OPENAI_API_KEY"):
+            self.llm = _create_llm()
+
+    @property
+    def vector_store(self):
+        return self.index_manager.vector_store
+
+    @leased
     def get_book_recommendations(
         self, user_preferences: Dict[str, Any], limit: int = 5
     ) -> List[Dict[str, Any]]:
@@ -218,8 +127,17 @@ class RAGService:
             # Create query based on user preferences
             query = self._create_preference_query(user_preferences)
 
-            # Search similar books
-            docs = self.vector_store.similarity_search(query, k=limit)
+            # Search similar books, over-fetching so MMR has room to diversify
+            if self.mmr_lambda < 1:
+                docs = self.vector_store.similarity_search(
+                    query, k=limit * MMR_CANDIDATES_PER_RESULT
+                )
+                selected = self.index_manager.diversify(
+                    query, docs, limit, self.mmr_lambda
+                )
+                docs = [docs[i] for i in selected]
+            else:
+                docs = self.vector_store.similarity_search(query, k=limit)
 
             recommendations = []
             for doc in docs:
@@ -263,8 +181,13 @@ class RAGService:
 
         return " ".join(query_parts) if query_parts else "klasik roman"
 
+    @leased
     def answer_question(self, question: str, context: Optional[str] = None) -> str:
         """Answer questions using RAG with book knowledge"""
+        if self.llm is None:
+            print("Error answering question: no language model configured")
+            return "Üzgünüm, şu anda sorunuzu yanıtlayamıyorum. Lütfen daha sonra tekrar deneyin."
+
         try:
             # Create prompt template
             template = """
@@ -278,6 +201,20 @@ class RAGService:
             Give your response in Turkish and use a friendly tone.
             """
 
+            if not hasattr(self.vector_store, "as_retriever"):
+                # The NumPy and HNSW engines are not LangChain vector stores;
+                # retrieve the books directly and add them to the prompt
+                docs = self.vector_store.similarity_search(question, k=3)
+                books = "\n\n".join(doc.page_content for doc in docs)
+                message = self.llm.invoke(
+                    f"{template.format(question=question)}\nBooks:\n{books}"
+                )
+                return message.content
+
+            # Imported lazily so retrieval works without langchain installed
+            from langchain.chains import RetrievalQA
+            from langchain.prompts import PromptTemplate
+
             prompt = PromptTemplate(template=template, input_variables=["question"])
 
             # Create QA chain
@@ -296,6 +233,7 @@ class RAGService:
             print(f"Error answering question: {e}")
             return "Üzgünüm, şu anda sorunuzu yanıtlayamıyorum. Lütfen daha sonra tekrar deneyin."
 
+    @leased
     def search_books(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search books using semantic similarity"""
         try:
@@ -0,0 +1,1198 @@
+"""
+NumPy Vector Index for Luminis.AI Library Assistant
+==================================================
+
+
+In-process vector stores for semantic search. NumpyVectorStore is an exact
+nearest-neighbour index kept in a single contiguous NumPy matrix: for catalogs
+of up to a few hundred thousand books a vectorized matrix-vector product over
+normalized embeddings is faster than a round trip through ChromaDB, and it
+needs no database server or extra dependencies. HnswVectorStore is an
+approximate (HNSW graph) index for catalogs with millions of works, backed by
+the optional hnswlib package.
+
+Key Features:
+1. Contiguous Storage: Normalized float32 (or float16) vectors in one matrix,
+   with ids, texts and metadata kept in parallel arrays
+2. Exact Top-k: Batched dot products followed by an argpartition selection
+3. Memory-mapped Loading: Persisted vectors are opened with np.load(mmap_mode)
+   so startup does not read the whole matrix into memory
+4. Chroma-compatible API: from_documents, add_documents (upsert by id), delete,
+   get, similarity_search(_with_score) and persist behave like the LangChain
+   Chroma wrapper, so VectorService can use either engine unchanged
+5. HNSW Option: Tunable M / ef_construction / ef_search, incremental inserts
+   and deletes, and a saved graph that loads without rebuilding
+6. Metadata Filters: Chroma-style `where` filters ($eq, $ne, $gt, $gte, $lt,
+   $lte, $in, $nin, $and, $or) restrict get() and similarity search to the
+   matching documents before any vectors are scored
+7. Quantized Search: The NumPy engine can scan int8 or product-quantized codes
+   instead of the full matrix, optionally re-ranking the best candidates with
+   the memory-mapped full-precision vectors (see services.quantization)
+
+Scores:
+similarity_search_with_score returns squared L2 distances between unit
+vectors (2 - 2 * cosine similarity), the same values Chroma's default "l2"
+space reports for normalized embeddings such as OpenAI's.
+
+Files (under <persist_directory>/<collection_name>/):
+- vectors.npy: The embedding matrix, one row per document
+- ids*.npy, records.npy, record_offsets.npy: Ids, texts and metadata in row
+  order (see services.mapped_documents); documents.json in older stores
+- quantized.npz, quantized_codes.npy: Quantizer parameters and codes, when
+  quantization is enabled
+- attributes.npz: Bitsets answering metadata filters (services.attribute_index)
+
+All .npy files are memory-mapped read-only, so worker processes serving the
+same index share one copy of it; a store copies them into memory only when
+it is first written to.
+- hnsw_index.bin: The HNSW graph
+- hnsw_labels.npy, hnsw_state.json: Graph labels of the mapped document rows
+  (ascending), and the graph dimension and next free label; the documents
+  use the same mapped files as the NumPy engine (hnsw_documents.json in
+  older stores)
+"""
+
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.attribute_index import ATTRIBUTES_FILE, AttributeIndex
+from services.mapped_documents import (
+    MappedColumn,
+    MappedDocuments,
+    MappedLabelColumn,
+    MappedRows,
+    mapped_documents_exist,
+    write_mapped_documents,
+)
+from services.quantization import create_quantizer
+
+# hnswlib is only needed for the HNSW engine
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+try:
+    from langchain.schema import Document
+except ImportError:
+
+    class Document:
+        """Minimal stand-in for the LangChain Document when it is not installed"""
+
+        def __init__(self, page_content: str, metadata: Optional[dict] = None):
+            self.page_content = page_content
+            self.metadata = metadata or {}
+
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+QUANTIZED_FILE = "quantized.npz"
+QUANTIZED_CODES_FILE = "quantized_codes.npy"
+HNSW_INDEX_FILE = "hnsw_index.bin"
+HNSW_LABELS_FILE = "hnsw_labels.npy"
+HNSW_STATE_FILE = "hnsw_state.json"
+HNSW_DOCUMENTS_FILE = "hnsw_documents.json"
+
+# Rows scored per matrix product; bounds the float32 scratch for float16 stores
+SEARCH_CHUNK_ROWS = 65536
+
+# Filtered HNSW searches with at most this many candidates are scored exactly
+HNSW_EXACT_FILTER_LIMIT = 4096
+
+
+def _compare(value: Any, operator: str, expected: Any) -> bool:
+    if operator == "$eq":
+        return value == expected
+    if operator == "$ne":
+        return value != expected
+    if operator == "$in":
+        return value in expected
+    if operator == "$nin":
+        return value not in expected
+    try:
+        if operator == "$gt":
+            return value > expected
+        if operator == "$gte":
+            return value >= expected
+        if operator == "$lt":
+            return value < expected
+        if operator == "$lte":
+            return value <= expected
+    except TypeError:
+        # Mismatched types (e.g. None vs int) never match, as in Chroma
+        return False
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style metadata filter against one document"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            # Documents without the field never match
+            if key not in metadata:
+                return False
+            conditions = (
+                condition if isinstance(condition, dict) else {"$eq": condition}
+            )
+            for operator, expected in conditions.items():
+                if not _compare(metadata[key], operator, expected):
+                    return False
+    return True
+
+
+def build_metadata_filter(
+    category: Optional[str] = None,
+    author: Optional[str] = None,
+    language: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    min_rating: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """Build a `where` filter accepted by Chroma and the built-in engines"""
+    clauses = []
+    if category is not None:
+        clauses.append({"category": category})
+    if author is not None:
+        clauses.append({"author": author})
+    if language is not None:
+        clauses.append({"language": language})
+    if year_from is not None:
+        clauses.append({"year": {"$gte": year_from}})
+    if year_to is not None:
+        clauses.append({"year": {"$lte": year_to}})
+    if min_rating is not None:
+        clauses.append({"rating": {"$gte": min_rating}})
+
+    if not clauses:
+        return None
+    # Chroma expects exactly one top-level key
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore:
+    """
+    Exact vector store over a contiguous, normalized embedding matrix.
+
+    With quantization="int8" or "pq", searches scan compact codes instead of
+    the matrix; the full-precision vectors are then only read to re-rank the
+    best `rerank_candidates` results (0 disables re-ranking). Quantizers are
+    trained on the stored vectors at the first search and persisted with them.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Any,
+        collection_name: str = "luminis_books",
+        dtype: str = "float32",
+        quantization: Optional[str] = None,
+        pq_subvectors: int = 64,
+        rerank_candidates: int = 0,
+    ):
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.path = os.path.join(persist_directory, collection_name)
+        self.dtype = np.dtype(dtype)
+        self.quantizer = create_quantizer(quantization, pq_subvectors)
+        self.rerank_candidates = rerank_candidates
+
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        # Set while ids, texts and metadata are views of the mapped files
+        self._documents: Optional[MappedDocuments] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        self._size = 0
+        # Bitsets over the metadata, built on the first filtered search
+        self._attributes: Optional[AttributeIndex] = None
+
+        self._load()
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: List[Document],
+        embedding: Any,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "./chroma_db",
+        collection_name: str = "luminis_books",
+        **kwargs,
+    ) -> "NumpyVectorStore":
+        """Create a store and add documents, mirroring Chroma.from_documents"""
+        store = cls(
+            persist_directory=persist_directory,
+            embedding_function=embedding,
+            collection_name=collection_name,
+            **kwargs,
+        )
+        store.add_documents(documents, ids=ids)
+        return store
+
+    @staticmethod
+    def exists(persist_directory: str, collection_name: str) -> bool:
+        """Whether a persisted collection is available to load"""
+        path = os.path.join(persist_directory, collection_name)
+        return os.path.exists(os.path.join(path, VECTORS_FILE)) and (
+            mapped_documents_exist(path)
+            or os.path.exists(os.path.join(path, DOCUMENTS_FILE))
+        )
+
+    def _load(self) -> None:
+        if not self.exists(os.path.dirname(self.path), self.collection_name):
+            return
+
+        if mapped_documents_exist(self.path):
+            documents = MappedDocuments(self.path)
+            self._documents = documents
+            self._ids = MappedColumn(documents, documents.id)
+            self._texts = MappedColumn(documents, documents.text)
+            self._metadatas = MappedColumn(documents, documents.metadata)
+            self._rows = MappedRows(documents)
+        else:
+            with open(os.path.join(self.path, DOCUMENTS_FILE), encoding="utf-8") as f:
+                data = json.load(f)
+            self._ids = data["ids"]
+            self._texts = data["documents"]
+            self._metadatas = data["metadatas"]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        # Read-only memory map; copied into memory on the first write
+        vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r")
+        if len(vectors) != len(self._ids):
+            raise ValueError(
+                f"{self.path} holds {len(vectors)} vectors for "
+                f"{len(self._ids)} documents"
+            )
+        self.dtype = vectors.dtype
+        self._vectors = vectors
+        self._size = len(self._ids)
+        self._load_codes()
+        self._attributes = AttributeIndex.load(self.path, self._size)
+
+    def _load_codes(self) -> None:
+        """Load persisted codes if they match the configured quantizer"""
+        path = os.path.join(self.path, QUANTIZED_FILE)
+        if self.quantizer is None or not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            state = {key: data[key] for key in data.files}
+        codes_path = os.path.join(self.path, QUANTIZED_CODES_FILE)
+        if "codes" in state:
+            codes = state.pop("codes")
+        elif os.path.exists(codes_path):
+            codes = np.load(codes_path, mmap_mode="r")
+        else:
+            return
+        dimension = self._vectors.shape[1]
+        if str(state.pop("kind")) != self.quantizer.kind or codes.shape != (
+            self._size,
+            self.quantizer.code_bytes(dimension),
+        ):
+            # Settings changed; retrained and re-encoded at the first search
+            return
+        self.quantizer.load_state(state)
+        self._codes = codes
+
+    def _writable_documents(self) -> None:
+        """Copy memory-mapped documents and codes into memory before a write"""
+        if isinstance(self._codes, np.memmap):
+            self._codes = np.array(self._codes)
+        if self._documents is None:
+            return
+        self._ids = list(self._ids)
+        self._texts = list(self._texts)
+        self._metadatas = list(self._metadatas)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._documents = None
+
+    def _writable_vectors(self, dimension: int, needed: int) -> np.ndarray:
+        """Return an in-memory matrix with room for at least `needed` rows"""
+        vectors = self._vectors
+        if vectors is None or self._size == 0:
+            vectors = np.empty((max(needed, 16), dimension), dtype=self.dtype)
+        elif vectors.shape[1] != dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match "
+                f"index dimension {vectors.shape[1]}"
+            )
+        elif isinstance(vectors, np.memmap) or len(vectors) < needed:
+            capacity = len(vectors)
+            if capacity < needed:
+                # Grow geometrically so repeated upserts stay amortized O(1)
+                capacity = max(needed, capacity * 2)
+            grown = np.empty((capacity, dimension), dtype=self.dtype)
+            grown[: self._size] = vectors[: self._size]
+            vectors = grown
+        self._vectors = vectors
+        return vectors
+
+    def add_documents(
+        self, documents: List[Document], ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Add documents, replacing any existing document with the same id"""
+        if not documents:
+            return []
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in documents]
+        embeddings = np.asarray(
+            self.embedding_function.embed_documents(
+                [document.page_content for document in documents]
+            ),
+            dtype=np.float32,
+        )
+        return self.add_embeddings(documents, embeddings, ids)
+
+    def add_embeddings(
+        self, documents: List[Document], embeddings: np.ndarray, ids: List[str]
+    ) -> List[str]:
+        """Add documents with precomputed embeddings (upsert by id)"""
+        embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._writable_documents()
+            self._attributes = None
+            new_ids = [
+                doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self._rows
+            ]
+            vectors = self._writable_vectors(
+                embeddings.shape[1], self._size + len(new_ids)
+            )
+            for document, vector, doc_id in zip(documents, embeddings, ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._texts.append(document.page_content)
+                    self._metadatas.append(dict(document.metadata))
+                else:
+                    self._texts[row] = document.page_content
+                    self._metadatas[row] = dict(document.metadata)
+                vectors[row] = vector
+            if self._codes is not None:
+                self._encode_rows([self._rows[doc_id] for doc_id in ids], embeddings)
+        return ids
+
+    def _encode_rows(self, rows: List[int], embeddings: np.ndarray) -> None:
+        """Write the codes of updated rows, growing the code array if needed"""
+        codes = self._codes
+        if len(codes) < self._size:
+            grown = np.empty(
+                (max(self._size, 2 * len(codes)),) + codes.shape[1:], codes.dtype
+            )
+            grown[: len(codes)] = codes
+            codes = grown
+        codes[rows] = self.quantizer.encode(embeddings)
+        self._codes = codes
+
+    def _quantized_codes(self) -> Optional[np.ndarray]:
+        """Codes of all rows, training the quantizer on first use"""
+        if self.quantizer is None or self._vectors is None or self._size == 0:
+            return None
+        if self._codes is None:
+            vectors = np.asarray(self._vectors[: self._size], dtype=np.float32)
+            self.quantizer.fit(vectors)
+            self._codes = self.quantizer.encode(vectors)
+        return self._codes
+
+    def delete(self, ids: Optional[Sequence[str]] = None) -> None:
+        """Delete documents by id"""
+        if not ids:
+            return
+        with self._lock:
+            rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            if not rows:
+                return
+            self._writable_documents()
+            self._attributes = None
+            vectors = self._writable_vectors(self._vectors.shape[1], self._size)
+            # Fill each hole with the current last row to keep storage contiguous
+            for row in sorted(rows, reverse=True):
+                last = self._size - 1
+                removed_id = self._ids[row]
+                if row != last:
+                    vectors[row] = vectors[last]
+                    if self._codes is not None:
+                        self._codes[row] = self._codes[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                del self._rows[removed_id]
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size -= 1
+
+    def _attribute_index(self) -> AttributeIndex:
+        if self._attributes is None:
+            self._attributes = AttributeIndex.build(self._metadatas[: self._size])
+        return self._attributes
+
+    def _matching_rows(self, where: Optional[Dict[str, Any]]) -> List[int]:
+        """Rows matching a filter; indexed clauses are answered by bitsets"""
+        if not where:
+            return list(range(self._size))
+        rows, residual = self._attribute_index().select(where)
+        if rows is None:
+            rows = range(self._size)
+        elif residual is None:
+            return rows.tolist()
+        return [row for row in rows if matches_where(self._metadatas[row], residual)]
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """Return stored ids with their metadatas and documents"""
+        include = ("metadatas", "documents") if include is None else include
+        with self._lock:
+            if ids is None:
+                rows = self._matching_rows(where)
+            else:
+                rows = [
+                    self._rows[doc_id]
+                    for doc_id in ids
+                    if doc_id in self._rows
+                    and matches_where(self._metadatas[self._rows[doc_id]], where)
+                ]
+            result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+            result["metadatas"] = (
+                [self._metadatas[row] for row in rows]
+                if "metadatas" in include
+                else None
+            )
+            result["documents"] = (
+                [self._texts[row] for row in rows] if "documents" in include else None
+            )
+            if "embeddings" in include and self._vectors is not None:
+                result["embeddings"] = np.asarray(self._vectors[rows], dtype=np.float32)
+        return result
+
+    def count(self) -> int:
+        """Number of stored documents"""
+        return self._size
+
+    def _top_k(
+        self, query_vector: np.ndarray, k: int, rows: Optional[List[int]] = None
+    ) -> List[Tuple[int, float]]:
+        if rows is not None and not rows:
+            # Filtered search only scores the matching rows
+            return []
+        row_ids = np.asarray(rows, dtype=np.int64) if rows is not None else None
+        best_rows, best_scores = self._top_k_many(
+            np.asarray(query_vector)[None, :], k, row_ids
+        )
+        return [
+            (int(row), float(score)) for row, score in zip(best_rows[0], best_scores[0])
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Nearest documents to an embedding, as (document, distance) pairs"""
+        results = []
+        with self._lock:
+            rows = self._matching_rows(filter) if filter else None
+            for row, similarity in self._top_k(np.asarray(embedding), k, rows):
+                document = Document(
+                    page_content=self._texts[row],
+                    metadata=dict(self._metadatas[row]),
+                )
+                results.append((document, max(0.0, 2.0 - 2.0 * similarity)))
+        return results
+
+    def _score(
+        self,
+        queries: np.ndarray,
+        vectors: np.ndarray,
+        codes: Optional[np.ndarray],
+        rows: Any,
+    ) -> np.ndarray:
+        """Similarities of the given rows to each query (queries x rows)"""
+        if codes is not None:
+            return self.quantizer.score(codes[rows], queries)
+        return queries @ vectors[rows].astype(np.float32, copy=False).T
+
+    def _top_k_many(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+        exact: bool = False,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows and similarities for every query, scanning the matrix (or
+        its quantized codes) in chunks with one matrix product per chunk.
+        rows restricts the search to a subset; exact ignores quantization.
+        """
+        with self._lock:
+            vectors, size = self._vectors, self._size
+            codes = None if exact else self._quantized_codes()
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_vectors, np.float32)))
+        total = size if rows is None else len(rows)
+        # Quantized scores are approximate; extra candidates can be re-ranked
+        candidates = max(k, self.rerank_candidates) if codes is not None else k
+        candidates = min(candidates, total)
+        if vectors is None or k <= 0 or candidates <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, total, SEARCH_CHUNK_ROWS):
+            stop = min(start + SEARCH_CHUNK_ROWS, total)
+            chunk = slice(start, stop) if rows is None else rows[start:stop]
+            chunk_scores = self._score(queries, vectors, codes, chunk)
+            chunk_rows = np.arange(start, stop) if rows is None else rows[start:stop]
+            # Merge the chunk with the best rows so far and keep the top ones
+            scores = np.hstack([best_scores, chunk_scores])
+            row_ids = np.hstack(
+                [best_rows, np.broadcast_to(chunk_rows, chunk_scores.shape)]
+            )
+            if scores.shape[1] > candidates:
+                keep = np.argpartition(-scores, candidates - 1, axis=1)[:, :candidates]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                row_ids = np.take_along_axis(row_ids, keep, axis=1)
+            best_scores, best_rows = scores, row_ids
+
+        if codes is not None and self.rerank_candidates:
+            # Re-score the candidates with the full-precision vectors
+            full = np.asarray(vectors[best_rows], dtype=np.float32)
+            best_scores = np.einsum("qd,qcd->qc", queries, full)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1).astype(np.float32),
+        )
+
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: Sequence[Sequence[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Nearest documents for a batch of embeddings, one list per query"""
+        if len(embeddings) == 0:
+            return []
+        with self._lock:
+            rows, similarities = self._top_k_many(np.asarray(embeddings), k)
+            return [
+                [
+                    (
+                        Document(
+                            page_content=self._texts[row],
+                            metadata=dict(self._metadatas[row]),
+                        ),
+                        max(0.0, 2.0 - 2.0 * float(similarity)),
+                    )
+                    for row, similarity in zip(query_rows, query_similarities)
+                ]
+                for query_rows, query_similarities in zip(rows, similarities)
+            ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Nearest documents to a query, as (document, distance) pairs"""
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(
+            embedding, k=k, filter=filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Nearest documents to a query"""
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)
+        ]
+
+    def persist(self) -> None:
+        """Write vectors and metadata to disk atomically"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_paths = []
+            # Vectors and documents still mapped from this directory are
+            # already on disk as they are
+            if self._documents is None or not isinstance(self._vectors, np.memmap):
+                dimension = self._vectors.shape[1] if self._vectors is not None else 0
+                vectors = (
+                    self._vectors[: self._size]
+                    if self._vectors is not None
+                    else np.empty((0, dimension), dtype=self.dtype)
+                )
+                # np.save appends ".npy" unless the name already ends with it
+                tmp_vectors = os.path.join(self.path, "vectors.tmp.npy")
+                np.save(tmp_vectors, np.ascontiguousarray(vectors))
+                tmp_paths.append(tmp_vectors)
+                tmp_paths += write_mapped_documents(
+                    self.path, self._ids, self._texts, self._metadatas
+                )
+
+            codes = self._quantized_codes()
+            if codes is not None and not isinstance(codes, np.memmap):
+                tmp_state = os.path.join(self.path, "quantized.tmp.npz")
+                np.savez(tmp_state, kind=self.quantizer.kind, **self.quantizer.state())
+                tmp_codes = os.path.join(self.path, "quantized_codes.tmp.npy")
+                np.save(tmp_codes, np.ascontiguousarray(codes[: self._size]))
+                tmp_paths += [tmp_codes, tmp_state]
+
+            attributes_path = os.path.join(self.path, ATTRIBUTES_FILE)
+            if tmp_paths or not os.path.exists(attributes_path):
+                tmp_paths.append(self._attribute_index().save(self.path))
+
+            for tmp_path in tmp_paths:
+                name = os.path.basename(tmp_path).replace(".tmp", "")
+                os.replace(tmp_path, os.path.join(self.path, name))
+            # Superseded by the memory-mapped document files
+            legacy_documents = os.path.join(self.path, DOCUMENTS_FILE)
+            if tmp_paths and os.path.exists(legacy_documents):
+                os.remove(legacy_documents)
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """Bytes used by the index, with and without quantization"""
+        with self._lock:
+            dimension = self._vectors.shape[1] if self._vectors is not None else 0
+            full_bytes = self._size * dimension * self.dtype.itemsize
+            # A memory-mapped matrix is paged in on demand, not held in RAM
+            vectors_resident = self._vectors is not None and not isinstance(
+                self._vectors, np.memmap
+            )
+            footprint = {
+                "quantization": self.quantizer.kind if self.quantizer else "none",
+                "vectors": self._size,
+                "dimension": dimension,
+                "full_precision_bytes": full_bytes,
+                "full_precision_resident": vectors_resident,
+                # Mapped documents are shared with other processes
+                "documents_resident": self._documents is None,
+                "filter_index_bytes": (
+                    self._attributes.nbytes if self._attributes is not None else 0
+                ),
+            }
+            if self.quantizer is None:
+                footprint["bytes_per_vector"] = dimension * self.dtype.itemsize
+                footprint["index_bytes"] = full_bytes
+                return footprint
+
+            code_bytes = self.quantizer.code_bytes(dimension)
+            footprint["bytes_per_vector"] = code_bytes
+            footprint["codebook_bytes"] = self.quantizer.codebook_bytes()
+            footprint["index_bytes"] = (
+                self._size * code_bytes + footprint["codebook_bytes"]
+            )
+            footprint["compression_ratio"] = (
+                full_bytes / footprint["index_bytes"] if footprint["index_bytes"] else 0
+            )
+            footprint["rerank_candidates"] = self.rerank_candidates
+            return footprint
+
+    def quantization_report(self, k: int = 10, sample: int = 200) -> Dict[str, Any]:
+        """
+        Memory footprint plus recall@k of quantized search against exact
+        search, using up to `sample` stored vectors as queries
+        """
+        with self._lock:
+            # Train first so the footprint includes the codebooks
+            self._quantized_codes()
+        report = self.memory_footprint()
+        if self.quantizer is None or self._size == 0:
+            report["recall_at_k"] = 1.0
+            return report
+
+        rng = np.random.default_rng(0)
+        rows = rng.choice(self._size, min(sample, self._size), replace=False)
+        queries = np.asarray(self._vectors[np.sort(rows)], dtype=np.float32)
+        exact_rows, _ = self._top_k_many(queries, k, exact=True)
+        found_rows, _ = self._top_k_many(queries, k)
+        found = sum(
+            len(set(expected) & set(actual))
+            for expected, actual in zip(exact_rows.tolist(), found_rows.tolist())
+        )
+        report["k"] = k
+        report["recall_at_k"] = found / exact_rows.size if exact_rows.size else 1.0
+        report["recall_loss"] = 1.0 - report["recall_at_k"]
+        return report
+
+
+class HnswVectorStore:
+    """
+    Approximate vector store over an HNSW graph (hnswlib).
+
+    Documents get stable integer labels in the graph, so upserts update a
+    node in place and deletes only mark it; freed slots are reused by later
+    inserts. The graph is saved next to the documents and loaded as is at
+    startup, with no rebuild.
+
+    Tuning:
+    - M: Graph degree; higher improves recall at the cost of memory
+    - ef_construction: Build-time candidate list size; higher builds a
+      better graph more slowly
+    - ef_search: Query-time candidate list size; the main recall/latency knob
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function: Any,
+        collection_name: str = "luminis_books",
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+    ):
+        if hnswlib is None:
+            raise ImportError(
+                "hnswlib is not installed; install it with 'pip install hnswlib' "
+                "to use the HNSW vector store engine"
+            )
+
+        self.embedding_function = embedding_function
+        self.collection_name = collection_name
+        self.path = os.path.join(persist_directory, collection_name)
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+        self._lock = threading.RLock()
+        self._index = None
+        self._labels: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._texts: Dict[int, str] = {}
+        self._metadatas: Dict[int, Dict[str, Any]] = {}
+        self._next_label = 0
+        # Set while ids, texts and metadata are views of the mapped files
+        self._documents: Optional[MappedDocuments] = None
+        # Bitsets over the metadata by label, built on the first filtered search
+        self._attributes: Optional[AttributeIndex] = None
+
+        self._load()
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: List[Document],
+        embedding: Any,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "./chroma_db",
+        collection_name: str = "luminis_books",
+        **kwargs,
+    ) -> "HnswVectorStore":
+        """Create a store and add documents, mirroring Chroma.from_documents"""
+        store = cls(
+            persist_directory=persist_directory,
+            embedding_function=embedding,
+            collection_name=collection_name,
+            **kwargs,
+        )
+        store.add_documents(documents, ids=ids)
+        return store
+
+    @staticmethod
+    def exists(persist_directory: str, collection_name: str) -> bool:
+        """Whether a persisted collection is available to load"""
+        path = os.path.join(persist_directory, collection_name)
+        return os.path.exists(os.path.join(path, HNSW_INDEX_FILE)) and (
+            HnswVectorStore._mapped(path)
+            or os.path.exists(os.path.join(path, HNSW_DOCUMENTS_FILE))
+        )
+
+    @staticmethod
+    def _mapped(path: str) -> bool:
+        return (
+            mapped_documents_exist(path)
+            and os.path.exists(os.path.join(path, HNSW_LABELS_FILE))
+            and os.path.exists(os.path.join(path, HNSW_STATE_FILE))
+        )
+
+    def _load(self) -> None:
+        if not self.exists(os.path.dirname(self.path), self.collection_name):
+            return
+
+        if self._mapped(self.path):
+            with open(os.path.join(self.path, HNSW_STATE_FILE), encoding="utf-8") as f:
+                state = json.load(f)
+            documents = MappedDocuments(self.path)
+            labels = np.load(os.path.join(self.path, HNSW_LABELS_FILE), mmap_mode="r")
+            if len(labels) != len(documents):
+                raise ValueError(
+                    f"HNSW store at {self.path} has {len(labels)} labels for "
+                    f"{len(documents)} documents"
+                )
+            self._documents = documents
+            self._labels = MappedRows(documents, labels)
+            self._ids = MappedLabelColumn(documents, labels, documents.id)
+            self._texts = MappedLabelColumn(documents, labels, documents.text)
+            self._metadatas = MappedLabelColumn(documents, labels, documents.metadata)
+        else:
+            with open(
+                os.path.join(self.path, HNSW_DOCUMENTS_FILE), encoding="utf-8"
+            ) as f:
+                state = json.load(f)
+            for label, doc_id, text, metadata in zip(
+                state["labels"], state["ids"], state["documents"], state["metadatas"]
+            ):
+                self._labels[doc_id] = label
+                self._ids[label] = doc_id
+                self._texts[label] = text
+                self._metadatas[label] = metadata
+
+        self._index = hnswlib.Index(space="cosine", dim=state["dimension"])
+        self._index.load_index(
+            os.path.join(self.path, HNSW_INDEX_FILE), allow_replace_deleted=True
+        )
+        self._index.set_ef(self.ef_search)
+        self._next_label = state["next_label"]
+
+    def _writable_documents(self) -> None:
+        """Copy memory-mapped documents into dictionaries before a write"""
+        if self._documents is None:
+            return
+        self._ids = dict(self._ids.items())
+        self._texts = dict(self._texts.items())
+        self._metadatas = dict(self._metadatas.items())
+        self._labels = {doc_id: label for label, doc_id in self._ids.items()}
+        self._documents = None
+
+    def _ensure_capacity(self, dimension: int, new_items: int) -> None:
+        if self._index is None:
+            self._index = hnswlib.Index(space="cosine", dim=dimension)
+            self._index.init_index(
+                max_elements=max(new_items, 1024),
+                M=self.M,
+                ef_construction=self.ef_construction,
+                allow_replace_deleted=True,
+            )
+            self._index.set_ef(self.ef_search)
+            return
+
+        if self._index.dim != dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match "
+                f"index dimension {self._index.dim}"
+            )
+        # Deleted slots are reused, so only live elements need room
+        needed = len(self._labels) + new_items
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            self._index.resize_index(max(needed, capacity * 2))
+
+    def add_documents(
+        self, documents: List[Document], ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Add documents, replacing any existing document with the same id"""
+        if not documents:
+            return []
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in documents]
+        embeddings = np.asarray(
+            self.embedding_function.embed_documents(
+                [document.page_content for document in documents]
+            ),
+            dtype=np.float32,
+        )
+        return self.add_embeddings(documents, embeddings, ids)
+
+    def add_embeddings(
+        self, documents: List[Document], embeddings: np.ndarray, ids: List[str]
+    ) -> List[str]:
+        """Add documents with precomputed embeddings (upsert by id)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._attributes = None
+            self._writable_documents()
+            new_ids = [
+                doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self._labels
+            ]
+            self._ensure_capacity(embeddings.shape[1], len(new_ids))
+
+            # label -> embedding row; a repeated id keeps its last occurrence
+            updates: Dict[int, int] = {}
+            inserts: Dict[int, int] = {}
+            for row, (document, doc_id) in enumerate(zip(documents, ids)):
+                label = self._labels.get(doc_id)
+                if label is None:
+                    label = self._next_label
+                    self._next_label += 1
+                    self._labels[doc_id] = label
+                    self._ids[label] = doc_id
+                    inserts[label] = row
+                elif label in inserts:
+                    inserts[label] = row
+                else:
+                    updates[label] = row
+                self._texts[label] = document.page_content
+                self._metadatas[label] = dict(document.metadata)
+
+            # Existing nodes are updated in place. Only new labels may fill
+            # deleted slots: hnswlib would otherwise leave the old node of a
+            # replaced label in the graph
+            if updates:
+                self._index.add_items(
+                    embeddings[list(updates.values())], list(updates.keys())
+                )
+            if inserts:
+                self._index.add_items(
+                    embeddings[list(inserts.values())],
+                    list(inserts.keys()),
+                    replace_deleted=True,
+                )
+        return ids
+
+    def delete(self, ids: Optional[Sequence[str]] = None) -> None:
+        """Delete documents by id"""
+        if not ids:
+            return
+        with self._lock:
+            self._attributes = None
+            self._writable_documents()
+            for doc_id in ids:
+                label = self._labels.pop(doc_id, None)
+                if label is None:
+                    continue
+                self._index.mark_deleted(label)
+                del self._ids[label]
+                del self._texts[label]
+                del self._metadatas[label]
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """Return stored ids with their metadatas and documents"""
+        include = ("metadatas", "documents") if include is None else include
+        with self._lock:
+            if ids is None:
+                labels = self._matching_labels(where)
+            else:
+                labels = [
+                    self._labels[doc_id]
+                    for doc_id in ids
+                    if doc_id in self._labels
+                    and matches_where(self._metadatas[self._labels[doc_id]], where)
+                ]
+            result: Dict[str, Any] = {"ids": [self._ids[label] for label in labels]}
+            result["metadatas"] = (
+                [self._metadatas[label] for label in labels]
+                if "metadatas" in include
+                else None
+            )
+            result["documents"] = (
+                [self._texts[label] for label in labels]
+                if "documents" in include
+                else None
+            )
+            if "embeddings" in include and self._index is not None:
+                result["embeddings"] = self._index.get_items(labels) if labels else []
+        return result
+
+    def count(self) -> int:
+        """Number of stored documents"""
+        return len(self._labels)
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """Approximate bytes held by the graph index"""
+        with self._lock:
+            if self._index is None:
+                dimension, capacity = 0, 0
+            else:
+                dimension, capacity = self._index.dim, self._index.get_max_elements()
+            # hnswlib allocates every slot up front: the float32 vector, the
+            # 2 * M level-0 links, their count and the external label
+            per_element = dimension * 4 + self.M * 2 * 4 + 4 + 8
+            return {
+                "vectors": len(self._labels),
+                "dimension": dimension,
+                "capacity": capacity,
+                "index_bytes": capacity * per_element,
+                # Mapped documents are shared with other processes
+                "documents_resident": self._documents is None,
+                "filter_index_bytes": (
+                    self._attributes.nbytes if self._attributes is not None else 0
+                ),
+            }
+
+    def _matching_labels(self, where: Optional[Dict[str, Any]]) -> List[int]:
+        """Labels matching a filter; indexed clauses are answered by bitsets"""
+        if not where:
+            return list(self._metadatas)
+        if self._attributes is None:
+            # Deleted labels have no metadata and are in no bitset
+            self._attributes = AttributeIndex.build(
+                [self._metadatas.get(label) for label in range(self._next_label)]
+            )
+        labels, residual = self._attributes.select(where)
+        if labels is None:
+            labels = self._metadatas
+        elif residual is None:
+            return labels.tolist()
+        return [
+            label for label in labels if matches_where(self._metadatas[label], residual)
+        ]
+
+    def _exact_search(
+        self, query: np.ndarray, labels: List[int], k: int
+    ) -> Tuple[List[int], List[float]]:
+        """Brute-force cosine search over a small candidate set"""
+        vectors = _normalize_rows(np.asarray(self._index.get_items(labels)))
+        norm = np.linalg.norm(query)
+        similarities = vectors @ (query / norm if norm > 0 else query)
+        order = np.argsort(-similarities, kind="stable")[:k]
+        return [labels[i] for i in order], [1.0 - similarities[i] for i in order]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Nearest documents to an embedding, as (document, distance) pairs"""
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            size = len(self._labels)
+            if self._index is None or size == 0 or k <= 0:
+                return []
+
+            if filter:
+                allowed = self._matching_labels(filter)
+                if not allowed:
+                    return []
+                if len(allowed) <= HNSW_EXACT_FILTER_LIMIT:
+                    # Graph search degrades for very selective filters; a small
+                    # candidate set is scored exactly instead
+                    labels, distances = self._exact_search(query, allowed, k)
+                else:
+                    allowed_set = set(allowed)
+                    labels, distances = self._knn(
+                        query, min(k, len(allowed)), allowed_set.__contains__
+                    )
+            else:
+                labels, distances = self._knn(query, min(k, size))
+
+            results = []
+            for label, distance in zip(labels, distances):
+                document = Document(
+                    page_content=self._texts[label],
+                    metadata=dict(self._metadatas[label]),
+                )
+                # Cosine distance -> squared L2 between unit vectors, as Chroma
+                results.append((document, max(0.0, 2.0 * float(distance))))
+        return results
+
+    def _knn(
+        self, query: np.ndarray, k: int, filter: Optional[Any] = None
+    ) -> Tuple[List[int], List[float]]:
+        # ef must be at least k for the graph search to return k results
+        self._index.set_ef(max(self.ef_search, k))
+        labels, distances = self._index.knn_query(query, k=k, filter=filter)
+        return [int(label) for label in labels[0]], list(distances[0])
+
+    def similarity_search_by_vectors_with_score(
+        self, embeddings: Sequence[Sequence[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Nearest documents for a batch of embeddings, one list per query"""
+        if len(embeddings) == 0:
+            return []
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            size = len(self._labels)
+            if self._index is None or size == 0 or k <= 0:
+                return [[] for _ in queries]
+
+            k = min(k, size)
+            self._index.set_ef(max(self.ef_search, k))
+            # hnswlib searches all rows of the query matrix in parallel
+            labels, distances = self._index.knn_query(queries, k=k)
+            return [
+                [
+                    (
+                        Document(
+                            page_content=self._texts[int(label)],
+                            metadata=dict(self._metadatas[int(label)]),
+                        ),
+                        max(0.0, 2.0 * float(distance)),
+                    )
+                    for label, distance in zip(query_labels, query_distances)
+                ]
+                for query_labels, query_distances in zip(labels, distances)
+            ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Nearest documents to a query, as (document, distance) pairs"""
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(
+            embedding, k=k, filter=filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Nearest documents to a query"""
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)
+        ]
+
+    def persist(self) -> None:
+        """Save the graph and documents to disk atomically"""
+        with self._lock:
+            # Still mapped: nothing was written since the files were loaded
+            if self._index is None or self._documents is not None:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            index_path = os.path.join(self.path, HNSW_INDEX_FILE)
+            self._index.save_index(index_path + ".tmp")
+            tmp_paths = [index_path + ".tmp"]
+
+            # Rows are written in label order so a label is found by binary search
+            labels = sorted(self._ids)
+            tmp_paths += write_mapped_documents(
+                self.path,
+                [self._ids[label] for label in labels],
+                [self._texts[label] for label in labels],
+                [self._metadatas[label] for label in labels],
+            )
+            tmp_labels = os.path.join(self.path, "hnsw_labels.tmp.npy")
+            np.save(tmp_labels, np.asarray(labels, dtype=np.int64))
+            tmp_state = os.path.join(self.path, "hnsw_state.tmp.json")
+            with open(tmp_state, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"dimension": self._index.dim, "next_label": self._next_label}, f
+                )
+            tmp_paths += [tmp_labels, tmp_state]
+
+            for tmp_path in tmp_paths:
+                name = os.path.basename(tmp_path).replace(".tmp", "")
+                os.replace(tmp_path, os.path.join(self.path, name))
+            # Superseded by the memory-mapped document files
+            legacy_documents = os.path.join(self.path, HNSW_DOCUMENTS_FILE)
+            if os.path.exists(legacy_documents):
+                os.remove(legacy_documents)
@@ -12,15 +12,48 @@ Key Features:
 2. Similarity Matching: Identify books with similar themes, styles, or content
 3. Vector Embeddings: Convert book descriptions to high-dimensional vectors
 4. Fast Retrieval: Efficient similarity search using vector databases
-5. Dynamic Updates: Automatically update vector store with new books
+5. Dynamic Updates: Incremental, diff-based updates with stable document ids
 6. Multi-dimensional Analysis: Consider multiple aspects of books for better matches
 
 Technical Implementation:
-- OpenAI Embeddings: Uses text-embedding-ada-002 model for high-quality vectors
+- Shared Index: The embeddings, documents and store are owned by the
+  IndexManager (services.index_manager) and shared with RAGService
+- Blue/Green Rebuilds: Updates build a new index version and swap it in
+  atomically; each search leases one version for its whole duration
+- Pluggable Embeddings: OpenAI text-embedding-ada-002 by default, or a local
+  hashed n-gram backend for air-gapped deployments and CI (EMBEDDING_BACKEND)
 - ChromaDB Integration: Persistent vector storage with fast similarity search
+- NumPy Engine: Exact in-process index over a memory-mapped embedding matrix,
+  selectable with VECTOR_STORE_ENGINE=numpy as an alternative to ChromaDB;
+  VECTOR_QUANTIZATION=int8|pq searches compact codes for large catalogs
+- HNSW Engine: Approximate graph index for millions of works
+  (VECTOR_STORE_ENGINE=hnsw), tuned with HNSW_M / HNSW_EF_CONSTRUCTION /
+  HNSW_EF_SEARCH; books synced from Open Library are inserted incrementally
+- Embedding Cache: Document vectors cached on disk by content hash, so rebuilds
+  only embed new or changed books
 - Document Processing: Converts book metadata to searchable vector representations
 - Similarity Thresholds: Configurable similarity scores for result filtering
-- Batch Operations: Efficient processing of large book collections
+- Similar Books: Neighbours are found from the seed book's stored vector, so
+  similar-book lookups need no embedding call; with a precomputed neighbour
+  table (scripts/build_neighbor_table.py) they are a table lookup
+- Hybrid Search: BM25 keyword search and vector search run concurrently and
+  are merged with reciprocal rank fusion, so exact title and author hits are
+  not lost; the lexical leg doubles as a fast fallback
+- Diversified Results: Maximal marginal relevance re-ranking over the stored
+  vectors of the candidates spreads results across authors and series
+- Batched Search: Many queries are embedded in one request and searched as
+  one matrix operation, for recommendation jobs issuing hundreds of searches
+- Metadata Filters: Exact category / author / language / year-range /
+  minimum-rating filters pushed down to the index, optionally ranked
+  semantically within the set; the built-in engines intersect precomputed
+  bitsets to find the eligible books and score only those
+- Batch Operations: Large catalogs are embedded and inserted batch by batch
+  through a concurrent, rate-limit aware embedding pipeline that resumes
+  interrupted builds from the embedding cache
+- Instrumentation: Per-call latency histograms split into embed, search and
+  post-process stages, embedding calls and tokens, cache hit rates, index
+  memory and the last rebuild duration, reported by get_vector_store_stats
+  and exported in the Prometheus text format (services.metrics)
 
 Use Cases:
 - Finding books similar to user favorites
@@ -46,10 +79,11 @@ This service is essential for:
 
 import os
 import json
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import List, Dict, Any, Optional, Tuple
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
 
 # Robust database import with fallback mechanisms
 try:
@@ -77,6 +111,23 @@ except ImportError:
         Book = DummyBook
         UserBook = DummyUserBook
         BookStatus = DummyBookStatus
+
+from services.diversity import MMR_CANDIDATES_PER_RESULT
+from services.index_manager import IndexManager, get_index_manager, leased
+from services.lexical_index import reciprocal_rank_fusion
+from services.metrics import MetricsRegistry
+from services.vector_index import (
+    Document,
+    HnswVectorStore,
+    NumpyVectorStore,
+    build_metadata_filter,
+)
+
+# Read-through cache for Book lookups; fall back to direct queries without it
+try:
+    from database.book_cache import book_cache
+except ImportError:
+    book_cache = None
 from dotenv import load_dotenv
 import numpy as np
 from datetime import datetime
@@ -84,272 +135,540 @@ from datetime import datetime
 # Load environment variables
 load_dotenv()
 
+# Candidates fetched from each leg of a hybrid search, per requested result
+HYBRID_CANDIDATES_PER_RESULT = 3
+
+
+# HELP texts of the metrics exported by VectorService.render_metrics()
+METRIC_DESCRIPTIONS = {
+    "requests_total": "Search service calls by operation",
+    "errors_total": "Search service calls that failed or fell back",
+    "request_seconds": "Latency of search service calls",
+    "stage_seconds": "Latency of the embed, search and post-process stages",
+    "documents": "Documents in the active index",
+    "index_bytes": "Approximate bytes held by the vector index",
+    "filter_index_bytes": "Bytes held by the metadata bitset indexes",
+    "neighbor_table_bytes": "Bytes held by the precomputed neighbour table",
+    "embedding_provider_calls_total": "Requests sent to the embedding provider",
+    "embedding_provider_texts_total": "Texts embedded by the provider",
+    "embedding_provider_tokens_total": "Tokens sent to the embedding provider",
+    "embedding_provider_seconds_total": "Seconds spent waiting on the provider",
+    "embedding_cache_hits_total": "Embedding cache hits",
+    "embedding_cache_misses_total": "Embedding cache misses",
+    "embedding_cache_hit_ratio": "Embedding cache hit rate",
+    "last_rebuild_seconds": "Duration of the last index build or update",
+    "last_rebuild_success": "Whether the last index build or update succeeded",
+}
+
+
+def instrumented(operation: str):
+    """Count calls of a service method and observe their total latency"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self.metrics.increment("requests_total", operation=operation)
+            with self.metrics.timer("request_seconds", operation=operation):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
 
 class VectorService:
-    def __init__(self):
-        """Initialize vector service with ChromaDB"""
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=os.getenv("OPENAI_API_KEY"), model="text-embedding-ada-002"
+    def __init__(self, index_manager: Optional[IndexManager] = None):
+        """Initialize vector service on the shared book index"""
+        # The index (embeddings, documents and store) is shared with
+        # RAGService, so the catalog is embedded and loaded only once
+        self.index_manager = index_manager or get_index_manager()
+
+        # Hybrid search runs its lexical and vector legs side by side; the
+        # lexical results are returned alone if the vector leg is slower
+        self.hybrid_vector_timeout = float(os.getenv("HYBRID_VECTOR_TIMEOUT", "5"))
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("HYBRID_SEARCH_WORKERS", "4")),
+            thread_name_prefix="hybrid-search",
         )
 
-        self.vector_store = None
-        self.persist_directory = "./chroma_db"
-        self.collection_name = "luminis_books"
+        # Latency histograms and counters of this service (services.metrics)
+        self.metrics = MetricsRegistry(namespace="luminis_vector")
+        for name, text in METRIC_DESCRIPTIONS.items():
+            self.metrics.describe(name, text)
 
-        # Initialize vector store
-        self.initialize_vector_store()
+    @property
+    def vector_store(self):
+        return self.index_manager.vector_store
 
-    def initialize_vector_store(self):
-        """Initialize or load existing ChromaDB vector store"""
-        try:
-            # Try to load existing vector store
-            if os.path.exists(self.persist_directory):
-                self.vector_store = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings,
-                    collection_name=self.collection_name,
-                )
-                print(f"Loaded existing vector store from {self.persist_directory}")
-            else:
-                # Create new vector store
-                self._create_new_vector_store()
+    @property
+    def embeddings(self):
+        return self.index_manager.embeddings
 
-        except Exception as e:
-            print(f"Error loading vector store: {e}")
-            self._create_new_vector_store()
+    @property
+    def persist_directory(self) -> str:
+        return self.index_manager.persist_directory
+
+    @property
+    def vector_store_engine(self) -> str:
+        return self.index_manager.vector_store_engine
+
+    def add_books(self, books: List[Dict[str, Any]]) -> int:
+        """Incrementally index books synced from Open Library"""
+        return self.index_manager.add_books(books)
+
+    def update_vector_store(self) -> Dict[str, Any]:
+        """Bring the shared vector store in line with the books table"""
+        return self.index_manager.update_vector_store()
 
-    def _create_new_vector_store(self):
-        """Create new vector store with sample data"""
+    @contextmanager
+    def _stage(self, operation: str, stage: str):
+        """Observe the seconds one stage of an operation takes"""
+        with self.metrics.timer("stage_seconds", operation=operation, stage=stage):
+            yield
+
+    def _find_book_by_title(self, book_title: str) -> Optional[Any]:
+        """Find the first book whose title contains book_title"""
+        if book_cache is not None:
+            return book_cache.get_by_title(book_title)
+
+        db = SessionLocal()
         try:
-            # Load books from database
-            db = SessionLocal()
-            books = db.query(Book).all()
-
-            if not books:
-                print("No books found in database. Creating sample vector store...")
-                self._create_sample_vector_store()
-                return
-
-            # Convert books to documents with enhanced content
-            documents = []
-            for book in books:
-                # Create rich document content for better embeddings
-                content = self._create_book_content(book)
-
-                metadata = {
-                    "title": book.title,
-                    "author": book.author,
-                    "category": book.category,
-                    "year": book.year,
-                    "language": book.language,
-                    "rating": book.rating,
-                    "book_id": book.id,
-                    "created_at": datetime.utcnow().isoformat(),
-                }
+            return db.query(Book).filter(Book.title.ilike(f"%{book_title}%")).first()
+        finally:
+            db.close()
+
+    @instrumented("semantic_search")
+    @leased
+    def semantic_search(
+        self,
+        query: str,
+        limit: int = 10,
+        threshold: float = 0.7,
+        mmr_lambda: Optional[float] = None,
+        category: Optional[str] = None,
+        language: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        min_rating: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Advanced semantic search with similarity threshold.
 
-                documents.append(Document(page_content=content, metadata=metadata))
+        With mmr_lambda set, more candidates are retrieved and re-ranked by
+        maximal marginal relevance (1 = relevance only, 0 = diversity only);
+        results then keep the MMR order.
 
-            # Create vector store
-            self.vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory,
-                collection_name=self.collection_name,
+        Metadata filters are applied inside the index before scoring, so a
+        selective filter still returns the nearest `limit` matching books
+        rather than whatever survives of an unfiltered top-k.
+        """
+        try:
+            where = build_metadata_filter(
+                category,
+                language=language,
+                year_from=year_from,
+                year_to=year_to,
+                min_rating=min_rating,
             )
+            if mmr_lambda is not None:
+                return self._diversified_search(
+                    query, limit, threshold, mmr_lambda, where
+                )
+
+            # The query is embedded separately so both stages are measured
+            with self._stage("semantic_search", "embed"):
+                embedding = self.embeddings.embed_query(query)
+            with self._stage("semantic_search", "search"):
+                docs = self._search_by_vector(embedding, k=limit, filter=where)
 
-            # Persist the vector store
-            self.vector_store.persist()
+            with self._stage("semantic_search", "post_process"):
+                results = []
+                for doc, score in docs:
+                    # Filter by similarity threshold
+                    if score <= threshold:  # Lower score = higher similarity
+                        results.append(self._format_result(doc, score))
 
-            print(f"Created new vector store with {len(documents)} books")
+                # Sort by similarity score
+                results.sort(key=lambda x: x["similarity_score"], reverse=True)
+
+            return results
 
         except Exception as e:
-            print(f"Error creating vector store: {e}")
-            self._create_sample_vector_store()
-        finally:
-            db.close()
+            print(f"Error in semantic search: {e}")
+            self.metrics.increment("errors_total", operation="semantic_search")
+            return []
 
-    def _create_book_content(self, book: Book) -> str:
-        """Create rich content for book embedding"""
-        content_parts = [
-            f"Kitap Adı: {book.title}",
-            f"Yazar: {book.author}",
-            f"Kategori: {book.category or 'Genel'}",
-            f"Açıklama: {book.description or 'Açıklama yok'}",
-            f"Yıl: {book.year or 'Bilinmiyor'}",
-            f"Dil: {book.language or 'tr'}",
-            f"Puan: {book.rating or 0}",
+    def _diversified_search(
+        self,
+        query: str,
+        limit: int,
+        threshold: float,
+        mmr_lambda: float,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Semantic search re-ranked by maximal marginal relevance"""
+        with self._stage("semantic_search", "embed"):
+            embedding = self.embeddings.embed_query(query)
+        with self._stage("semantic_search", "search"):
+            docs = self._search_by_vector(
+                embedding, k=max(limit, 1) * MMR_CANDIDATES_PER_RESULT, filter=where
+            )
+        with self._stage("semantic_search", "post_process"):
+            docs = [(doc, score) for doc, score in docs if score <= threshold]
+            selected = self.index_manager.diversify(
+                query, [doc for doc, _ in docs], limit, mmr_lambda
+            )
+            return [self._format_result(*docs[i]) for i in selected]
+
+    @leased
+    def lexical_search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """BM25 keyword search as (document, BM25 score) pairs, best first"""
+        return self._lexical_search(self.vector_store, query, k)
+
+    def _lexical_search(
+        self, store: Any, query: str, k: int
+    ) -> List[Tuple[Document, float]]:
+        """BM25 search over the lexical index of one given store version"""
+        index = self.index_manager.get_lexical_index(store)
+        if index is None:
+            return []
+        return [
+            (
+                Document(
+                    page_content=index.documents[position],
+                    metadata=dict(index.metadatas[position] or {}),
+                ),
+                score,
+            )
+            for position, score in index.search(query, k=k)
         ]
 
-        # Add additional context based on category
-        if book.category:
-            category_context = self._get_category_context(book.category)
-            content_parts.append(f"Tür Bilgisi: {category_context}")
-
-        return "\n".join(content_parts)
-
-    def _get_category_context(self, category: str) -> str:
-        """Get additional context for book categories"""
-        category_contexts = {
-            "Roman": "Uzun soluklu, karakter odaklı anlatım",
-            "Distopya": "Gelecekteki olumsuz toplum tasviri",
-            "Bilim Kurgu": "Teknoloji ve gelecek temalı",
-            "Fantastik": "Hayali dünyalar ve büyülü öğeler",
-            "Çocuk Edebiyatı": "Çocuklar için eğitici ve eğlenceli",
-            "Tarih": "Geçmiş olaylar ve dönemler",
-            "Felsefe": "Düşünce ve varoluş sorguları",
-            "Psikoloji": "İnsan davranışları ve zihin",
-            "Bilim": "Bilimsel keşifler ve araştırmalar",
-        }
+    def _fusion_key(self, doc: Document) -> str:
+        """Store id of a document, or its text if the metadata has no id"""
+        return self.index_manager.stored_document_id(doc) or doc.page_content
 
-        return category_contexts.get(category, "Genel edebiyat")
-
-    def _create_sample_vector_store(self):
-        """Create sample vector store with enhanced book data"""
-        sample_books = [
-            {
-                "title": "Suç ve Ceza",
-                "author": "Fyodor Dostoyevski",
-                "category": "Roman",
-                "description": "Psikolojik gerilim ve ahlaki sorgulama temalı klasik roman. Raskolnikov'un işlediği cinayet sonrası yaşadığı vicdani azap ve toplumla hesaplaşması",
-                "year": 1866,
-                "language": "tr",
-                "rating": 4.8,
-            },
-            {
-                "title": "1984",
-                "author": "George Orwell",
-                "category": "Distopya",
-                "description": "Totaliter rejim eleştirisi ve distopik toplum analizi. Büyük Birader'in gözetimi altındaki toplumda yaşam",
-                "year": 1949,
-                "language": "tr",
-                "rating": 4.7,
-            },
-            {
-                "title": "Küçük Prens",
-                "author": "Antoine de Saint-Exupéry",
-                "category": "Çocuk Edebiyatı",
-                "description": "Felsefi masal ve hayat dersleri. Küçük prensin farklı gezegenlerdeki yolculuğu ve öğrendiği değerler",
-                "year": 1943,
-                "language": "tr",
-                "rating": 4.9,
-            },
-            {
-                "title": "Dune",
-                "author": "Frank Herbert",
-                "category": "Bilim Kurgu",
-                "description": "Epik bilim kurgu romanı. Arrakis gezegenindeki baharat savaşları ve Paul Atreides'in kaderi",
-                "year": 1965,
-                "language": "tr",
-                "rating": 4.6,
-            },
-            {
-                "title": "Hobbit",
-                "author": "J.R.R. Tolkien",
-                "category": "Fantastik",
-                "description": "Orta Dünya macerası. Bilbo Baggins'in cücelerle birlikte çıktığı tehlikeli yolculuk",
-                "year": 1937,
-                "language": "tr",
-                "rating": 4.8,
-            },
-        ]
+    @staticmethod
+    def _timed(function, *args, **kwargs) -> Tuple[Any, float]:
+        """Call function and return its result with the elapsed milliseconds"""
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        return result, (time.perf_counter() - started) * 1000
 
-        documents = []
-        for book in sample_books:
-            content = self._create_book_content_from_dict(book)
-
-            metadata = {
-                "title": book["title"],
-                "author": book["author"],
-                "category": book["category"],
-                "year": book["year"],
-                "language": book["language"],
-                "rating": book["rating"],
-                "created_at": datetime.utcnow().isoformat(),
-            }
-
-            documents.append(Document(page_content=content, metadata=metadata))
-
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
-            collection_name=self.collection_name,
+    @instrumented("hybrid_search")
+    @leased
+    def hybrid_search(
+        self, query: str, limit: int = 10, threshold: float = 0.7
+    ) -> Dict[str, Any]:
+        """
+        Hybrid lexical and semantic search.
+
+        A BM25 search and the vector search run concurrently and their
+        rankings are merged with reciprocal rank fusion, so exact title and
+        author matches rank next to paraphrases. Vector hits above the
+        distance threshold are dropped before fusion. If the vector leg fails
+        or exceeds HYBRID_VECTOR_TIMEOUT seconds, the lexical ranking is
+        returned alone and "fallback" is set.
+
+        Returns:
+            Dict with "results", per-stage "timings" in milliseconds and
+            "fallback"
+        """
+        started = time.perf_counter()
+        candidates = max(limit, 1) * HYBRID_CANDIDATES_PER_RESULT
+
+        # Leases are per thread, so both legs get the store this call leased
+        # instead of leasing again, possibly a newer version, on the workers
+        store = self.vector_store
+        lexical_future = self._search_executor.submit(
+            self._timed, self._lexical_search, store, query, k=candidates
+        )
+        vector_future = self._search_executor.submit(
+            self._timed, store.similarity_search_with_score, query, k=candidates
         )
 
-        # Persist the vector store
-        self.vector_store.persist()
-
-        print(f"Sample vector store created with {len(documents)} books")
-
-    def _create_book_content_from_dict(self, book: Dict[str, Any]) -> str:
-        """Create content from book dictionary"""
-        content_parts = [
-            f"Kitap Adı: {book['title']}",
-            f"Yazar: {book['author']}",
-            f"Kategori: {book['category']}",
-            f"Açıklama: {book['description']}",
-            f"Yıl: {book['year']}",
-            f"Dil: {book['language']}",
-            f"Puan: {book['rating']}",
-        ]
+        lexical, lexical_ms = lexical_future.result()
+        fallback = False
+        try:
+            vector, vector_ms = vector_future.result(timeout=self.hybrid_vector_timeout)
+            vector = [(doc, score) for doc, score in vector if score <= threshold]
+        except Exception as e:
+            print(f"Vector search failed in hybrid search, using lexical results: {e}")
+            vector, vector_ms, fallback = [], None, True
+
+        fusion_started = time.perf_counter()
+        # Documents are identified by their store id across both legs, so
+        # books with identical or empty descriptions stay apart
+        documents = {}
+        for doc, _ in lexical + vector:
+            documents.setdefault(self._fusion_key(doc), doc)
+        distances = {self._fusion_key(doc): score for doc, score in vector}
+        fused = reciprocal_rank_fusion(
+            [
+                [self._fusion_key(doc) for doc, _ in lexical],
+                [self._fusion_key(doc) for doc, _ in vector],
+            ]
+        )
 
-        # Add category context
-        category_context = self._get_category_context(book["category"])
-        content_parts.append(f"Tür Bilgisi: {category_context}")
+        results = []
+        for key, fusion_score in fused[:limit]:
+            result = self._format_result(documents[key], distances.get(key))
+            result["fusion_score"] = fusion_score
+            results.append(result)
+        finished = time.perf_counter()
+
+        self.metrics.observe(
+            "stage_seconds",
+            lexical_ms / 1000,
+            operation="hybrid_search",
+            stage="lexical",
+        )
+        if vector_ms is not None:
+            self.metrics.observe(
+                "stage_seconds",
+                vector_ms / 1000,
+                operation="hybrid_search",
+                stage="vector",
+            )
+        else:
+            self.metrics.increment("errors_total", operation="hybrid_search")
+        self.metrics.observe(
+            "stage_seconds",
+            finished - fusion_started,
+            operation="hybrid_search",
+            stage="post_process",
+        )
 
-        return "\n".join(content_parts)
+        return {
+            "results": results,
+            "timings": {
+                "lexical_ms": lexical_ms,
+                "vector_ms": vector_ms,
+                "fusion_ms": (finished - fusion_started) * 1000,
+                "total_ms": (finished - started) * 1000,
+            },
+            "fallback": fallback,
+        }
 
-    def semantic_search(
-        self, query: str, limit: int = 10, threshold: float = 0.7
+    @instrumented("semantic_search_many")
+    @leased
+    def semantic_search_many(
+        self, queries: List[str], limit: int = 10, threshold: float = 0.7
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Semantic search for a batch of queries.
+
+        All uncached queries are embedded in one request and, on the NumPy and
+        HNSW engines, searched together as a single matrix operation. Returns
+        one result list per query, in the order of the queries.
+        """
+        if not queries:
+            return []
+
+        with self._stage("semantic_search_many", "embed"):
+            if hasattr(self.embeddings, "embed_queries"):
+                embeddings = self.embeddings.embed_queries(queries)
+            else:
+                embeddings = self.embeddings.embed_documents(queries)
+
+        with self._stage("semantic_search_many", "search"):
+            if hasattr(self.vector_store, "similarity_search_by_vectors_with_score"):
+                batches = self.vector_store.similarity_search_by_vectors_with_score(
+                    embeddings, k=limit
+                )
+            else:
+                batches = [
+                    self._search_by_vector(embedding, k=limit)
+                    for embedding in embeddings
+                ]
+
+        with self._stage("semantic_search_many", "post_process"):
+            all_results = []
+            for docs in batches:
+                results = [
+                    self._format_result(doc, score)
+                    for doc, score in docs
+                    if score <= threshold
+                ]
+                results.sort(key=lambda x: x["similarity_score"], reverse=True)
+                all_results.append(results)
+        return all_results
+
+    @staticmethod
+    def _format_result(doc: Document, score: Optional[float] = None) -> Dict[str, Any]:
+        """Convert a stored document (and its distance, if ranked) to a result"""
+        description = ""
+        if "Açıklama: " in doc.page_content:
+            description = doc.page_content.split("Açıklama: ")[1].split("\n")[0]
+
+        return {
+            "title": doc.metadata.get("title"),
+            "author": doc.metadata.get("author"),
+            "category": doc.metadata.get("category"),
+            "description": description,
+            "year": doc.metadata.get("year"),
+            "rating": doc.metadata.get("rating"),
+            # Convert distance to similarity; unranked filter results have none
+            "similarity_score": 1 - score if score is not None else None,
+            "book_id": doc.metadata.get("book_id"),
+        }
+
+    @instrumented("filter_books")
+    @leased
+    def filter_books(
+        self,
+        category: Optional[str] = None,
+        author: Optional[str] = None,
+        language: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        query: Optional[str] = None,
+        limit: Optional[int] = 10,
+        min_rating: Optional[float] = None,
     ) -> List[Dict[str, Any]]:
-        """Advanced semantic search with similarity threshold"""
-        try:
-            # Search with similarity search
-            docs = self.vector_store.similarity_search_with_score(query, k=limit)
-
-            results = []
-            for doc, score in docs:
-                # Filter by similarity threshold
-                if score <= threshold:  # Lower score = higher similarity
-                    results.append(
-                        {
-                            "title": doc.metadata.get("title"),
-                            "author": doc.metadata.get("author"),
-                            "category": doc.metadata.get("category"),
-                            "description": doc.page_content.split("Açıklama: ")[
-                                1
-                            ].split("\n")[0]
-                            if "Açıklama: " in doc.page_content
-                            else "",
-                            "year": doc.metadata.get("year"),
-                            "rating": doc.metadata.get("rating"),
-                            "similarity_score": 1
-                            - score,  # Convert to similarity score
-                            "book_id": doc.metadata.get("book_id"),
-                        }
-                    )
-
-            # Sort by similarity score
-            results.sort(key=lambda x: x["similarity_score"], reverse=True)
+        """
+        Structured search with exact metadata filters.
+
+        The filters are pushed down to the vector store as a `where` clause.
+        Without a query the complete matching set is returned, best rated
+        first, and no embedding is computed. With a query the filtered set is
+        ranked by semantic similarity instead.
+        """
+        where = build_metadata_filter(
+            category, author, language, year_from, year_to, min_rating
+        )
 
-            return results
+        if query:
+            with self._stage("filter_books", "embed"):
+                embedding = self.embeddings.embed_query(query)
+            with self._stage("filter_books", "search"):
+                docs = self._search_by_vector(embedding, k=limit or 10, filter=where)
+            with self._stage("filter_books", "post_process"):
+                return [self._format_result(doc, score) for doc, score in docs]
 
-        except Exception as e:
-            print(f"Error in semantic search: {e}")
+        if where is None:
             return []
 
+        with self._stage("filter_books", "search"):
+            stored = self.vector_store.get(
+                where=where, include=["metadatas", "documents"]
+            )
+        with self._stage("filter_books", "post_process"):
+            results = [
+                self._format_result(
+                    Document(page_content=text, metadata=metadata or {})
+                )
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ]
+            results.sort(key=lambda book: (-(book["rating"] or 0), book["title"] or ""))
+            return results[:limit] if limit else results
+
+    def _stored_embedding(self, book_id: int) -> Optional[List[float]]:
+        """Vector of an indexed book, or None if it is not in the store"""
+        stored = self.vector_store.get(
+            ids=[self.index_manager.document_id(book_id)], include=["embeddings"]
+        )
+        embeddings = stored.get("embeddings")
+        if stored["ids"] and embeddings is not None and len(embeddings):
+            return list(embeddings[0])
+        return None
+
+    def _search_by_vector(
+        self,
+        embedding: List[float],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Nearest documents to a vector as (document, distance) pairs"""
+        if hasattr(self.vector_store, "similarity_search_by_vector_with_score"):
+            return self.vector_store.similarity_search_by_vector_with_score(
+                embedding, k=k, filter=filter
+            )
+        # LangChain's Chroma returns raw distances from this method
+        return self.vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=filter
+        )
+
+    def _similar_from_table(
+        self, book_id: int, limit: int, threshold: float
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Similar books from the precomputed neighbour table, if it covers them"""
+        # The table and the documents it points to come from one version
+        with self.index_manager.lease() as lease:
+            table = lease.neighbor_table
+            if table is None or limit > table.size:
+                return None
+            neighbors = table.get(self.index_manager.document_id(book_id), limit)
+            if neighbors is None:
+                return None
+
+            stored = lease.store.get(
+                ids=[doc_id for doc_id, _ in neighbors],
+                include=["documents", "metadatas"],
+            )
+        documents = {
+            doc_id: Document(page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(
+                stored["ids"], stored["documents"], stored["metadatas"]
+            )
+        }
+        results = []
+        for doc_id, similarity in neighbors:
+            # Same squared L2 distance the vector stores report
+            distance = 2.0 - 2.0 * similarity
+            if doc_id in documents and distance <= threshold:
+                results.append(self._format_result(documents[doc_id], distance))
+        return results
+
+    @instrumented("similar_books")
+    @leased
+    def find_similar_books_by_id(
+        self, book_id: int, limit: int = 5, threshold: float = 0.7
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find books similar to an indexed book using its stored vector.
+
+        Served from the precomputed neighbour table when one covers the book
+        and limit; otherwise the stored vector is searched. No embedding is
+        computed, and the seed book is excluded by id. Returns None when the
+        book has no stored vector.
+        """
+        with self._stage("similar_books", "search"):
+            results = self._similar_from_table(book_id, limit, threshold)
+            if results is not None:
+                return results
+
+            embedding = self._stored_embedding(book_id)
+            if embedding is None:
+                return None
+
+            # +1 because the seed book is its own nearest neighbour
+            docs = self._search_by_vector(embedding, k=limit + 1)
+        with self._stage("similar_books", "post_process"):
+            results = [
+                self._format_result(doc, score)
+                for doc, score in docs
+                if score <= threshold and doc.metadata.get("book_id") != book_id
+            ]
+            results.sort(key=lambda x: x["similarity_score"], reverse=True)
+            return results[:limit]
+
+    @leased
     def find_similar_books(
         self, book_title: str, limit: int = 5
     ) -> List[Dict[str, Any]]:
         """Find books similar to a given book"""
         try:
             # First, find the book in our database
-            db = SessionLocal()
-            book = db.query(Book).filter(Book.title.ilike(f"%{book_title}%")).first()
+            book = self._find_book_by_title(book_title)
 
             if not book:
                 return []
 
+            # Reuse the book's stored vector when it is indexed
+            results = self.find_similar_books_by_id(book.id, limit=limit)
+            if results is not None:
+                return results
+
             # Create query from book content
             query = f"{book.title} {book.author} {book.category} {book.description}"
 
@@ -359,21 +678,27 @@ class VectorService:
             )  # +1 to exclude the book itself
 
             # Filter out the book itself
-            results = [book for book in similar_books if book["title"] != book_title]
+            results = [
+                similar for similar in similar_books if similar["book_id"] != book.id
+            ]
 
             return results[:limit]
 
         except Exception as e:
             print(f"Error finding similar books: {e}")
             return []
-        finally:
-            db.close()
 
+    @leased
     def get_category_recommendations(
         self, category: str, limit: int = 10
     ) -> List[Dict[str, Any]]:
         """Get book recommendations by category"""
         try:
+            # Exact category matches come straight from the index
+            results = self.filter_books(category=category, limit=limit)
+            if results:
+                return results
+
             query = f"Kategori: {category}"
             return self.semantic_search(query, limit=limit)
 
@@ -381,9 +706,16 @@ class VectorService:
             print(f"Error getting category recommendations: {e}")
             return []
 
+    @leased
     def get_author_books(self, author: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get books by specific author"""
         try:
+            # Exact author matches come straight from the index; partial
+            # names fall back to semantic search
+            results = self.filter_books(author=author, limit=limit)
+            if results:
+                return results
+
             query = f"Yazar: {author}"
             return self.semantic_search(query, limit=limit)
 
@@ -391,36 +723,110 @@ class VectorService:
             print(f"Error getting author books: {e}")
             return []
 
-    def update_vector_store(self):
-        """Update vector store with new books from database"""
-        try:
-            print("Updating vector store...")
-            self._create_new_vector_store()
-            print("Vector store updated successfully")
-
-        except Exception as e:
-            print(f"Error updating vector store: {e}")
-
     def get_vector_store_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         try:
-            if not self.vector_store:
-                return {"error": "Vector store not initialized"}
-
-            # Get collection info
-            collection = self.vector_store._collection
-            count = collection.count()
-
-            return {
-                "total_books": count,
-                "collection_name": self.collection_name,
-                "persist_directory": self.persist_directory,
-                "embedding_model": "text-embedding-ada-002",
-            }
+            with self.index_manager.lease() as lease:
+                if not lease.store:
+                    return {"error": "Vector store not initialized"}
+
+                # Get collection info
+                if isinstance(lease.store, (NumpyVectorStore, HnswVectorStore)):
+                    count = lease.store.count()
+                else:
+                    count = lease.store._collection.count()
+
+                stats = {
+                    "total_books": count,
+                    "collection_name": self.index_manager.collection_name,
+                    "persist_directory": self.persist_directory,
+                    "index_version": lease.version,
+                    "embedding_model": self.embeddings.model_name,
+                    "embedding_cache": self.embeddings.get_cache_stats(),
+                    "engine": self.vector_store_engine,
+                }
+                if isinstance(lease.store, (NumpyVectorStore, HnswVectorStore)):
+                    stats["memory"] = lease.store.memory_footprint()
+                table = lease.neighbor_table
+                stats["neighbor_table"] = (
+                    {"books": len(table), "size": table.size}
+                    if table is not None
+                    else None
+                )
+                stats["embedding_usage"] = self.embeddings.get_usage_stats()
+                stats["last_build"] = self.index_manager.last_build
+                stats["latency_ms"] = self.get_latency_stats()
+                return stats
 
         except Exception as e:
             return {"error": str(e)}
 
+    def get_latency_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Latency summaries in milliseconds, by operation and stage"""
+        latency: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for series in self.metrics.snapshot()["histograms"]:
+            if series["name"] == "request_seconds":
+                stage = "total"
+            elif series["name"] == "stage_seconds":
+                stage = series["labels"]["stage"]
+            else:
+                continue
+            summary = {"count": series["count"]}
+            for key in ("mean", "p50", "p95", "p99"):
+                value = series[key]
+                summary[key] = round(value * 1000, 3) if value is not None else None
+            latency.setdefault(series["labels"]["operation"], {})[stage] = summary
+        return latency
+
+    def collect_metrics(self) -> None:
+        """Refresh the gauges and totals kept outside the registry"""
+        metrics = self.metrics
+        # Index gauges describe one version: its store and its neighbour table
+        with self.index_manager.lease() as lease:
+            store, table = lease.store, lease.neighbor_table
+            if isinstance(store, (NumpyVectorStore, HnswVectorStore)):
+                metrics.set_gauge("documents", store.count())
+                footprint = store.memory_footprint()
+                metrics.set_gauge("index_bytes", footprint["index_bytes"])
+                metrics.set_gauge("filter_index_bytes", footprint["filter_index_bytes"])
+        metrics.set_gauge(
+            "neighbor_table_bytes",
+            table.neighbors.nbytes + table.scores.nbytes if table is not None else 0,
+        )
+
+        usage = self.embeddings.get_usage_stats()
+        for key in ("calls", "texts", "tokens", "seconds"):
+            metrics.set_counter(f"embedding_provider_{key}_total", usage[key])
+
+        cache = self.embeddings.get_cache_stats()
+        queries = cache["queries"]
+        for name, hits, misses, rate in (
+            ("documents", cache["hits"], cache["misses"], cache["hit_rate"]),
+            (
+                "queries",
+                queries["memory_hits"] + queries["disk_hits"],
+                queries["misses"],
+                queries["hit_rate"],
+            ),
+        ):
+            metrics.set_counter("embedding_cache_hits_total", hits, cache=name)
+            metrics.set_counter("embedding_cache_misses_total", misses, cache=name)
+            metrics.set_gauge("embedding_cache_hit_ratio", rate, cache=name)
+
+        build = self.index_manager.last_build
+        if build is not None:
+            metrics.set_gauge(
+                "last_rebuild_seconds", build["seconds"], kind=build["kind"]
+            )
+            metrics.set_gauge(
+                "last_rebuild_success", int(build["success"]), kind=build["kind"]
+            )
+
+    def render_metrics(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        self.collect_metrics()
+        return self.metrics.render_prometheus()
+
 
 # Global vector service instance - commented out for testing
 # vector_service = VectorService()
@@ -31,6 +31,7 @@ Test Coverage:
    - RAG service integration
    - Vector service integration
    - Open Library service integration
+   - Background warm-up and readiness reporting
 
 5. Error Handling Tests:
    - Invalid input validation
@@ -445,6 +446,141 @@ class TestHealthCheckEndpoint:
         assert "version" in data
 
 
+class TestReadinessEndpoint:
+    """Tests for background service warm-up and /api/ready"""
+
+    @pytest.fixture
+    def main(self, monkeypatch):
+        """Backend module with both services still warming up"""
+        try:
+            from backend import main
+        except ImportError:
+            pytest.skip("backend.main could not be imported")
+
+        monkeypatch.setattr(main, "vector_service", None)
+        monkeypatch.setattr(main, "rag_service", None)
+        for name in ("vector", "rag"):
+            monkeypatch.setitem(
+                main.service_status,
+                name,
+                {
+                    "state": "warming",
+                    "started_at": None,
+                    "ready_at": None,
+                    "error": None,
+                },
+            )
+        return main
+
+    def test_endpoints_answer_503_while_warming(self, main):
+        """Service endpoints and /api/ready ask clients to retry"""
+        client = TestClient(main.app)
+
+        ready = client.get("/api/ready")
+        search = client.get("/api/vector/search", params={"q": "Dune"})
+
+        assert ready.status_code == 503
+        assert ready.json()["ready"] is False
+        assert ready.headers["Retry-After"] == str(main.SERVICE_RETRY_AFTER_SECONDS)
+        assert search.status_code == 503
+        assert "Retry-After" in search.headers
+        assert client.get("/api/health").status_code == 200
+
+    def test_warm_up_marks_services_ready(self, main, monkeypatch):
+        """Warmed-up services are served; failed ones keep the worker unready"""
+        vector = Mock()
+        vector.semantic_search.return_value = []
+        monkeypatch.setattr(main, "_create_vector_service", lambda: vector)
+        monkeypatch.setattr(main, "SERVICE_WARMUP_ATTEMPTS", 2)
+        monkeypatch.setattr(main, "SERVICE_WARMUP_RETRY_DELAY", 0)
+
+        def fail():
+            raise ImportError("langchain is not installed")
+
+        monkeypatch.setattr(main, "_create_rag_service", fail)
+        main.warm_up_services()
+        client = TestClient(main.app)
+
+        response = client.get("/api/ready")
+        ready = response.json()
+        assert response.status_code == 503
+        assert "Retry-After" not in response.headers
+        assert ready["ready"] is False
+        assert ready["failed"] is True
+        assert ready["services"]["vector"]["state"] == "ready"
+        assert ready["services"]["rag"]["state"] == "failed"
+        assert ready["services"]["rag"]["attempts"] == 2
+        assert ready["services"]["rag"]["error"] == "langchain is not installed"
+        assert client.get("/api/vector/search", params={"q": "Dune"}).status_code == 200
+        rag = client.get("/api/rag/search", params={"q": "Dune"})
+        assert rag.status_code == 503
+        assert "Retry-After" not in rag.headers
+
+    def test_failed_warm_up_is_retried(self, main, monkeypatch):
+        """A transient failure is retried until the service comes up"""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise RuntimeError("index build interrupted")
+            return Mock()
+
+        monkeypatch.setattr(main, "SERVICE_WARMUP_RETRY_DELAY", 0)
+        monkeypatch.setattr(main, "_create_vector_service", flaky)
+        monkeypatch.setattr(main, "_create_rag_service", Mock)
+        main.warm_up_services()
+
+        response = TestClient(main.app).get("/api/ready")
+        assert response.status_code == 200
+        assert response.json()["services"]["vector"]["attempts"] == 2
+        assert response.json()["services"]["vector"]["error"] is None
+
+
+class TestVectorBatchSearchEndpoint:
+    """Tests for the batched semantic search endpoint"""
+
+    @pytest.fixture
+    def main(self, monkeypatch):
+        """Backend module with a stub vector service"""
+        try:
+            from backend import main
+        except ImportError:
+            pytest.skip("backend.main could not be imported")
+
+        vector = Mock()
+        vector.semantic_search_many.side_effect = lambda queries, **kwargs: [
+            [] for _ in queries
+        ]
+        monkeypatch.setattr(main, "vector_service", vector)
+        return main
+
+    def test_limit_is_clamped(self, main):
+        """Oversized and non-positive limits are clamped to the allowed range"""
+        client = TestClient(main.app)
+
+        for limit, expected in [(10_000, main.VECTOR_SEARCH_MAX_RESULTS), (0, 1)]:
+            response = client.post(
+                "/api/vector/search/batch", json={"queries": ["Dune"], "limit": limit}
+            )
+            assert response.status_code == 200
+            kwargs = main.vector_service.semantic_search_many.call_args.kwargs
+            assert kwargs["limit"] == expected
+
+    def test_too_many_queries_are_rejected(self, main):
+        """A batch larger than VECTOR_BATCH_MAX_QUERIES never reaches the index"""
+        client = TestClient(main.app)
+        queries = ["Dune"] * (main.VECTOR_BATCH_MAX_QUERIES + 1)
+
+        response = client.post("/api/vector/search/batch", json={"queries": queries})
+
+        assert response.status_code == 422
+        main.vector_service.semantic_search_many.assert_not_called()
+        full = client.post("/api/vector/search/batch", json={"queries": queries[1:]})
+        assert full.status_code == 200
+        assert full.json()["count"] == main.VECTOR_BATCH_MAX_QUERIES
+
+
 class TestErrorHandling:
     """Tests for error handling scenarios"""
 
@@ -0,0 +1,524 @@
+"""
+Database Layer Tests for Luminis.AI Library Assistant
+====================================================
+
+This test file covers the query helpers defined in the database module.
+Each test runs against a fresh in-memory SQLite database so that no state
+leaks between tests or into the development database file.
+
+Test Coverage:
+1. Chat History:
+   - Keyset pagination on (timestamp, id)
+   - Tie-breaking on identical timestamps
+   - Full history streaming
+
+2. Reading Statistics:
+   - Incremental maintenance on UserBook insert, update and delete
+   - Full rebuild matching the incremental result
+
+3. Book Cache:
+   - Read-through lookups by id, title and ISBN
+   - Invalidation on Book insert and update
+
+4. Full-text Search:
+   - FTS5 index kept in sync by triggers
+   - Turkish diacritic folding and bm25 ranking
+
+5. Import Side Effects:
+   - No engine, output or files created at import time
+   - Import-time budget guarding cold starts
+
+Dependencies:
+- pytest
+- sqlalchemy
+"""
+
+import pytest
+import sys
+import os
+import json
+import subprocess
+from datetime import datetime, timedelta
+
+# Add src directory to path for imports
+src_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import database as db_module
+from database.book_cache import BookCache
+
+
+@pytest.fixture
+def engine():
+    """Create an isolated in-memory database"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    db_module.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """Create a session on the isolated database"""
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    """Create a user that owns test data"""
+    user = db_module.User(username="reader", email="reader@example.com")
+    db.add(user)
+    db.commit()
+    return user
+
+
+class TestChatHistoryPagination:
+    """Tests for keyset-paginated chat history"""
+
+    def _add_messages(self, db, user_id, count, same_timestamp=False):
+        start = datetime(2024, 1, 1)
+        for i in range(count):
+            timestamp = start if same_timestamp else start + timedelta(minutes=i)
+            db.add(
+                db_module.ChatHistory(
+                    user_id=user_id,
+                    message=f"message {i}",
+                    response=f"response {i}",
+                    timestamp=timestamp,
+                )
+            )
+        db.commit()
+
+    def test_pages_are_newest_first_and_complete(self, db, user):
+        """Walking all pages yields every message exactly once, newest first"""
+        self._add_messages(db, user.id, 25)
+
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = db_module.get_chat_history_page(
+                db, user.id, limit=10, before=cursor
+            )
+            seen.extend(row.message for row in rows)
+            if cursor is None:
+                break
+
+        assert seen == [f"message {i}" for i in reversed(range(25))]
+
+    def test_identical_timestamps_use_id_tiebreak(self, db, user):
+        """Rows sharing a timestamp are neither skipped nor repeated"""
+        self._add_messages(db, user.id, 7, same_timestamp=True)
+
+        first, cursor = db_module.get_chat_history_page(db, user.id, limit=4)
+        second, last_cursor = db_module.get_chat_history_page(
+            db, user.id, limit=4, before=cursor
+        )
+
+        ids = [row.id for row in first + second]
+        assert len(ids) == 7
+        assert len(set(ids)) == 7
+        assert last_cursor is None
+
+    def test_history_is_scoped_to_user(self, db, user):
+        """Another user's messages never appear in the page"""
+        other = db_module.User(username="other", email="other@example.com")
+        db.add(other)
+        db.commit()
+        self._add_messages(db, user.id, 3)
+        self._add_messages(db, other.id, 3)
+
+        rows, _ = db_module.get_chat_history_page(db, user.id, limit=10)
+
+        assert len(rows) == 3
+        assert all(row.user_id == user.id for row in rows)
+
+    def test_iter_chat_history_streams_chronologically(self, db, user):
+        """Streaming export returns the full history in batches, oldest first"""
+        self._add_messages(db, user.id, 12)
+
+        messages = [
+            row.message
+            for row in db_module.iter_chat_history(db, user.id, batch_size=5)
+        ]
+
+        assert messages == [f"message {i}" for i in range(12)]
+
+    def test_legacy_null_timestamps_are_backfilled(self):
+        """Rows without a timestamp from an older schema stay reachable"""
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        with engine.begin() as connection:
+            # The column allowed NULL before timestamps were required
+            connection.exec_driver_sql(
+                "CREATE TABLE chat_history (id INTEGER PRIMARY KEY, "
+                "user_id INTEGER, message TEXT, response TEXT, timestamp DATETIME)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO chat_history (user_id, message, timestamp) VALUES "
+                "(1, 'old', NULL), (1, 'new', '2024-01-01 00:00:00.000000'), "
+                "(1, 'newer', '2024-01-02 00:00:00.000000')"
+            )
+        db_module.Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            assert db_module.ensure_chat_history_timestamps(connection) == 1
+
+        session = sessionmaker(bind=engine)()
+        seen, cursor = [], None
+        while True:
+            rows, cursor = db_module.get_chat_history_page(
+                session, 1, limit=1, before=cursor
+            )
+            seen.extend(row.message for row in rows)
+            if cursor is None:
+                break
+        session.close()
+        engine.dispose()
+
+        assert seen == ["newer", "new", "old"]
+
+
+class TestReadingStats:
+    """Tests for the incrementally maintained user_reading_stats table"""
+
+    @pytest.fixture
+    def books(self, db):
+        books = [
+            db_module.Book(
+                title="Dune", author="Frank Herbert", category="Bilim Kurgu", year=1965
+            ),
+            db_module.Book(
+                title="1984", author="George Orwell", category="Distopya", year=1949
+            ),
+            db_module.Book(
+                title="Hayvan Çiftliği",
+                author="George Orwell",
+                category="Distopya",
+                year=1945,
+            ),
+        ]
+        db.add_all(books)
+        db.commit()
+        return books
+
+    def _stats(self, db, user_id):
+        db.expire_all()
+        return db_module.get_reading_stats(db, user_id)
+
+    def test_insert_updates_all_dimensions(self, db, user, books):
+        """Adding books increments status, genre, author and decade counts"""
+        for book in books:
+            db.add(
+                db_module.UserBook(
+                    user_id=user.id,
+                    book_id=book.id,
+                    status=db_module.BookStatus.COMPLETED,
+                )
+            )
+        db.commit()
+
+        stats = self._stats(db, user.id)
+        assert stats["total_books"] == 3
+        assert stats["status_counts"] == {"completed": 3}
+        assert stats["genre_counts"] == {"Bilim Kurgu": 1, "Distopya": 2}
+        assert stats["author_counts"] == {"Frank Herbert": 1, "George Orwell": 2}
+        assert stats["decade_counts"] == {"1960": 1, "1940": 2}
+
+    def test_status_update_moves_count(self, db, user, books):
+        """Changing a status moves one count between status buckets"""
+        entry = db_module.UserBook(
+            user_id=user.id, book_id=books[0].id, status=db_module.BookStatus.READING
+        )
+        db.add(entry)
+        db.commit()
+
+        entry.status = db_module.BookStatus.COMPLETED
+        db.commit()
+
+        stats = self._stats(db, user.id)
+        assert stats["total_books"] == 1
+        assert stats["status_counts"] == {"completed": 1}
+
+    def test_delete_decrements_and_drops_empty_keys(self, db, user, books):
+        """Removing a book decrements counts and removes zeroed keys"""
+        entries = [
+            db_module.UserBook(user_id=user.id, book_id=book.id) for book in books[:2]
+        ]
+        db.add_all(entries)
+        db.commit()
+
+        db.delete(entries[0])
+        db.commit()
+
+        stats = self._stats(db, user.id)
+        assert stats["total_books"] == 1
+        assert "Frank Herbert" not in stats["author_counts"]
+        assert stats["status_counts"] == {"wishlist": 1}
+
+    def test_rebuild_matches_incremental(self, db, user, books):
+        """A full rebuild produces the same row as incremental maintenance"""
+        for book in books:
+            db.add(db_module.UserBook(user_id=user.id, book_id=book.id))
+        db.commit()
+        incremental = self._stats(db, user.id)
+
+        assert db_module.rebuild_reading_stats(db) == 1
+        rebuilt = self._stats(db, user.id)
+
+        for key in ("total_books", "status_counts", "genre_counts", "author_counts"):
+            assert rebuilt[key] == incremental[key]
+
+    def test_missing_stats_row_is_empty(self, db, user):
+        """Users without books get an empty statistics payload"""
+        stats = db_module.get_reading_stats(db, user.id)
+        assert stats["total_books"] == 0
+        assert stats["genre_counts"] == {}
+
+
+class TestBookCache:
+    """Tests for the read-through Book lookup cache"""
+
+    @pytest.fixture
+    def cache(self, engine):
+        return BookCache(session_factory=sessionmaker(bind=engine), maxsize=2)
+
+    @pytest.fixture
+    def book(self, db):
+        book = db_module.Book(
+            title="Dune", author="Frank Herbert", isbn="9780441013593"
+        )
+        db.add(book)
+        db.commit()
+        return book
+
+    def test_repeated_lookups_hit_cache(self, cache, book):
+        """Only the first lookup of a key reaches the database"""
+        first = cache.get_by_title("dune")
+        second = cache.get_by_title("Dune ")
+
+        assert first is second
+        assert first.author == "Frank Herbert"
+        assert cache.get_stats()["misses"] == 1
+        assert cache.get_stats()["hits"] == 1
+        # Title lookups also warm the id map
+        assert cache.get_by_id(book.id) is first
+
+    def test_lookup_by_isbn(self, cache, book):
+        """ISBN lookups return the matching snapshot"""
+        assert cache.get_by_isbn("9780441013593").id == book.id
+        assert cache.get_by_isbn("missing") is None
+
+    def test_insert_invalidates_negative_entries(self, cache, db):
+        """A cached miss is dropped once a matching book is inserted"""
+        assert cache.get_by_title("Hobbit") is None
+
+        db.add(db_module.Book(title="Hobbit", author="J.R.R. Tolkien"))
+        db.commit()
+
+        assert cache.get_by_title("Hobbit").author == "J.R.R. Tolkien"
+
+    def test_update_invalidates_entries(self, cache, db, book):
+        """Updated rows are reloaded on the next lookup"""
+        assert cache.get_by_id(book.id).rating == 0.0
+
+        book.rating = 4.6
+        db.commit()
+
+        assert cache.get_by_id(book.id).rating == 4.6
+
+    def test_writes_invalidate_on_commit(self, cache, db, book):
+        """Entries are dropped when the write commits, not when it flushes"""
+        cache.get_by_id(book.id)
+        book.rating = 4.6
+        db.flush()
+        # Until commit other sessions may still read, and cache, the old row
+        assert cache.get_stats()["entries_by_id"] == 1
+
+        db.commit()
+
+        assert cache.get_stats()["entries_by_id"] == 0
+        assert cache.get_by_id(book.id).rating == 4.6
+
+    def test_lookup_racing_an_invalidation_is_not_cached(self, cache, book):
+        """A value loaded while an invalidation ran is returned, not kept"""
+
+        def load_then_invalidate(db):
+            loaded = db.get(db_module.Book, book.id)
+            cache.invalidate(book.id)
+            return loaded
+
+        cache._read_through(cache._by_id, book.id, load_then_invalidate)
+
+        assert cache.get_stats()["entries_by_id"] == 0
+
+    def test_entries_expire_and_large_catalogs_are_not_snapshotted(
+        self, engine, db, book, monkeypatch
+    ):
+        """The TTL reloads entries and catalog_limit bounds list_books"""
+        cache = BookCache(
+            session_factory=sessionmaker(bind=engine), ttl=60, catalog_limit=0
+        )
+        clock = [1000.0]
+        module = sys.modules[BookCache.__module__]
+        monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+
+        cache.get_by_id(book.id)
+        cache.get_by_id(book.id)
+        clock[0] += 61
+        cache.get_by_id(book.id)
+        cache.list_books()
+        cache.list_books()
+
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 4
+
+    def test_size_limit_evicts_least_recently_used(self, cache, db):
+        """Each lookup map is bounded by maxsize"""
+        for title in ("A", "B", "C"):
+            cache.get_by_title(title)
+
+        assert cache.get_stats()["entries_by_title"] == 2
+
+
+class TestBookFullTextSearch:
+    """Tests for the FTS5-backed ranked book search"""
+
+    @pytest.fixture
+    def catalog(self, db):
+        books = [
+            db_module.Book(
+                title="Suç ve Ceza",
+                author="Fyodor Dostoyevski",
+                category="Roman",
+                description="Psikolojik gerilim ve ahlaki sorgulama",
+            ),
+            db_module.Book(
+                title="Çalıkuşu",
+                author="Reşat Nuri Güntekin",
+                category="Roman",
+                description="Cumhuriyet dönemi Türk kadınının özgürlük mücadelesi",
+            ),
+            db_module.Book(
+                title="Dune",
+                author="Frank Herbert",
+                category="Bilim Kurgu",
+                description="Çöl gezegeninde geçen epik roman",
+            ),
+        ]
+        db.add_all(books)
+        db.commit()
+        return books
+
+    def _titles(self, db, query):
+        return [book.title for book, _ in db_module.search_books_fulltext(db, query)]
+
+    def test_diacritics_and_dotless_i_are_folded(self, db, catalog):
+        """ASCII queries match Turkish titles"""
+        assert self._titles(db, "suc ceza") == ["Suç ve Ceza"]
+        assert self._titles(db, "CALIKUSU") == ["Çalıkuşu"]
+
+    def test_title_hits_rank_above_description_hits(self, db, catalog):
+        """bm25 column weights favour title and category over description"""
+        titles = self._titles(db, "roman")
+        assert set(titles) == {"Suç ve Ceza", "Çalıkuşu", "Dune"}
+        assert titles[-1] == "Dune"
+
+    def test_prefix_queries_match(self, db, catalog):
+        """The last characters typed may be an incomplete word"""
+        assert self._titles(db, "dostoy") == ["Suç ve Ceza"]
+
+    def test_triggers_follow_updates_and_deletes(self, db, catalog):
+        """The index mirrors the books table after writes"""
+        catalog[2].title = "Dune Mesihi"
+        db.commit()
+        assert self._titles(db, "mesihi") == ["Dune Mesihi"]
+
+        db.delete(catalog[2])
+        db.commit()
+        assert self._titles(db, "herbert") == []
+
+    def test_existing_rows_are_backfilled(self, engine, db, catalog):
+        """Rebuilding the index picks up rows written before it existed"""
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM books_fts")
+            db_module.ensure_books_search_index(connection)
+
+        assert self._titles(db, "herbert") == ["Dune"]
+
+    def test_non_positive_limit_returns_nothing(self, db, catalog):
+        """LIMIT -1 would return every match, so it is never sent"""
+        assert db_module.search_books_fulltext(db, "herbert", limit=-1) == []
+        assert db_module.search_books_fulltext(db, "herbert", limit=0) == []
+
+    def test_empty_query_returns_nothing(self, db, catalog):
+        """Queries without word characters do not reach FTS5"""
+        assert db_module.search_books_fulltext(db, "  ?! ") == []
+
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import database
+elapsed = time.perf_counter() - start
+from database import database as module
+sys.stderr.write(json.dumps({"seconds": elapsed, "engine": module._engine is not None}))
+"""
+
+
+class TestImportSideEffects:
+    """Importing the database package must stay cheap and free of I/O"""
+
+    # Generous budget for slow CI machines; dominated by importing SQLAlchemy
+    IMPORT_TIME_BUDGET = float(os.getenv("DATABASE_IMPORT_BUDGET", "2.0"))
+
+    def _import_in_subprocess(self, tmp_path):
+        env = dict(os.environ, PYTHONPATH=src_path)
+        env.pop("DATABASE_URL", None)
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=tmp_path,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        return result.stdout, json.loads(result.stderr.strip().splitlines()[-1])
+
+    def test_import_has_no_side_effects(self, tmp_path):
+        """No engine, no printed output and no database file after import"""
+        stdout, probe = self._import_in_subprocess(tmp_path)
+
+        assert stdout == ""
+        assert probe["engine"] is False
+        assert list(tmp_path.iterdir()) == []
+
+    def test_import_time_within_budget(self, tmp_path):
+        """Cold import of the database package stays within the budget"""
+        _, probe = self._import_in_subprocess(tmp_path)
+
+        assert probe["seconds"] < self.IMPORT_TIME_BUDGET
+
+    def test_engine_is_created_on_first_use(self):
+        """The engine is built lazily and then reused"""
+        assert db_module.get_engine() is db_module.get_engine()
+        assert db_module.engine is db_module.get_engine()
@@ -0,0 +1,375 @@
+"""
+Embedding Service Tests for Luminis.AI Library Assistant
+=======================================================
+
+This test file covers the embedding layer that sits in front of the embedding
+provider. A counting fake provider stands in for OpenAI so the tests can assert
+exactly which texts reach the network.
+
+Test Coverage:
+1. Embedding Cache:
+   - Content hashing by model and text
+   - Persistence across cache instances
+   - Only changed or new documents are embedded
+   - Query embeddings cached in memory and on disk by normalized text
+2. Embedding Pipeline:
+   - Batching and bounded concurrency
+   - Exponential backoff on rate limits
+   - Resuming an interrupted build from the cache checkpoint
+3. Local Backend:
+   - Deterministic, normalized hashed n-gram vectors
+   - Related texts score higher than unrelated ones
+   - Backend selection through configuration
+
+Dependencies:
+- pytest
+- numpy
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add src directory to path for imports
+src_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+np = pytest.importorskip("numpy")
+
+from services.embedding_service import (
+    CachedEmbeddings,
+    EmbeddingBackend,
+    EmbeddingCache,
+    EmbeddingPipeline,
+    EmbeddingPipelineError,
+    HashingEmbeddings,
+    content_hash,
+    create_embeddings,
+)
+
+
+class CountingEmbeddings:
+    """Deterministic fake provider that records every text it embeds"""
+
+    def __init__(self, dimension=8):
+        self.dimension = dimension
+        self.calls = []
+
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2**32))
+        return rng.standard_normal(self.dimension).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return self._vector(text)
+
+    @property
+    def embedded_texts(self):
+        return [text for call in self.calls for text in call]
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+class TestEmbeddingCache:
+    """Tests for the persistent document embedding cache"""
+
+    def test_hash_depends_on_model_and_text(self):
+        """The same text under another model gets a different key"""
+        assert content_hash("Dune", "model-a") != content_hash("Dune", "model-b")
+        assert content_hash("Dune", "model-a") != content_hash("Dune!", "model-a")
+        assert content_hash("Dune", "model-a") == content_hash("Dune", "model-a")
+
+    def test_rebuild_only_embeds_changes(self, cache_path):
+        """A second build embeds only new or edited documents"""
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+
+        first = embeddings.embed_documents(["Dune", "1984", "Hobbit"])
+        second = embeddings.embed_documents(
+            ["Dune", "1984 (revised)", "Hobbit", "Martı"]
+        )
+
+        assert provider.embedded_texts == [
+            "Dune",
+            "1984",
+            "Hobbit",
+            "1984 (revised)",
+            "Martı",
+        ]
+        assert second[0] == first[0]
+        assert embeddings.get_cache_stats()["hits"] == 2
+
+    def test_cache_survives_restart(self, cache_path):
+        """Vectors written by one process are reused by the next"""
+        CachedEmbeddings(
+            CountingEmbeddings(), "fake", EmbeddingCache(cache_path)
+        ).embed_documents(["Dune"])
+
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+        embeddings.embed_documents(["Dune"])
+
+        assert provider.calls == []
+
+    def test_repeated_queries_skip_the_provider(self, cache_path):
+        """Equivalent queries are embedded once and counted as hits"""
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+
+        first = embeddings.embed_query("Kategori: Roman")
+        second = embeddings.embed_query("  kategori:   ROMAN ")
+
+        assert provider.calls == [["kategori: roman"]]
+        assert second == first
+        stats = embeddings.get_cache_stats()["queries"]
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_query_cache_survives_restart(self, cache_path):
+        """Query vectors are reloaded from disk after a restart"""
+        CachedEmbeddings(
+            CountingEmbeddings(), "fake", EmbeddingCache(cache_path)
+        ).embed_query("Yazar: Orhan Pamuk")
+
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+        embeddings.embed_query("Yazar: Orhan Pamuk")
+
+        assert provider.calls == []
+        assert embeddings.get_cache_stats()["queries"]["disk_hits"] == 1
+
+    def test_query_cache_is_bounded(self, cache_path):
+        """The in-memory LRU evicts the least recently used queries"""
+        embeddings = CachedEmbeddings(
+            CountingEmbeddings(), "fake", EmbeddingCache(cache_path), query_cache_size=2
+        )
+        for query in ["Roman", "Tarih", "Roman", "Felsefe"]:
+            embeddings.embed_query(query)
+
+        assert embeddings.get_cache_stats()["queries"]["entries"] == 2
+        embeddings.embed_query("Tarih")
+        assert embeddings.get_cache_stats()["queries"]["disk_hits"] == 1
+
+    def test_query_batch_is_one_request(self, cache_path):
+        """Uncached queries of a batch are embedded together, once each"""
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+        cached = embeddings.embed_query("Roman")
+
+        vectors = embeddings.embed_queries(["Tarih", "ROMAN", "Felsefe", "tarih"])
+
+        assert provider.calls == [["roman"], ["tarih", "felsefe"]]
+        assert vectors[1] == cached
+        assert vectors[0] == vectors[3]
+        assert vectors[2] == embeddings.embed_query("Felsefe")
+
+    def test_duplicate_texts_are_embedded_once(self, cache_path):
+        """Identical documents in one batch share a single embedding call"""
+        provider = CountingEmbeddings()
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+
+        vectors = embeddings.embed_documents(["Dune", "Dune"])
+
+        assert provider.embedded_texts == ["Dune"]
+        assert vectors[0] == vectors[1]
+
+
+class RateLimitError(Exception):
+    """Stand-in for the provider's rate limit exception"""
+
+
+class FlakyEmbeddings(CountingEmbeddings):
+    """Fake provider that rate-limits the first calls and can fail on a text"""
+
+    def __init__(self, rate_limited_calls=0, fail_on=None):
+        super().__init__()
+        self.rate_limited_calls = rate_limited_calls
+        self.fail_on = fail_on
+        self.attempts = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.attempts += 1
+            attempt = self.attempts
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.01)
+            if attempt <= self.rate_limited_calls:
+                raise RateLimitError("429 Too Many Requests")
+            if self.fail_on is not None and self.fail_on in texts:
+                raise RuntimeError("provider unavailable")
+            return super().embed_documents(texts)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class TestEmbeddingPipeline:
+    """Tests for the batched, concurrent embedding pipeline"""
+
+    def _pipeline(self, provider, cache_path, **kwargs):
+        embeddings = CachedEmbeddings(provider, "fake", EmbeddingCache(cache_path))
+        kwargs.setdefault("sleep", lambda seconds: None)
+        return EmbeddingPipeline(embeddings, **kwargs)
+
+    def test_batches_with_bounded_concurrency(self, cache_path):
+        """Documents are sent in batches with at most max_concurrency in flight"""
+        provider = FlakyEmbeddings()
+        pipeline = self._pipeline(provider, cache_path, batch_size=3, max_concurrency=2)
+        texts = [f"book {i}" for i in range(10)]
+
+        vectors = pipeline.run(texts)
+
+        assert len(vectors) == 10
+        assert sorted(len(call) for call in provider.calls) == [1, 3, 3, 3]
+        assert provider.max_active <= 2
+        assert pipeline.progress["embedded"] == 10
+
+    def test_counters_are_exact_under_concurrency(self, cache_path):
+        """Retries, progress and cache counters add up across workers"""
+        provider = FlakyEmbeddings(rate_limited_calls=12)
+        pipeline = self._pipeline(provider, cache_path, batch_size=1, max_concurrency=8)
+        texts = [f"book {i}" for i in range(24)]
+
+        pipeline.run(texts)
+
+        progress = pipeline.get_progress()
+        assert progress["retries"] == 12
+        assert progress["embedded"] == 24
+        assert provider.attempts == 36
+        cache = pipeline.embeddings.get_cache_stats()
+        # Every attempt looks the batch up; the final pass is all hits
+        assert (cache["hits"], cache["misses"]) == (24, 36)
+        # Rate-limited requests reached the provider too
+        assert pipeline.embeddings.get_usage_stats()["calls"] == 36
+
+    def test_rate_limits_are_retried_with_backoff(self, cache_path):
+        """Rate-limited batches back off exponentially and then succeed"""
+        delays = []
+        provider = FlakyEmbeddings(rate_limited_calls=3)
+        pipeline = self._pipeline(
+            provider,
+            cache_path,
+            batch_size=10,
+            max_concurrency=1,
+            base_delay=1.0,
+            sleep=delays.append,
+        )
+
+        pipeline.run(["Dune", "1984"])
+
+        assert pipeline.progress["retries"] == 3
+        assert len(delays) == 3
+        # Jitter keeps each delay within [0.5, 1] of its exponential step
+        for attempt, delay in enumerate(delays):
+            assert 0.5 * 2**attempt <= delay <= 2**attempt
+
+    def test_gives_up_after_max_retries(self, cache_path):
+        """A batch that stays rate limited fails the run"""
+        provider = FlakyEmbeddings(rate_limited_calls=100)
+        pipeline = self._pipeline(provider, cache_path, max_retries=2)
+
+        with pytest.raises(EmbeddingPipelineError):
+            pipeline.run(["Dune"])
+        assert provider.attempts == 3
+
+    def test_interrupted_build_resumes_from_checkpoint(self, cache_path):
+        """A rerun only embeds the batches that failed the first time"""
+        texts = [f"book {i}" for i in range(9)]
+        broken = FlakyEmbeddings(fail_on="book 4")
+        pipeline = self._pipeline(broken, cache_path, batch_size=3, max_concurrency=1)
+
+        with pytest.raises(EmbeddingPipelineError):
+            pipeline.run(texts)
+        assert pipeline.progress["embedded"] == 6
+
+        healthy = CountingEmbeddings()
+        resumed = self._pipeline(healthy, cache_path, batch_size=3)
+        vectors = resumed.run(texts)
+
+        assert healthy.embedded_texts == ["book 3", "book 4", "book 5"]
+        assert resumed.progress["cached"] == 6
+        assert len(vectors) == 9
+
+
+class TestHashingEmbeddings:
+    """Tests for the offline hashed n-gram embedding backend"""
+
+    def test_vectors_are_deterministic_and_normalized(self):
+        """The same text always maps to the same unit-length vector"""
+        first = HashingEmbeddings(dimension=64).embed_query("Suç ve Ceza")
+        second = HashingEmbeddings(dimension=64).embed_query("Suç ve Ceza")
+
+        assert first == second
+        assert len(first) == 64
+        assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-5)
+
+    def test_incomplete_backend_fails_at_construction(self):
+        """A backend missing a method cannot be instantiated"""
+
+        class DocumentsOnly(EmbeddingBackend):
+            def embed_documents(self, texts):
+                return [[1.0] for _ in texts]
+
+        with pytest.raises(TypeError):
+            DocumentsOnly()
+
+    def test_related_texts_are_closer(self):
+        """Overlapping vocabulary yields higher cosine similarity"""
+        embeddings = HashingEmbeddings()
+        dune, desert, prince = np.array(
+            embeddings.embed_documents(
+                [
+                    "Dune: çöl gezegeninde geçen bilim kurgu romanı",
+                    "Çöl gezegeni Arrakis üzerine bilim kurgu",
+                    "Küçük Prens, çocuklar için felsefi bir masal",
+                ]
+            )
+        )
+
+        assert dune @ desert > dune @ prince
+
+    def test_case_and_diacritics_are_folded(self):
+        """Turkish spelling variants share the same features"""
+        embeddings = HashingEmbeddings()
+
+        assert embeddings.embed_query("SUÇ VE CEZA") == embeddings.embed_query(
+            "suc ve ceza"
+        )
+
+    def test_empty_text_gives_zero_vector(self):
+        """Texts without features do not produce NaNs"""
+        assert HashingEmbeddings(dimension=8).embed_query("") == [0.0] * 8
+
+    def test_backend_selected_by_config(self, cache_path, monkeypatch):
+        """EMBEDDING_BACKEND picks the backend and its cache namespace"""
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("EMBEDDING_DIMENSIONS", "32")
+
+        embeddings = create_embeddings(cache=EmbeddingCache(cache_path))
+
+        assert isinstance(embeddings.base_embeddings, HashingEmbeddings)
+        assert embeddings.model_name == "local-hashing-v1-32"
+        assert len(embeddings.embed_documents(["Dune"])[0]) == 32
+
+    def test_unknown_backend_is_rejected(self, cache_path):
+        """A typo in the backend name fails loudly"""
+        with pytest.raises(ValueError):
+            create_embeddings("hashing", cache=EmbeddingCache(cache_path))
@@ -0,0 +1,1469 @@
+"""
+Vector Index Tests for Luminis.AI Library Assistant
+==================================================
+
+This test file covers the NumPy vector store engine and VectorService running
+on top of it. The local hashing embedding backend is used throughout, so the
+tests need neither an API key nor ChromaDB.
+
+Test Coverage:
+1. NumPy Vector Store:
+   - Exact top-k ordering and Chroma-compatible distances
+   - Upserts and deletes by id
+   - Persistence and memory-mapped reloading
+   - Memory-mapped ids, texts and metadata, and older documents.json stores
+   - Chroma-style metadata filters
+2. HNSW Vector Store (skipped without hnswlib):
+   - Recall against exact search
+   - Upserts, deletes and slot reuse
+   - Saving and loading the graph
+3. VectorService with the NumPy engine:
+   - Building, searching and incremental updates
+   - Incremental inserts of synced Open Library books
+   - Structured filters without embedding calls
+   - Similar books from stored vectors, excluding the seed by id
+   - Batched multi-query search
+   - Hybrid BM25 + vector search with reciprocal rank fusion
+   - One shared index manager per process
+   - Worker processes following versions published by another one
+   - Latency histograms, embedding usage and the Prometheus export
+4. Lexical Index:
+   - BM25 ranking with folded tokens
+   - Reciprocal rank fusion
+5. Attribute Index:
+   - Bitset filters equal to a full metadata scan, including range boundaries
+   - Persistence with the store and invalidation on writes
+6. Metrics Registry:
+   - Histogram quantiles and the Prometheus text format
+
+Dependencies:
+- pytest
+- numpy
+"""
+
+import pytest
+import sys
+import os
+import json
+import time
+from types import SimpleNamespace
+
+# Add src directory to path for imports
+src_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+if src_path not in sys.path:
+    sys.path.insert(0, src_path)
+
+np = pytest.importorskip("numpy")
+
+from services.attribute_index import ATTRIBUTES_FILE, AttributeIndex
+from services.diversity import max_marginal_relevance
+from services.index_manager import IndexManager
+from services.neighbor_table import NeighborTable
+from services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from services.metrics import Histogram, MetricsRegistry
+from services.vector_index import (
+    Document,
+    HnswVectorStore,
+    NumpyVectorStore,
+    build_metadata_filter,
+    hnswlib,
+    matches_where,
+)
+
+
+class ArrayEmbeddings:
+    """Fake provider mapping texts to fixed vectors"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.fixture
+def random_store(tmp_path):
+    rng = np.random.default_rng(7)
+    vectors = {f"book {i}": rng.standard_normal(16).tolist() for i in range(200)}
+    vectors["query"] = rng.standard_normal(16).tolist()
+    store = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+    texts = [f"book {i}" for i in range(200)]
+    store.add_documents(
+        [
+            Document(page_content=text, metadata={"n": i})
+            for i, text in enumerate(texts)
+        ],
+        ids=[f"id-{i}" for i in range(200)],
+    )
+    return store, vectors
+
+
+def brute_force(vectors, query, k):
+    names = [name for name in vectors if name != "query"]
+    matrix = np.array([vectors[name] for name in names])
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    q = np.array(query) / np.linalg.norm(query)
+    scores = matrix @ q
+    order = np.argsort(-scores)[:k]
+    return [names[i] for i in order], scores[order]
+
+
+class TestNumpyVectorStore:
+    """Tests for the exact NumPy vector store"""
+
+    def test_top_k_matches_brute_force(self, random_store):
+        """argpartition top-k returns the exact nearest documents in order"""
+        store, vectors = random_store
+
+        results = store.similarity_search_with_score("query", k=10)
+        expected, similarities = brute_force(vectors, vectors["query"], 10)
+
+        assert [doc.page_content for doc, _ in results] == expected
+        # Squared L2 between unit vectors, like Chroma's default space
+        distances = [score for _, score in results]
+        assert distances == pytest.approx(list(2 - 2 * similarities), abs=1e-5)
+
+    def test_upsert_replaces_by_id(self, random_store):
+        """Adding an existing id updates it instead of duplicating it"""
+        store, vectors = random_store
+        store.add_documents(
+            [Document(page_content="query", metadata={"n": -1})], ids=["id-5"]
+        )
+
+        top_doc, distance = store.similarity_search_with_score("query", k=1)[0]
+
+        assert store.count() == 200
+        assert top_doc.metadata == {"n": -1}
+        assert distance == pytest.approx(0.0, abs=1e-5)
+
+    def test_delete_keeps_storage_contiguous(self, random_store):
+        """Deleted documents disappear and the rest stay searchable"""
+        store, _ = random_store
+        store.delete(ids=["id-0", "id-199", "id-50", "missing"])
+
+        stored = store.get(include=["metadatas"])
+        assert store.count() == 197
+        assert {"id-0", "id-199", "id-50"}.isdisjoint(stored["ids"])
+        # Each remaining id still points at its own document
+        for doc_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            assert doc_id == f"id-{metadata['n']}"
+
+    def test_persist_and_memory_mapped_reload(self, random_store, tmp_path):
+        """A persisted store reloads from a memory map with identical results"""
+        store, vectors = random_store
+        store.persist()
+        before = store.similarity_search_with_score("query", k=5)
+
+        reloaded = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+        after = reloaded.similarity_search_with_score("query", k=5)
+
+        assert isinstance(reloaded._vectors, np.memmap)
+        assert [d.page_content for d, _ in after] == [d.page_content for d, _ in before]
+        assert NumpyVectorStore.exists(str(tmp_path), "books")
+
+        # Writing after a reload copies the map instead of modifying the file
+        reloaded.delete(ids=["id-1"])
+        assert reloaded.count() == 199
+        assert NumpyVectorStore(str(tmp_path), None, "books").count() == 200
+
+    def test_documents_are_memory_mapped(self, random_store, tmp_path):
+        """Ids, texts and metadata reload as shared maps until the first write"""
+        store, vectors = random_store
+        store.persist()
+
+        reloaded = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+        stored = reloaded.get(ids=["id-7", "id-missing"])
+
+        assert reloaded._documents is not None
+        assert isinstance(reloaded._documents._records, np.memmap)
+        assert stored["ids"] == ["id-7"]
+        assert stored["documents"] == ["book 7"]
+        assert stored["metadatas"] == [{"n": 7}]
+        assert len(reloaded.get(where={"n": {"$gte": 190}})["ids"]) == 10
+        assert reloaded.similarity_search("book 42", k=1)[0].page_content == "book 42"
+
+        reloaded.add_documents(
+            [Document(page_content="query", metadata={"n": -1})], ids=["id-q"]
+        )
+        assert reloaded._documents is None
+        assert reloaded.count() == 201
+        assert NumpyVectorStore(str(tmp_path), None, "books").count() == 200
+
+        # Persisting the written store maps it again on the next load
+        reloaded.persist()
+        again = NumpyVectorStore(str(tmp_path), None, "books")
+        assert again._documents is not None
+        assert again.get(ids=["id-q"])["metadatas"] == [{"n": -1}]
+
+    def test_documents_json_stores_still_load(self, random_store, tmp_path):
+        """Stores persisted before memory-mapped documents open unchanged"""
+        from services import mapped_documents
+
+        store, vectors = random_store
+        store.persist()
+        directory = tmp_path / "books"
+        stored = store.get(include=["documents", "metadatas"])
+        for name in mapped_documents.MAPPED_FILES:
+            os.remove(directory / name)
+        with open(directory / "documents.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": stored["ids"],
+                    "documents": stored["documents"],
+                    "metadatas": stored["metadatas"],
+                },
+                f,
+            )
+
+        reloaded = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+        assert reloaded._documents is None
+        assert reloaded.count() == 200
+        assert reloaded.get(ids=["id-3"])["documents"] == ["book 3"]
+
+        reloaded.persist()
+        assert not os.path.exists(directory / "documents.json")
+        assert NumpyVectorStore(str(tmp_path), None, "books")._documents is not None
+
+    def test_float16_storage(self, tmp_path):
+        """Half precision stores return the same nearest neighbour"""
+        vectors = {"a": [1.0, 0.0], "b": [0.6, 0.8], "q": [0.9, 0.1]}
+        store = NumpyVectorStore.from_documents(
+            [Document(page_content="a"), Document(page_content="b")],
+            ArrayEmbeddings(vectors),
+            ids=["a", "b"],
+            persist_directory=str(tmp_path),
+            collection_name="half",
+            dtype="float16",
+        )
+
+        assert store._vectors.dtype == np.float16
+        assert store.similarity_search("q", k=1)[0].page_content == "a"
+
+    def test_where_operators(self):
+        """Filters follow Chroma's operator semantics"""
+        book = {"category": "Roman", "year": 1866, "language": "tr"}
+
+        assert matches_where(book, {"category": "Roman"})
+        assert not matches_where(book, {"category": "roman"})
+        assert matches_where(book, build_metadata_filter("Roman", year_from=1800))
+        assert not matches_where(book, build_metadata_filter(year_to=1800))
+        assert matches_where(
+            book, {"$or": [{"year": {"$lt": 1800}}, {"language": "tr"}]}
+        )
+        assert matches_where(book, {"category": {"$in": ["Roman", "Tarih"]}})
+        # Missing fields and mismatched types never match
+        assert not matches_where(book, {"author": {"$ne": "X"}})
+        assert not matches_where({"year": None}, {"year": {"$gte": 1900}})
+
+    def test_filtered_search_only_scores_matches(self, random_store):
+        """Filtered search returns the nearest documents within the filter"""
+        store, vectors = random_store
+        where = {"n": {"$lt": 20}}
+
+        results = store.similarity_search_with_score("query", k=5, filter=where)
+        subset = {f"book {i}": vectors[f"book {i}"] for i in range(20)}
+        subset["query"] = vectors["query"]
+        expected, _ = brute_force(subset, vectors["query"], 5)
+
+        assert [doc.page_content for doc, _ in results] == expected
+        assert len(store.get(where=where)["ids"]) == 20
+
+    def test_batch_search_matches_single_queries(self, random_store, monkeypatch):
+        """Batched top-k equals per-query search, also across scan chunks"""
+        monkeypatch.setattr("services.vector_index.SEARCH_CHUNK_ROWS", 64)
+        store, vectors = random_store
+        queries = [vectors["query"], vectors["book 3"], vectors["book 150"]]
+
+        batches = store.similarity_search_by_vectors_with_score(queries, k=7)
+
+        assert len(batches) == 3
+        for query, results in zip(queries, batches):
+            expected = store.similarity_search_by_vector_with_score(query, k=7)
+            assert [doc.page_content for doc, _ in results] == [
+                doc.page_content for doc, _ in expected
+            ]
+            assert [score for _, score in results] == pytest.approx(
+                [score for _, score in expected], abs=1e-5
+            )
+        assert batches[1][0][0].page_content == "book 3"
+
+    def test_empty_store(self, tmp_path):
+        """Searching an empty store returns no results"""
+        store = NumpyVectorStore(str(tmp_path), ArrayEmbeddings({"q": [1.0]}))
+        assert store.similarity_search_with_score("q", k=3) == []
+
+
+def quantized_store(tmp_path, vectors, **kwargs):
+    store = NumpyVectorStore(
+        str(tmp_path), ArrayEmbeddings(vectors), "quantized", **kwargs
+    )
+    names = [name for name in vectors if name != "query"]
+    store.add_documents(
+        [Document(page_content=name) for name in names],
+        ids=names,
+    )
+    return store
+
+
+class TestQuantizedNumpyVectorStore:
+    """Tests for int8 and product-quantized search"""
+
+    def test_int8_keeps_nearest_neighbours(self, random_store, tmp_path):
+        """int8 codes find almost the same neighbours at a quarter of the size"""
+        _, vectors = random_store
+        store = quantized_store(tmp_path / "int8", vectors, quantization="int8")
+
+        results = store.similarity_search("query", k=10)
+        expected, _ = brute_force(vectors, vectors["query"], 10)
+        footprint = store.memory_footprint()
+
+        assert results[0].page_content == expected[0]
+        assert len({doc.page_content for doc in results} & set(expected)) >= 8
+        assert footprint["bytes_per_vector"] == 16
+        # Slightly under 4x once the per-dimension scales are counted
+        assert 3.5 < footprint["compression_ratio"] < 4.0
+
+    def test_pq_rerank_restores_exact_order(self, random_store, tmp_path):
+        """Re-ranking PQ candidates with full vectors gives exact scores"""
+        _, vectors = random_store
+        store = quantized_store(
+            tmp_path / "pq",
+            vectors,
+            quantization="pq",
+            pq_subvectors=4,
+            rerank_candidates=100,
+        )
+
+        results = store.similarity_search_with_score("query", k=5)
+        expected, similarities = brute_force(vectors, vectors["query"], 5)
+
+        assert [doc.page_content for doc, _ in results] == expected
+        assert [score for _, score in results] == pytest.approx(
+            list(2 - 2 * similarities), abs=1e-5
+        )
+        assert store.memory_footprint()["bytes_per_vector"] == 4
+
+    def test_codes_survive_persist_and_updates(self, random_store, tmp_path):
+        """Persisted codes reload, and later writes are encoded too"""
+        _, vectors = random_store
+        store = quantized_store(tmp_path, vectors, quantization="pq", pq_subvectors=4)
+        store.persist()
+        before = store.similarity_search("query", k=5)
+
+        reloaded = NumpyVectorStore(
+            str(tmp_path),
+            ArrayEmbeddings(vectors),
+            "quantized",
+            quantization="pq",
+            pq_subvectors=4,
+        )
+        assert reloaded._codes is not None
+        assert [d.page_content for d in reloaded.similarity_search("query", k=5)] == [
+            d.page_content for d in before
+        ]
+
+        reloaded.add_documents([Document(page_content="query")], ids=["query"])
+        reloaded.delete(ids=["book 0"])
+        assert reloaded.count() == 200
+        assert reloaded.similarity_search("query", k=1)[0].page_content == "query"
+
+    def test_quantization_report(self, random_store, tmp_path):
+        """The report measures recall against exact search"""
+        _, vectors = random_store
+        store = quantized_store(tmp_path, vectors, quantization="int8")
+
+        report = store.quantization_report(k=5, sample=20)
+
+        assert report["quantization"] == "int8"
+        assert 0.5 <= report["recall_at_k"] <= 1.0
+        assert report["codebook_bytes"] == 16 * 4
+
+    def test_invalid_settings(self, random_store, tmp_path):
+        """Unknown kinds and indivisible PQ dimensions are rejected"""
+        _, vectors = random_store
+        with pytest.raises(ValueError):
+            NumpyVectorStore(str(tmp_path), None, "bad", quantization="int4")
+
+        store = quantized_store(tmp_path, vectors, quantization="pq", pq_subvectors=5)
+        with pytest.raises(ValueError):
+            store.similarity_search("query", k=1)
+
+
+@pytest.mark.skipif(hnswlib is None, reason="hnswlib not installed")
+class TestHnswVectorStore:
+    """Tests for the approximate HNSW vector store"""
+
+    def test_recall_against_exact_search(self, random_store, tmp_path):
+        """HNSW finds (nearly) the same neighbours as the exact engine"""
+        exact, vectors = random_store
+        hnsw = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        stored = exact.get(include=["documents"])
+        hnsw.add_documents(
+            [Document(page_content=text) for text in stored["documents"]],
+            ids=stored["ids"],
+        )
+
+        expected = {d.page_content for d in exact.similarity_search("query", k=10)}
+        found = {d.page_content for d in hnsw.similarity_search("query", k=10)}
+
+        assert len(expected & found) >= 9
+
+    def test_upsert_delete_and_slot_reuse(self, tmp_path):
+        """Updated ids keep one node; deleted slots are reused by new ids"""
+        vectors = {"a": [1.0, 0.0], "b": [0.0, 1.0], "c": [0.7, 0.7]}
+        store = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors))
+        store.add_documents(
+            [Document(page_content="a"), Document(page_content="b")], ids=["1", "2"]
+        )
+
+        store.delete(ids=["2"])
+        store.add_documents([Document(page_content="c")], ids=["3"])
+        store.add_documents([Document(page_content="b")], ids=["1"])
+
+        results = store.similarity_search_with_score("b", k=5)
+        assert store.count() == 2
+        assert [doc.page_content for doc, _ in results] == ["b", "c"]
+        assert results[0][1] == pytest.approx(0.0, abs=1e-5)
+        assert store._index.get_current_count() == 2
+
+    @pytest.mark.parametrize("exact_limit", [4096, 0])
+    def test_filtered_search(self, random_store, tmp_path, monkeypatch, exact_limit):
+        """Exact and graph-filtered paths return only matching documents"""
+        monkeypatch.setattr(
+            "services.vector_index.HNSW_EXACT_FILTER_LIMIT", exact_limit
+        )
+        exact, vectors = random_store
+        hnsw = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        stored = exact.get()
+        hnsw.add_documents(
+            [
+                Document(page_content=text, metadata=metadata)
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ],
+            ids=stored["ids"],
+        )
+
+        for where in [{"n": {"$lt": 10}}, {"n": {"$gte": 5}}]:
+            expected = exact.similarity_search("query", k=5, filter=where)
+            found = hnsw.similarity_search("query", k=5, filter=where)
+            assert all(matches_where(doc.metadata, where) for doc in found)
+            assert (
+                len(
+                    {d.page_content for d in expected} & {d.page_content for d in found}
+                )
+                >= 4
+            )
+
+    def test_batch_search(self, random_store, tmp_path):
+        """A query matrix is answered in one call, one result list per row"""
+        _, vectors = random_store
+        store = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        store.add_documents(
+            [Document(page_content=f"book {i}") for i in range(50)],
+            ids=[f"id-{i}" for i in range(50)],
+        )
+
+        batches = store.similarity_search_by_vectors_with_score(
+            [vectors["book 4"], vectors["book 40"]], k=3
+        )
+
+        assert [results[0][0].page_content for results in batches] == [
+            "book 4",
+            "book 40",
+        ]
+        assert all(len(results) == 3 for results in batches)
+        assert batches[0][0][1] == pytest.approx(0.0, abs=1e-5)
+
+    def test_persist_and_load(self, random_store, tmp_path):
+        """A saved graph loads without rebuilding and answers identically"""
+        _, vectors = random_store
+        store = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        store.add_documents(
+            [Document(page_content=f"book {i}") for i in range(50)],
+            ids=[f"id-{i}" for i in range(50)],
+        )
+        store.persist()
+
+        reloaded = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+
+        assert HnswVectorStore.exists(str(tmp_path), "hnsw")
+        assert reloaded.count() == 50
+        assert [d.page_content for d in reloaded.similarity_search("query", k=5)] == [
+            d.page_content for d in store.similarity_search("query", k=5)
+        ]
+
+    def test_documents_are_memory_mapped(self, random_store, tmp_path):
+        """Documents reload as shared maps keyed by label until the first write"""
+        _, vectors = random_store
+        store = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        store.add_documents(
+            [Document(page_content=f"book {i}", metadata={"n": i}) for i in range(50)],
+            ids=[f"id-{i}" for i in range(50)],
+        )
+        # A freed slot makes the labels sparse
+        store.delete(ids=["id-3"])
+        store.persist()
+
+        reloaded = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        assert reloaded._documents is not None
+        assert not os.path.exists(tmp_path / "hnsw" / "hnsw_documents.json")
+        assert reloaded.count() == 49
+        assert reloaded.get(ids=["id-7", "id-3"])["metadatas"] == [{"n": 7}]
+        assert len(reloaded.get(where={"n": {"$gte": 45}})["ids"]) == 5
+        assert reloaded.similarity_search("book 42", k=1)[0].page_content == "book 42"
+
+        reloaded.add_documents(
+            [Document(page_content="book 3", metadata={"n": 3})], ids=["id-new"]
+        )
+        assert reloaded._documents is None
+        assert HnswVectorStore(str(tmp_path), None, "hnsw").count() == 49
+
+        reloaded.persist()
+        again = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        assert again._documents is not None
+        assert again.get(ids=["id-new"])["documents"] == ["book 3"]
+        assert again.similarity_search("book 3", k=1)[0].metadata == {"n": 3}
+
+    def test_documents_json_stores_still_load(self, random_store, tmp_path):
+        """Stores persisted with hnsw_documents.json open unchanged"""
+        from services import mapped_documents
+
+        _, vectors = random_store
+        store = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        store.add_documents(
+            [Document(page_content=f"book {i}", metadata={"n": i}) for i in range(20)],
+            ids=[f"id-{i}" for i in range(20)],
+        )
+        store.persist()
+        directory = tmp_path / "hnsw"
+        labels = sorted(store._ids)
+        with open(directory / "hnsw_documents.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dimension": store._index.dim,
+                    "next_label": store._next_label,
+                    "labels": labels,
+                    "ids": [store._ids[label] for label in labels],
+                    "documents": [store._texts[label] for label in labels],
+                    "metadatas": [store._metadatas[label] for label in labels],
+                },
+                f,
+            )
+        for name in mapped_documents.MAPPED_FILES + (
+            "hnsw_labels.npy",
+            "hnsw_state.json",
+        ):
+            os.remove(directory / name)
+
+        reloaded = HnswVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "hnsw")
+        assert reloaded._documents is None
+        assert reloaded.count() == 20
+        assert reloaded.get(ids=["id-4"])["documents"] == ["book 4"]
+
+
+class TestLexicalIndex:
+    """Tests for the BM25 index and rank fusion"""
+
+    def test_bm25_prefers_rare_terms(self):
+        """Documents with the rarer query term rank first"""
+        index = BM25Index(
+            [
+                "Kitap Adı: Dune Yazar: Frank Herbert",
+                "Kitap Adı: Vakıf Yazar: Isaac Asimov",
+                "Kitap Adı: Ben, Robot Yazar: Isaac Asimov",
+                "Kitap Adı: Solaris Yazar: Stanisław Lem",
+            ]
+        )
+
+        results = index.search("Isaac Asimov robot", k=3)
+
+        assert [position for position, _ in results] == [2, 1]
+        assert results[0][1] > results[1][1]
+        assert index.search("tolkien") == []
+
+    def test_tokens_fold_case_and_diacritics(self):
+        """Turkish dotless i and accents do not block a match"""
+        assert tokenize("SUÇ ve Ceza, Işık") == ["suc", "ve", "ceza", "isik"]
+        assert BM25Index(["Suç ve Ceza"]).search("suc")[0][0] == 0
+
+    def test_reciprocal_rank_fusion(self):
+        """Items ranked well by both lists win; scores follow 1 / (k + rank)"""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+        assert [item for item, _ in fused] == ["b", "a", "d", "c"]
+        assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+class TestAttributeIndex:
+    """Tests for the bitset indexes behind metadata filters"""
+
+    @staticmethod
+    def catalog(count=500, seed=5):
+        rng = np.random.default_rng(seed)
+        metadatas = []
+        for i in range(count):
+            metadata = {
+                "category": str(rng.choice(["Roman", "Tarih", "Bilim Kurgu"])),
+                "language": str(rng.choice(["tr", "en"])),
+                "year": int(rng.integers(1850, 2025)),
+                "rating": round(float(rng.uniform(1, 5)), 1),
+                "author": f"Yazar {i % 7}",
+            }
+            # Missing and mistyped values never match, as in Chroma
+            if i % 11 == 0:
+                del metadata["year"]
+            if i % 13 == 0:
+                metadata["rating"] = None
+            if i % 17 == 0:
+                metadata["year"] = str(metadata.get("year", 1900))
+            metadatas.append(metadata)
+        return metadatas
+
+    @pytest.mark.parametrize(
+        "where",
+        [
+            {"category": "Roman"},
+            {"language": {"$in": ["en", "de"]}},
+            {"year": {"$gte": 1900, "$lte": 1955}},
+            {"year": {"$gt": 1990}},
+            {"year": {"$lt": 1901}},
+            {"year": 1984},
+            {"rating": {"$gte": 4.2}},
+            {"rating": {"$gt": 2.5, "$lt": 3.0}},
+            {"$and": [{"category": "Tarih"}, {"year": {"$gte": 1950}}]},
+            {"$and": [{"language": "tr"}, {"author": "Yazar 3"}]},
+            {"$or": [{"category": "Roman"}, {"rating": {"$gte": 4.5}}]},
+            {"category": {"$ne": "Roman"}, "rating": {"$lte": 2}},
+            {"category": "Şiir"},
+            {"year": {"$gte": 2000, "$lte": 1990}},
+        ],
+    )
+    def test_select_matches_full_scan(self, where):
+        """Bitsets plus the residual filter select exactly the matching rows"""
+        metadatas = self.catalog()
+        index = AttributeIndex.build(metadatas)
+
+        rows, residual = index.select(where)
+        if rows is None:
+            rows = range(len(metadatas))
+        selected = [row for row in rows if matches_where(metadatas[row], residual)]
+
+        expected = [
+            row
+            for row, metadata in enumerate(metadatas)
+            if matches_where(metadata, where)
+        ]
+        assert selected == expected
+
+    def test_residual_only_for_unindexed_clauses(self):
+        """Indexed clauses are answered by bitsets and never re-checked"""
+        index = AttributeIndex.build(self.catalog())
+
+        assert index.select({"category": "Roman", "year": {"$gte": 1950}})[1] is None
+        assert index.select({"author": "Yazar 1"}) == (None, {"author": "Yazar 1"})
+        _, residual = index.select(
+            {"$and": [{"author": "Yazar 1"}, {"category": {"$nin": ["Roman"]}}]}
+        )
+        assert residual == {
+            "$and": [{"author": "Yazar 1"}, {"category": {"$nin": ["Roman"]}}]
+        }
+
+    def test_persisted_with_store_and_rebuilt_after_writes(self, tmp_path):
+        """The index is saved next to the store and invalidated on writes"""
+        vectors = {f"book {i}": [1.0, float(i)] for i in range(30)}
+        vectors["query"] = [1.0, 0.0]
+        store = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+        store.add_documents(
+            [
+                Document(page_content=f"book {i}", metadata={"year": 1900 + i})
+                for i in range(30)
+            ],
+            ids=[str(i) for i in range(30)],
+        )
+        store.persist()
+        assert os.path.exists(tmp_path / "books" / ATTRIBUTES_FILE)
+
+        reloaded = NumpyVectorStore(str(tmp_path), ArrayEmbeddings(vectors), "books")
+        assert reloaded._attributes is not None
+        recent = {"year": {"$gte": 1925}}
+        results = reloaded.similarity_search("query", k=10, filter=recent)
+        assert [doc.page_content for doc in results] == [
+            f"book {i}" for i in range(25, 30)
+        ]
+
+        reloaded.delete(ids=["27"])
+        reloaded.add_documents(
+            [Document(page_content="book 3", metadata={"year": 1999})], ids=["3"]
+        )
+        assert reloaded._attributes is None
+        results = reloaded.similarity_search("query", k=10, filter=recent)
+        assert [doc.page_content for doc in results] == [
+            "book 3",
+            "book 25",
+            "book 26",
+            "book 28",
+            "book 29",
+        ]
+
+    def test_save_and_load(self, tmp_path):
+        """A saved index answers filters like the one it was saved from"""
+        metadatas = self.catalog(100)
+        index = AttributeIndex.build(metadatas)
+        os.replace(index.save(str(tmp_path)), tmp_path / ATTRIBUTES_FILE)
+
+        loaded = AttributeIndex.load(str(tmp_path), 100)
+        where = {"$and": [{"language": "en"}, {"rating": {"$gte": 3}}]}
+
+        assert loaded.select(where)[0].tolist() == index.select(where)[0].tolist()
+        assert AttributeIndex.load(str(tmp_path), 101) is None
+        assert loaded.nbytes == index.nbytes
+
+
+class TestNeighborTable:
+    """Tests for the precomputed similar-books table"""
+
+    @staticmethod
+    def catalog(count, seed=3):
+        rng = np.random.default_rng(seed)
+        return [f"book-{i}" for i in range(count)], rng.standard_normal((count, 16))
+
+    def test_build_matches_brute_force(self):
+        """Every row holds the exact top-N, best first, without the book itself"""
+        ids, vectors = self.catalog(300)
+        table = NeighborTable.build(ids, vectors, size=5)
+
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        similarities = unit @ unit.T
+        np.fill_diagonal(similarities, -np.inf)
+        for row in (0, 17, 299):
+            expected = np.argsort(-similarities[row])[:5]
+            neighbors = table.get(ids[row], 5)
+            assert [doc_id for doc_id, _ in neighbors] == [ids[i] for i in expected]
+            assert [score for _, score in neighbors] == pytest.approx(
+                similarities[row, expected], abs=1e-5
+            )
+        assert table.get("missing", 5) is None
+
+    def test_refresh_equals_rebuild(self):
+        """Incremental refresh matches a full build and recomputes few rows"""
+        ids, vectors = self.catalog(300)
+        table = NeighborTable.build(ids, vectors, size=5)
+        rng = np.random.default_rng(11)
+
+        # Remove two books, change one and add two
+        keep = [i for i in range(300) if i not in (4, 150)]
+        new_ids = [ids[i] for i in keep] + ["book-new-1", "book-new-2"]
+        new_vectors = np.vstack([vectors[keep], rng.standard_normal((2, 16))])
+        new_vectors[10] = rng.standard_normal(16)
+        changed = [new_ids[10], "book-new-1", "book-new-2"]
+
+        refreshed, recomputed = table.refresh(new_ids, new_vectors, changed)
+        rebuilt = NeighborTable.build(new_ids, new_vectors, size=5)
+
+        assert 3 <= recomputed < len(new_ids) // 2
+        for doc_id in new_ids:
+            assert [n for n, _ in refreshed.get(doc_id, 5)] == [
+                n for n, _ in rebuilt.get(doc_id, 5)
+            ]
+
+    def test_save_and_load(self, tmp_path):
+        """A persisted table reloads unchanged"""
+        ids, vectors = self.catalog(20)
+        table = NeighborTable.build(ids, vectors, size=3)
+        table.save(str(tmp_path))
+
+        loaded = NeighborTable.load(str(tmp_path))
+
+        assert loaded.get("book-7", 3) == table.get("book-7", 3)
+        assert NeighborTable.load(str(tmp_path / "missing")) is None
+
+
+class TestMaximalMarginalRelevance:
+    """Tests for MMR diversification"""
+
+    candidates = [[1.0, 0.0, 0.0], [0.99, 0.1, 0.0], [0.7, 0.0, 0.7]]
+
+    def test_near_duplicates_are_pushed_down(self):
+        """The runner-up is skipped when it repeats the top result"""
+        query = [1.0, 0.05, 0.2]
+
+        assert max_marginal_relevance(query, self.candidates, 3, 1.0) == [0, 1, 2]
+        assert max_marginal_relevance(query, self.candidates, 2, 0.5) == [0, 2]
+
+    def test_edge_cases(self):
+        """k is capped by the candidates and lambda must be in [0, 1]"""
+        assert len(max_marginal_relevance([1.0, 0, 0], self.candidates, 10)) == 3
+        assert max_marginal_relevance([1.0], [], 5) == []
+        with pytest.raises(ValueError):
+            max_marginal_relevance([1.0], [[1.0]], 1, lambda_mult=1.5)
+
+
+class TestMetricsRegistry:
+    """Tests for the latency histograms and Prometheus exporter"""
+
+    def test_histogram_quantiles(self):
+        """Quantiles interpolate within the bucket holding their rank"""
+        histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+        for value in (0.5, 1.5, 1.5, 3.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [1, 2, 1, 0]
+        assert histogram.quantile(0.5) == pytest.approx(1.5)
+        assert histogram.quantile(1.0) == pytest.approx(4.0)
+        assert histogram.snapshot()["mean"] == pytest.approx(1.625)
+        assert Histogram().quantile(0.5) is None
+
+    def test_prometheus_text_format(self):
+        """Series are rendered with HELP, TYPE, labels and cumulative buckets"""
+        registry = MetricsRegistry(namespace="test")
+        registry.describe("calls_total", "Calls")
+        registry.increment("calls_total", operation="search")
+        registry.increment("calls_total", 2, operation="search")
+        registry.set_gauge("documents", 3)
+        registry.observe("latency_seconds", 0.003, stage='a "b"')
+        registry.observe("latency_seconds", 20, stage='a "b"')
+
+        lines = registry.render_prometheus().splitlines()
+
+        assert "# HELP test_calls_total Calls" in lines
+        assert "# TYPE test_calls_total counter" in lines
+        assert 'test_calls_total{operation="search"} 3' in lines
+        assert "test_documents 3" in lines
+        assert 'test_latency_seconds_bucket{stage="a \\"b\\"",le="0.0025"} 0' in lines
+        assert 'test_latency_seconds_bucket{stage="a \\"b\\"",le="0.005"} 1' in lines
+        assert 'test_latency_seconds_bucket{stage="a \\"b\\"",le="+Inf"} 2' in lines
+        assert 'test_latency_seconds_count{stage="a \\"b\\""} 2' in lines
+
+
+class TestVectorServiceNumpyEngine:
+    """Tests for VectorService on the NumPy engine with local embeddings"""
+
+    @pytest.fixture
+    def books(self):
+        def book(book_id, title, author, category, description):
+            return SimpleNamespace(
+                id=book_id,
+                title=title,
+                author=author,
+                category=category,
+                description=description,
+                year=2000,
+                language="tr",
+                rating=4.5,
+            )
+
+        return [
+            book(1, "Dune", "Frank Herbert", "Bilim Kurgu", "Çöl gezegeni Arrakis"),
+            book(2, "Vakıf", "Isaac Asimov", "Bilim Kurgu", "Galaktik imparatorluk"),
+            book(3, "Küçük Prens", "Saint-Exupéry", "Çocuk Edebiyatı", "Felsefi masal"),
+        ]
+
+    @pytest.fixture
+    def service(self, books, tmp_path, monkeypatch):
+        from services import vector_service
+
+        monkeypatch.setenv("VECTOR_STORE_ENGINE", "numpy")
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(IndexManager, "_load_books", lambda self: list(books))
+        return vector_service.VectorService(IndexManager())
+
+    def test_build_and_search(self, service):
+        """The service builds a NumPy index and ranks matching books first"""
+        results = service.semantic_search("Arrakis çöl gezegeni", limit=3, threshold=2)
+
+        assert isinstance(service.vector_store, NumpyVectorStore)
+        assert service.get_vector_store_stats()["total_books"] == 3
+        assert results[0]["title"] == "Dune"
+        assert set(results[0]) == {
+            "title",
+            "author",
+            "category",
+            "description",
+            "year",
+            "rating",
+            "similarity_score",
+            "book_id",
+        }
+
+    def test_incremental_update_is_persisted(self, service, books):
+        """Updates are diffed by id and survive a reload"""
+        books[0].description = "Baharat savaşları"
+        del books[2]
+
+        summary = service.update_vector_store()
+        reloaded = NumpyVectorStore(
+            service.index_manager.active_directory, None, "luminis_books"
+        )
+
+        assert summary["updated"] == 1
+        assert summary["deleted"] == 1
+        assert reloaded.count() == 2
+
+    @pytest.mark.parametrize(
+        "engine",
+        [
+            "numpy",
+            pytest.param(
+                "hnsw",
+                marks=pytest.mark.skipif(
+                    hnswlib is None, reason="hnswlib not installed"
+                ),
+            ),
+        ],
+    )
+    def test_update_diff_counts_and_idempotence(
+        self, engine, books, tmp_path, monkeypatch
+    ):
+        """Adds, updates and deletes are counted; a no-op update changes nothing"""
+        from services import vector_service
+
+        monkeypatch.setenv("VECTOR_STORE_ENGINE", engine)
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(IndexManager, "_load_books", lambda self: list(books))
+        service = vector_service.VectorService(IndexManager())
+
+        books[0].description = "Baharat savaşları"
+        del books[2]
+        books.append(
+            SimpleNamespace(
+                id=4,
+                title="Solaris",
+                author="Stanisław Lem",
+                category="Bilim Kurgu",
+                description="Okyanus gezegeni",
+                year=1961,
+                language="tr",
+                rating=4.2,
+            )
+        )
+
+        first = service.update_vector_store()
+        version = service.index_manager.version
+        second = service.update_vector_store()
+
+        assert (first["added"], first["updated"], first["deleted"]) == (1, 1, 1)
+        assert (second["added"], second["updated"], second["deleted"]) == (0, 0, 0)
+        assert second["unchanged"] == 3
+        # Nothing changed, so no new version was built
+        assert service.index_manager.version == version
+        assert service.vector_store.count() == 3
+        stored = service.vector_store.get(include=["metadatas"])
+        assert sorted(metadata["title"] for metadata in stored["metadatas"]) == [
+            "Dune",
+            "Solaris",
+            "Vakıf",
+        ]
+
+    def test_rebuild_swaps_versions_after_leases_drain(self, service, books):
+        """Readers keep their version during a rebuild; old ones are pruned"""
+        manager = service.index_manager
+        manager.keep_versions = 2
+        old_version, old_directory = manager.version, manager.active_directory
+        books[2].description = "Gezegenler arası yolculuk"
+
+        with manager.lease():
+            summary = service.update_vector_store()
+            # The leased reader still sees the old version, new readers the new
+            leased = manager.vector_store.get(ids=["book-3"])["documents"][0]
+            active = manager._vector_store.get(ids=["book-3"])["documents"][0]
+            assert "Felsefi masal" in leased
+            assert "Gezegenler arası" in active
+            assert os.path.isdir(old_directory)
+
+        assert summary["updated"] == 1
+        assert summary["version"] == manager.version != old_version
+        # Other workers may still serve the replaced version: it is kept
+        # until keep_versions newer versions exist
+        middle_directory = manager.active_directory
+        books[0].description = "Baharat savaşları"
+        service.update_vector_store()
+        deadline = time.monotonic() + 5
+        while os.path.isdir(old_directory) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not os.path.isdir(old_directory)
+        assert os.path.isdir(middle_directory)
+
+        reopened = IndexManager()
+        assert reopened.version == manager.version
+        assert reopened.vector_store.count() == 3
+        results = service.semantic_search("Gezegenler arası", limit=1, threshold=2)
+        assert results[0]["title"] == "Küçük Prens"
+
+    def test_prune_keeps_newest_and_leased_versions(self, service, books):
+        """Only versions outside the newest N and unleased are deleted"""
+        manager = service.index_manager
+        manager.keep_versions = 2
+        first = manager.version
+        versions_root = os.path.dirname(manager.active_directory)
+
+        with manager.lease():
+            for description in ("Bir", "İki", "Üç"):
+                books[0].description = description
+                service.update_vector_store()
+            # The leased first version survives any number of publishes
+            assert first not in manager._prune_versions()
+            assert first in os.listdir(versions_root)
+
+        # Retire threads may prune it first; either way it is gone now
+        manager._prune_versions()
+        assert first not in os.listdir(versions_root)
+        assert len(os.listdir(versions_root)) == 2
+        assert manager.version in os.listdir(versions_root)
+
+    def test_prune_keeps_versions_other_processes_read(self, service, books):
+        """A version another live worker registered for is kept until it exits"""
+        fcntl = pytest.importorskip("fcntl")
+        manager = service.index_manager
+        manager.keep_versions = 2
+        first = manager.version
+        versions_root = os.path.dirname(manager.active_directory)
+        readers = os.path.join(manager.active_directory, "readers")
+        assert os.listdir(readers) == [str(os.getpid())]
+
+        # One worker still serving the first version, one that has exited
+        with open(os.path.join(readers, "999999"), "a") as other:
+            fcntl.flock(other, fcntl.LOCK_SH)
+            open(os.path.join(readers, "999998"), "a").close()
+            for description in ("Bir", "İki", "Üç"):
+                books[0].description = description
+                service.update_vector_store()
+
+            assert first not in manager._prune_versions()
+            assert os.listdir(readers) == ["999999"]
+
+        manager._prune_versions()
+        assert first not in os.listdir(versions_root)
+        assert len(os.listdir(versions_root)) == 2
+
+    def test_update_applies_only_the_change(self, service, books, monkeypatch):
+        """A new version starts from the served files instead of a full copy"""
+        manager = service.index_manager
+        previous = manager.active_directory
+
+        def fail(*args, **kwargs):
+            raise AssertionError("unchanged documents were copied one by one")
+
+        added = []
+        add_documents = manager._add_documents
+        monkeypatch.setattr(manager, "_copy_documents", fail)
+        monkeypatch.setattr(
+            manager,
+            "_add_documents",
+            lambda documents, store=None: added.append(list(documents))
+            or add_documents(documents, store),
+        )
+        books[0].description = "Baharat savaşları"
+        del books[2]
+
+        summary = service.update_vector_store()
+
+        assert summary["success"] is True
+        assert added == [["book-1"]]
+        stored = manager.vector_store.get()
+        assert sorted(stored["ids"]) == ["book-1", "book-2"]
+        assert any("Baharat" in text for text in stored["documents"])
+        # The replaced version's files are untouched
+        old = NumpyVectorStore(previous, None, "luminis_books")
+        assert old.count() == 3
+        assert not any("Baharat" in text for text in old.get()["documents"])
+
+    def test_failed_rebuild_keeps_serving(self, service, books, monkeypatch):
+        """A rebuild that fails leaves the active version untouched"""
+        manager = service.index_manager
+        version = manager.version
+        books[0].description = "Baharat savaşları"
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(manager, "_add_documents", fail)
+        summary = service.update_vector_store()
+
+        assert summary["success"] is False
+        assert manager.version == version
+        assert os.listdir(os.path.dirname(manager.active_directory)) == [version]
+        assert service.semantic_search("Arrakis", limit=1, threshold=2)
+
+    def test_build_lock_does_not_fake_an_existing_store(self, tmp_path, monkeypatch):
+        """Taking the build lock leaves a fresh persist directory absent"""
+        monkeypatch.setenv("VECTOR_STORE_ENGINE", "chroma")
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        directory = tmp_path / "chroma_db"
+        manager = IndexManager(str(directory), initialize=False)
+
+        with manager._writing():
+            assert not directory.exists()
+            assert not manager._vector_store_exists(str(directory))
+
+        directory.mkdir()
+        assert not manager._vector_store_exists(str(directory))
+        (directory / "chroma.sqlite3").touch()
+        assert manager._vector_store_exists(str(directory))
+
+    def test_workers_follow_published_versions(self, service, books, monkeypatch):
+        """A second worker on the same directory follows the first's rebuilds"""
+        monkeypatch.setenv("INDEX_POLL_INTERVAL", "0")
+        writer = service.index_manager
+        follower = IndexManager()
+        assert follower.version == writer.version
+        assert follower.vector_store._documents is not None
+
+        books[0].description = "Baharat savaşları"
+        summary = service.update_vector_store()
+        with follower.lease() as lease:
+            document = lease.store.get(ids=["book-1"])["documents"][0]
+
+        assert summary["updated"] == 1
+        assert follower.version == writer.version
+        assert "Baharat savaşları" in document
+
+        # Writes from the follower start from the version it now serves
+        books[1].description = "Psikotarih"
+        summary = follower.update_vector_store()
+        assert summary["updated"] == 1
+        with writer.lease():
+            assert writer.version == follower.version
+            assert writer.vector_store.count() == 3
+
+    def test_semantic_search_with_filters(self, service):
+        """Filters restrict semantic results before they are ranked"""
+        unfiltered = service.semantic_search(
+            "Çöl gezegeni Arrakis", limit=1, threshold=2
+        )
+        filtered = service.semantic_search(
+            "Çöl gezegeni Arrakis",
+            limit=1,
+            threshold=2,
+            category="Çocuk Edebiyatı",
+            min_rating=4,
+        )
+        diversified = service.semantic_search(
+            "Çöl gezegeni Arrakis",
+            limit=3,
+            threshold=4,
+            mmr_lambda=0.5,
+            category="Bilim Kurgu",
+            year_from=1990,
+        )
+
+        assert unfiltered[0]["title"] == "Dune"
+        assert [book["title"] for book in filtered] == ["Küçük Prens"]
+        assert {book["title"] for book in diversified} == {"Dune", "Vakıf"}
+        assert service.semantic_search("Dune", threshold=2, min_rating=4.6) == []
+
+    def test_synced_books_are_indexed_incrementally(self, service):
+        """Open Library books are upserted by key and survive catalog updates"""
+        synced = {
+            "title": "Solaris",
+            "author": "Stanisław Lem",
+            "genre": "Bilim Kurgu",
+            "description": "Okyanus gezegeni",
+            "rating": 4.2,
+            "year": 1961,
+            "openlibrary_key": "/works/OL123W",
+        }
+
+        assert service.add_books([synced, {"title": "No key"}]) == 1
+        assert service.add_books([synced]) == 1
+        summary = service.update_vector_store()
+
+        assert service.vector_store.count() == 4
+        assert summary["deleted"] == 0
+        results = service.semantic_search("Okyanus gezegeni", limit=1, threshold=2)
+        assert results[0]["title"] == "Solaris"
+
+    def test_synced_books_are_published_as_a_new_version(self, service):
+        """Open Library inserts never write the version readers are using"""
+        manager = service.index_manager
+
+        with manager.lease() as lease:
+            service.add_books(
+                [{"title": "Solaris", "openlibrary_key": "/works/OL123W"}]
+            )
+
+            assert lease.store.count() == 3
+            assert manager.version != lease.version
+            assert service.vector_store is lease.store
+
+        assert service.vector_store.count() == 4
+        assert manager._read_current_version() == manager.version
+
+    def test_structured_filters_skip_embedding(self, service, monkeypatch):
+        """Exact filters return every match without embedding a query"""
+
+        def fail(text):
+            raise AssertionError("filters must not embed queries")
+
+        monkeypatch.setattr(service.embeddings, "embed_query", fail)
+
+        science_fiction = service.filter_books(category="Bilim Kurgu", limit=None)
+        by_author = service.get_author_books("Isaac Asimov")
+
+        assert {book["title"] for book in science_fiction} == {"Dune", "Vakıf"}
+        assert [book["title"] for book in by_author] == ["Vakıf"]
+        assert service.filter_books(language="tr", year_from=2001) == []
+
+    def test_filters_with_semantic_ranking(self, service):
+        """A query ranks books inside the filtered set"""
+        results = service.filter_books(category="Bilim Kurgu", query="galaktik")
+
+        assert [book["title"] for book in results] == ["Vakıf", "Dune"]
+        assert results[0]["similarity_score"] > results[1]["similarity_score"]
+
+    def test_similar_books_reuse_stored_vectors(self, service, books, monkeypatch):
+        """Similar-book lookups embed nothing and exclude the seed by id"""
+
+        def fail(text):
+            raise AssertionError("similar books must reuse stored vectors")
+
+        monkeypatch.setattr(service.embeddings, "embed_query", fail)
+        monkeypatch.setattr(service, "_find_book_by_title", lambda title: books[0])
+
+        # A differently cased title used to slip past the title-based exclusion
+        results = service.find_similar_books("dune", limit=2)
+        results_by_id = service.find_similar_books_by_id(1, limit=2, threshold=2)
+
+        assert all(book["book_id"] != 1 for book in results)
+        assert [book["book_id"] for book in results_by_id] == [2, 3]
+        assert service.find_similar_books_by_id(99) is None
+
+    def test_similar_books_from_neighbor_table(self, service, books, monkeypatch):
+        """The table serves similar books and follows catalog updates"""
+        live = service.find_similar_books_by_id(1, limit=2, threshold=2)
+        summary = service.index_manager.build_neighbor_table(size=2)
+
+        def fail(embedding, k):
+            raise AssertionError("similar books must come from the table")
+
+        monkeypatch.setattr(service, "_search_by_vector", fail)
+        served = service.find_similar_books_by_id(1, limit=2, threshold=2)
+
+        assert summary["books"] == 3
+        assert [b["book_id"] for b in served] == [b["book_id"] for b in live]
+        assert [b["similarity_score"] for b in served] == pytest.approx(
+            [b["similarity_score"] for b in live], abs=1e-5
+        )
+        assert service.get_vector_store_stats()["neighbor_table"] == {
+            "books": 3,
+            "size": 2,
+        }
+
+        # A sync refreshes the table inside the new index version
+        del books[1]
+        service.update_vector_store()
+        directory = service.index_manager.active_directory
+        assert os.path.exists(os.path.join(directory, "neighbors.npz"))
+        assert [b["book_id"] for b in service.find_similar_books_by_id(1, 2, 2)] == [3]
+
+    def test_lease_pins_the_neighbor_table_with_its_store(self, service, books):
+        """Similar books and stats read the leased version's table"""
+        manager = service.index_manager
+        manager.build_neighbor_table(size=2)
+
+        with manager.lease() as lease:
+            del books[1]
+            service.update_vector_store()
+            assert manager.version != lease.version
+            similar = service.find_similar_books_by_id(1, limit=2, threshold=2)
+            stats = service.get_vector_store_stats()
+
+        # The new version's table no longer lists book 2; the leased one does
+        assert 2 in [book["book_id"] for book in similar]
+        assert stats["index_version"] == lease.version
+        assert stats["neighbor_table"]["books"] == 3
+        assert service.get_vector_store_stats()["neighbor_table"]["books"] == 2
+
+    def test_batched_semantic_search(self, service, monkeypatch):
+        """Many queries share one embedding request and match single searches"""
+        queries = ["Arrakis çöl gezegeni", "galaktik imparatorluk", "felsefi masal"]
+        expected = [service.semantic_search(q, limit=2, threshold=2) for q in queries]
+        service.embeddings.query_cache._entries.clear()
+        monkeypatch.setattr(service.embeddings.query_cache, "get", lambda key: None)
+        calls = []
+        embed_documents = service.embeddings.base_embeddings.embed_documents
+        monkeypatch.setattr(
+            service.embeddings.base_embeddings,
+            "embed_documents",
+            lambda texts: calls.append(texts) or embed_documents(texts),
+        )
+
+        results = service.semantic_search_many(queries, limit=2, threshold=2)
+
+        assert len(calls) == 1
+        assert [[b["title"] for b in r] for r in results] == [
+            [b["title"] for b in r] for r in expected
+        ]
+        assert [r[0]["title"] for r in results] == ["Dune", "Vakıf", "Küçük Prens"]
+        assert service.semantic_search_many([]) == []
+
+    def test_diversified_search_uses_stored_vectors(self, service, monkeypatch):
+        """MMR re-ranks stored candidates; lambda 1 keeps the relevance order"""
+        plain = service.semantic_search("Arrakis çöl gezegeni", limit=3, threshold=2)
+
+        def fail(texts):
+            raise AssertionError("candidates must reuse stored vectors")
+
+        monkeypatch.setattr(service.embeddings, "embed_documents", fail)
+        relevance_only = service.semantic_search(
+            "Arrakis çöl gezegeni", limit=3, threshold=2, mmr_lambda=1.0
+        )
+        diverse = service.semantic_search(
+            "Arrakis çöl gezegeni", limit=2, threshold=2, mmr_lambda=0.3
+        )
+
+        assert [b["title"] for b in relevance_only] == [b["title"] for b in plain]
+        assert diverse[0]["title"] == "Dune"
+        assert len(diverse) == 2
+
+    def test_hybrid_search_fuses_lexical_and_vector_hits(self, service):
+        """An exact author surname ranks first, with a timing breakdown"""
+        hybrid = service.hybrid_search("Asimov", limit=3, threshold=2)
+
+        assert hybrid["results"][0]["title"] == "Vakıf"
+        assert hybrid["fallback"] is False
+        assert set(hybrid["timings"]) == {
+            "lexical_ms",
+            "vector_ms",
+            "fusion_ms",
+            "total_ms",
+        }
+        scores = [book["fusion_score"] for book in hybrid["results"]]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_hybrid_search_keeps_books_with_identical_text(self, service, books):
+        """Two books with the same title, author and description both rank"""
+        copy = SimpleNamespace(**vars(books[1]))
+        copy.id = 4
+        books.append(copy)
+        service.update_vector_store()
+
+        hybrid = service.hybrid_search("Asimov", limit=3, threshold=2)
+
+        assert [book["book_id"] for book in hybrid["results"][:2]] in ([2, 4], [4, 2])
+        assert hybrid["results"][0]["fusion_score"] == pytest.approx(
+            hybrid["results"][1]["fusion_score"], rel=0.05
+        )
+
+    def test_hybrid_search_legs_share_the_callers_version(self, service, monkeypatch):
+        """Both legs search the version the call leased, not a newer one"""
+        manager = service.index_manager
+        seen = []
+        original = manager.get_lexical_index
+
+        def spy(store=None):
+            seen.append(store)
+            return original(store)
+
+        monkeypatch.setattr(manager, "get_lexical_index", spy)
+        with manager.lease() as lease:
+            # A rebuild activates another version while the call runs
+            monkeypatch.setattr(manager, "_vector_store", None)
+            hybrid = service.hybrid_search("Frank Herbert", limit=2)
+
+        assert seen == [lease.store]
+        assert hybrid["fallback"] is False
+        assert hybrid["results"][0]["title"] == "Dune"
+
+    def test_hybrid_search_falls_back_to_lexical(self, service, monkeypatch):
+        """A failing vector leg still returns BM25 results, incl. new books"""
+
+        def fail(query, k):
+            raise RuntimeError("embedding provider unavailable")
+
+        service.add_books(
+            [
+                {
+                    "title": "Solaris",
+                    "author": "Stanisław Lem",
+                    "openlibrary_key": "/works/OL1W",
+                }
+            ]
+        )
+        monkeypatch.setattr(service.vector_store, "similarity_search_with_score", fail)
+
+        hybrid = service.hybrid_search("Stanislaw Lem", limit=2)
+
+        assert hybrid["fallback"] is True
+        assert hybrid["timings"]["vector_ms"] is None
+        assert [book["title"] for book in hybrid["results"]] == ["Solaris"]
+        assert hybrid["results"][0]["similarity_score"] is None
+
+    def test_latency_and_usage_metrics(self, service):
+        """Searches record per-stage latency, provider usage and cache hits"""
+        calls = service.embeddings.get_usage_stats()["calls"]
+
+        service.semantic_search("Çöl gezegeni Arrakis", threshold=2)
+        service.semantic_search("Çöl gezegeni Arrakis", threshold=2)
+        service.filter_books(category="Bilim Kurgu")
+        stats = service.get_vector_store_stats()
+
+        latency = stats["latency_ms"]["semantic_search"]
+        assert {stage: latency[stage]["count"] for stage in latency} == {
+            "total": 2,
+            "embed": 2,
+            "search": 2,
+            "post_process": 2,
+        }
+        assert latency["total"]["p95"] >= latency["total"]["p50"] > 0
+        assert stats["latency_ms"]["filter_books"]["search"]["count"] == 1
+        assert "embed" not in stats["latency_ms"]["filter_books"]
+        # The repeated query is served from the query cache
+        assert stats["embedding_usage"]["calls"] == calls + 1
+        assert stats["embedding_usage"]["tokens"] > 0
+        assert stats["last_build"]["kind"] == "full"
+        assert stats["last_build"]["success"] is True
+
+        exported = service.render_metrics().splitlines()
+        assert (
+            'luminis_vector_stage_seconds_bucket{operation="semantic_search",'
+            'stage="embed",le="+Inf"} 2'
+        ) in exported
+        assert (
+            'luminis_vector_requests_total{operation="semantic_search"} 2' in exported
+        )
+        assert "luminis_vector_documents 3" in exported
+        assert (
+            'luminis_vector_embedding_cache_hits_total{cache="queries"} 1' in exported
+        )
+        assert any(
+            line.startswith('luminis_vector_last_rebuild_seconds{kind="full"}')
+            for line in exported
+        )
+
+    def test_rag_retrieval_works_offline(self, service, monkeypatch):
+        """RAGService retrieves from the shared index without an LLM"""
+        from services.rag_service import RAGService
+
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        rag = RAGService(service.index_manager)
+
+        assert rag.llm is None
+        assert rag.search_books("Çöl gezegeni Arrakis", limit=1)[0]["title"] == "Dune"
+
+    def test_services_share_one_index(self, books, tmp_path, monkeypatch):
+        """Every service built without a manager reuses the same index"""
+        from services import index_manager, vector_service
+
+        monkeypatch.setenv("VECTOR_STORE_ENGINE", "numpy")
+        monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+        monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(IndexManager, "_load_books", lambda self: list(books))
+        monkeypatch.setattr(index_manager, "_index_manager", None)
+
+        first = vector_service.VectorService()
+        second = vector_service.VectorService()
+
+        assert first.index_manager is second.index_manager
+        assert first.vector_store is second.vector_store
+        assert first.embeddings.get_cache_stats()["misses"] == len(books)